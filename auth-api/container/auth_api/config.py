@@ -14,7 +14,71 @@ def _url_clean(url: str) -> str:
 # Env var config
 EXPECTED_PREFIX = os.getenv("EXPECTED_PREFIX") or ""
 USER_API_URL_DIRTY = os.getenv("USER_API_URL")
+USER_API_TIMEOUT_SECONDS = float(os.getenv("USER_API_TIMEOUT_SECONDS") or "5")
+# For calls that make user-api run bcrypt, which can queue under load
+USER_API_HASHING_TIMEOUT_SECONDS = float(
+    os.getenv("USER_API_HASHING_TIMEOUT_SECONDS") or "15"
+)
+USER_API_MAX_CONNECTIONS = int(os.getenv("USER_API_MAX_CONNECTIONS") or "100")
+USER_API_MAX_KEEPALIVE = int(os.getenv("USER_API_MAX_KEEPALIVE") or "20")
+# Keep below user-api's uvicorn keep-alive timeout (5s) to avoid reusing closed conns
+USER_API_KEEPALIVE_SECONDS = float(os.getenv("USER_API_KEEPALIVE_SECONDS") or "4")
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE") or "10000")
+TOKEN_CACHE_TTL_SECONDS = float(os.getenv("TOKEN_CACHE_TTL_SECONDS") or "30")
+TOKEN_NEGATIVE_CACHE_SIZE = int(os.getenv("TOKEN_NEGATIVE_CACHE_SIZE") or "10000")
+TOKEN_NEGATIVE_CACHE_TTL_SECONDS = float(
+    os.getenv("TOKEN_NEGATIVE_CACHE_TTL_SECONDS") or "5"
+)
 
+# Same keys as user-api, lets signed tokens be validated without calling user-api
+TOKEN_SIGNING_KEYS = os.getenv("TOKEN_SIGNING_KEYS") or ""
+REVOCATION_REFRESH_SECONDS = float(os.getenv("REVOCATION_REFRESH_SECONDS") or "2")
+# Past this, signed tokens are checked with user-api until a refresh succeeds
+REVOCATION_MAX_STALENESS_SECONDS = float(
+    os.getenv("REVOCATION_MAX_STALENESS_SECONDS") or "10"
+)
+LOG_LEVEL = os.getenv("LOG_LEVEL") or "INFO"
+# Fraction of records kept per level below WARNING, e.g. "DEBUG=0.01,INFO=0.5"
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES") or ""
+# Records below WARNING kept per second, after a burst, once sampled
+LOG_RATE_LIMIT_PER_SECOND = float(os.getenv("LOG_RATE_LIMIT_PER_SECOND") or "20")
+LOG_RATE_LIMIT_BURST = float(os.getenv("LOG_RATE_LIMIT_BURST") or "100")
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE") or "10000")
+
+# Where to export sampled traces, "file:<path>" or a collector's OTLP/HTTP traces url
+TRACE_EXPORT = os.getenv("TRACE_EXPORT") or ""
+# Fraction of traces started here to export, trusted callers' traceparent decides theirs
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE") or "1")
+# Whether to continue callers' traceparent, sampled as they say. Off when callers
+# aren't trusted, who could otherwise have every one of their requests exported
+TRACE_TRUST_TRACEPARENT = (
+    os.getenv("TRACE_TRUST_TRACEPARENT") or "false"
+).lower() == "true"
+# Whether Server-Timing breaks the time down per span, or only gives the total. Off
+# when callers aren't trusted, time spent hashing shows whether a login's email exists
+SERVER_TIMING_DETAIL = (os.getenv("SERVER_TIMING_DETAIL") or "false").lower() == "true"
+
+# Bearer token for the /debug endpoints, which are disabled without one
+DEBUG_TOKEN = os.getenv("DEBUG_TOKEN") or ""
+# Fraction of requests profiled at startup, and a route ("POST /login") to profile all
+PROFILER_SAMPLE_RATE = float(os.getenv("PROFILER_SAMPLE_RATE") or "0")
+PROFILER_ROUTE = os.getenv("PROFILER_ROUTE") or ""
+PROFILER_INTERVAL_SECONDS = float(os.getenv("PROFILER_INTERVAL_SECONDS") or "0.01")
+# How often the event loop's lag is measured, and lag past which it's logged as blocked
+LOOP_LAG_INTERVAL_SECONDS = float(os.getenv("LOOP_LAG_INTERVAL_SECONDS") or "0.05")
+LOOP_BLOCKED_THRESHOLD_SECONDS = float(
+    os.getenv("LOOP_BLOCKED_THRESHOLD_SECONDS") or "0.1"
+)
+# Requests of each class of routes run at once, and how many more may wait, past that
+# they're turned away with a 503. Hashing routes make user-api run bcrypt
+BULKHEAD_HASHING_LIMIT = int(os.getenv("BULKHEAD_HASHING_LIMIT") or "16")
+BULKHEAD_HASHING_QUEUE = int(os.getenv("BULKHEAD_HASHING_QUEUE") or "64")
+BULKHEAD_DEFAULT_LIMIT = int(os.getenv("BULKHEAD_DEFAULT_LIMIT") or "64")
+BULKHEAD_DEFAULT_QUEUE = int(os.getenv("BULKHEAD_DEFAULT_QUEUE") or "128")
+# /ready fails past these, so traffic shifts to other replicas. user-api isn't checked,
+# so an outage there doesn't take every replica out of service with it
+READY_THREADPOOL_MAX_WAITING = int(os.getenv("READY_THREADPOOL_MAX_WAITING") or "20")
+READY_MAX_LOOP_LAG_SECONDS = float(os.getenv("READY_MAX_LOOP_LAG_SECONDS") or "0.25")
 
 # Env vars required for a full deployment, checked in app_startup
 REQUIRED_ENV_FOR_DEPLOY = [
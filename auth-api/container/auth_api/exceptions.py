@@ -14,3 +14,9 @@ class NotFoundError(Exception):
     """Exceptions caused by access to non-existent resources."""
 
     pass
+
+
+class OverloadedError(Exception):
+    """Exceptions caused by the service being too busy to take on more work."""
+
+    pass
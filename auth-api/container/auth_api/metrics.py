@@ -0,0 +1,251 @@
+"""Runtime metrics, rendered in the Prometheus text format at /metrics.
+
+Every metric and label combination recorded on a hot path is created up front, so
+recording is a lookup of an existing object and an increment - no label strings or
+dicts are built per request. Values kept elsewhere as stats dicts are read only when
+scraped, through collectors.
+"""
+
+from bisect import bisect_left
+import math
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Generic,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    NamedTuple,
+    Sequence,
+    Set,
+    Tuple,
+    TypeVar,
+)
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds, finer at the low end where most requests land
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    """Format label pairs like {a="b",c="d"}, or nothing without labels."""
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        escaped = value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{name}="{escaped}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    """Format a sample value, including infinities."""
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+class Counter:
+    """A value that only goes up."""
+
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        """Increase the value."""
+        self.value += amount
+
+    def samples(self, name: str, labels: str) -> Iterator[str]:
+        """Render the value as exposition lines."""
+        yield f"{name}{labels} {_format_value(self.value)}"
+
+
+class Gauge(Counter):
+    """A value that goes up and down."""
+
+    __slots__ = ()
+
+    def dec(self, amount: float = 1.0) -> None:
+        """Decrease the value."""
+        self.value -= amount
+
+    def set(self, value: float) -> None:
+        """Set the value."""
+        self.value = value
+
+
+class Histogram:
+    """Counts of observations falling in each bucket, plus their sum."""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Sequence[float]) -> None:
+        self.buckets = tuple(buckets)
+        # The last count is for observations above every bucket
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        """Record one observation."""
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self, name: str, labels: str) -> Iterator[str]:
+        """Render cumulative buckets, sum and count as exposition lines."""
+        # Insert le alongside any other labels
+        prefix = labels[:-1] + "," if labels else "{"
+        cumulative = 0
+        for bound, count in zip((*self.buckets, math.inf), self.counts):
+            cumulative += count
+            le = _format_value(bound)
+            yield f'{name}_bucket{prefix}le="{le}"}} {cumulative}'
+        yield f"{name}_sum{labels} {_format_value(self.sum)}"
+        yield f"{name}_count{labels} {self.count}"
+
+
+M = TypeVar("M", Counter, Gauge, Histogram)
+
+
+class Family(Generic[M]):
+    """A named metric, with one child per combination of label values."""
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        kind: str,
+        label_names: Sequence[str],
+        make: Callable[[], M],
+    ) -> None:
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.label_names = tuple(label_names)
+        self._make: Callable[[], M] = make
+        self._children: Dict[Tuple[str, ...], M] = {}
+
+    def labels(self, *values: str) -> M:
+        """Get the child for the label values, creating it if new.
+
+        Look children up once and keep them, rather than calling this per request.
+        """
+        if len(values) != len(self.label_names):
+            raise Exception(f"Metric {self.name} takes labels {self.label_names}")
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = self._make()
+        return child
+
+    def render(self) -> Iterator[str]:
+        """Render the help, type and every child as exposition lines."""
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.kind}"
+        for values, child in self._children.items():
+            yield from child.samples(
+                self.name, _format_labels(self.label_names, values)
+            )
+
+
+class Collected(NamedTuple):
+    """One sample read from elsewhere when scraped."""
+
+    name: str
+    kind: str
+    help: str
+    value: float
+
+
+class Registry:
+    """Every metric of this process, rendered together."""
+
+    def __init__(self) -> None:
+        self._families: List[Family[Any]] = []
+        self._collectors: List[Callable[[], Iterable[Collected]]] = []
+
+    def counter(
+        self, name: str, help: str, label_names: Sequence[str] = ()
+    ) -> Family[Counter]:
+        """Create a counter."""
+        family = Family(name, help, "counter", label_names, Counter)
+        self._families.append(family)
+        return family
+
+    def gauge(
+        self, name: str, help: str, label_names: Sequence[str] = ()
+    ) -> Family[Gauge]:
+        """Create a gauge."""
+        family = Family(name, help, "gauge", label_names, Gauge)
+        self._families.append(family)
+        return family
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        label_names: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> Family[Histogram]:
+        """Create a histogram."""
+        family = Family(
+            name, help, "histogram", label_names, lambda: Histogram(buckets)
+        )
+        self._families.append(family)
+        return family
+
+    def collector(self, collect: Callable[[], Iterable[Collected]]) -> None:
+        """Add a function giving more samples whenever metrics are scraped."""
+        self._collectors.append(collect)
+
+    def collect_stats(
+        self, prefix: str, stats: Callable[[], Mapping[str, float]], counters: Set[str]
+    ) -> None:
+        """Expose a stats dict, its keys in counters as counters and the rest gauges."""
+
+        def _collect() -> Iterator[Collected]:
+            for key, value in stats().items():
+                if key in counters:
+                    suffix = "" if key.endswith("_total") else "_total"
+                    name = f"{prefix}_{key}{suffix}"
+                    yield Collected(name, "counter", f"{prefix} {key}", value)
+                else:
+                    name = f"{prefix}_{key}"
+                    yield Collected(name, "gauge", f"{prefix} {key}", value)
+
+        self.collector(_collect)
+
+    def render(self) -> str:
+        """Render every metric in the text exposition format."""
+        lines: List[str] = []
+        for family in self._families:
+            lines.extend(family.render())
+        for collect in self._collectors:
+            for sample in collect():
+                lines.append(f"# HELP {sample.name} {sample.help}")
+                lines.append(f"# TYPE {sample.name} {sample.kind}")
+                lines.append(f"{sample.name} {_format_value(sample.value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
@@ -0,0 +1,202 @@
+"""Sampling profiler for requests handled on the event loop.
+
+While any request is selected for profiling, a background thread wakes every interval
+and, if the event loop is running a selected request's task right then, records the
+loop thread's stack. Stacks are aggregated in the collapsed format, one
+"root;caller;callee count" line per unique stack, which flamegraph.pl, speedscope and
+inferno all read. Requests are selected by a sample rate, or all requests of one
+route.
+
+Only time on the event loop is seen: waiting on the db or network takes no samples,
+and work in executor threads (like hashing) isn't attributed to requests. A sample can
+occasionally land on the next task the loop switched to after it was checked.
+"""
+
+import asyncio
+import os
+import random
+import sys
+import threading
+from types import CodeType, FrameType
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from starlette.types import Scope
+
+
+# Unique stacks kept, samples of new stacks past this are only counted
+MAX_STACKS = 10000
+# Frames kept from the top of each stack
+MAX_DEPTH = 100
+
+# Task running on each loop, private to asyncio but a plain dict on the versions used
+_current_tasks: Dict[asyncio.AbstractEventLoop, "asyncio.Task[Any]"] = getattr(
+    asyncio.tasks, "_current_tasks", {}
+)
+
+# Longest first, so frames are named relative to the most specific path
+_import_roots = sorted(
+    {os.path.abspath(path) + os.sep for path in sys.path},
+    key=len,
+    reverse=True,
+)
+
+
+def short_filename(filename: str) -> str:
+    """Shorten a source file's path to be relative to the import path."""
+    for root in _import_roots:
+        if filename.startswith(root):
+            return os.path.relpath(filename, root)
+    return filename
+
+
+def frame_name(code: CodeType) -> str:
+    """Name a function by its name, file relative to the import path, and line."""
+    return f"{code.co_name} ({short_filename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def running_task(loop: asyncio.AbstractEventLoop) -> "Optional[asyncio.Task[Any]]":
+    """Get the task a loop is running right now, callable from any thread."""
+    return _current_tasks.get(loop)
+
+
+def stack_names(
+    frame: Optional[FrameType], names_cache: Dict[CodeType, str]
+) -> List[str]:
+    """Name the frames of a stack down to the event loop, innermost first."""
+    names: List[str] = []
+    while frame is not None and len(names) < MAX_DEPTH:
+        code = frame.f_code
+        name = names_cache.get(code)
+        if name is None:
+            name = names_cache[code] = frame_name(code)
+        # Below this is only the event loop, the same for every task
+        if name.startswith("_run (asyncio/events.py:"):
+            break
+        names.append(name)
+        frame = frame.f_back
+    return names
+
+
+class Profiler:
+    """Sample the event loop's stack while it runs selected requests' tasks."""
+
+    def __init__(
+        self,
+        route_of: Callable[[Scope], str],
+        sample_rate: float,
+        route: str,
+        interval_seconds: float,
+    ) -> None:
+        # Names a request's route, once it's been routed
+        self.route_of = route_of
+        # Fraction of requests profiled, and a route whose requests are all profiled
+        self.sample_rate = sample_rate
+        self.route = route
+        self.interval_seconds = interval_seconds
+        self._stacks: Dict[str, int] = {}
+        self._frame_names: Dict[CodeType, str] = {}
+        # Tasks of requests that may be profiled, with whether sample_rate chose them
+        self._tasks: Dict["asyncio.Task[Any]", Tuple[Scope, bool]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id = 0
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._stats: Dict[str, float] = {
+            "samples": 0,
+            "dropped_samples": 0,
+            "profiled_requests": 0,
+        }
+
+    @property
+    def enabled(self) -> bool:
+        """Whether any requests are selected for profiling."""
+        return self.sample_rate > 0 or bool(self.route)
+
+    def start(self) -> None:
+        """Start sampling the running event loop, call from the loop's thread."""
+        if self._thread is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop sampling."""
+        if self._thread is None:
+            return
+        thread, self._thread = self._thread, None
+        self._stopping.set()
+        thread.join(timeout=1)
+
+    def configure(self, sample_rate: float, route: str) -> None:
+        """Change which requests are profiled, requests already running keep theirs."""
+        self.sample_rate = sample_rate
+        self.route = route
+
+    def track(self, task: "asyncio.Task[Any]", scope: Scope) -> None:
+        """Track a request's task, if it's chosen or its route might be once routed."""
+        chosen = self.sample_rate > 0 and random.random() < self.sample_rate
+        if chosen or self.route:
+            self._tasks[task] = (scope, chosen)
+
+    def untrack(self, task: "asyncio.Task[Any]") -> None:
+        """Stop profiling a request's task, after it's handled."""
+        tracked = self._tasks.pop(task, None)
+        if tracked is not None and self._selected(*tracked):
+            self._stats["profiled_requests"] += 1
+
+    def _selected(self, scope: Scope, chosen: bool) -> bool:
+        return chosen or (bool(self.route) and self.route_of(scope) == self.route)
+
+    def _run(self) -> None:
+        # Check back now and then while disabled, in case it's enabled
+        while not self._stopping.wait(self.interval_seconds if self.enabled else 1):
+            if not self._tasks or self._loop is None:
+                continue
+            task = running_task(self._loop)
+            tracked = self._tasks.get(task) if task is not None else None
+            if tracked is None or not self._selected(*tracked):
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is not None:
+                self._record(self.route_of(tracked[0]), frame)
+
+    def _record(self, root: str, frame: Optional[FrameType]) -> None:
+        """Add a sample of a stack, from its innermost frame."""
+        names = stack_names(frame, self._frame_names)
+        names.append(root)
+        stack = ";".join(reversed(names))
+
+        with self._lock:
+            self._stats["samples"] += 1
+            if stack in self._stacks:
+                self._stacks[stack] += 1
+            elif len(self._stacks) < MAX_STACKS:
+                self._stacks[stack] = 1
+            else:
+                self._stats["dropped_samples"] += 1
+
+    def collapsed(self) -> str:
+        """Get the samples so far as collapsed stacks, most sampled first."""
+        with self._lock:
+            stacks = sorted(self._stacks.items(), key=lambda item: -item[1])
+        return "".join(f"{stack} {count}\n" for stack, count in stacks)
+
+    def clear(self) -> None:
+        """Drop the samples so far."""
+        with self._lock:
+            self._stacks = {}
+
+    def stats(self) -> Dict[str, float]:
+        """Get how much has been sampled, and the current settings."""
+        with self._lock:
+            stacks = len(self._stacks)
+        return {
+            **self._stats,
+            "stacks": stacks,
+            "sample_rate": self.sample_rate,
+            "interval_seconds": self.interval_seconds,
+        }
@@ -0,0 +1,102 @@
+"""Readiness, whether this worker should be sent more traffic right now.
+
+Unlike /ping, which only says the worker is alive, readiness fails once a dependency is
+unreachable or the worker is saturated, so Kubernetes shifts load to other replicas
+until it recovers. Each check gives why it's failing, or None. Checks run on every
+probe, so any that's costly, like a network round trip, goes through a CachedProbe.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from auth_api.metrics import Counter, registry
+
+
+# Gives why a check is failing, or None if it's passing
+Check = Callable[[], Awaitable[Optional[str]]]
+
+logger = logging.getLogger(__name__)
+
+_ready = registry.gauge(
+    "readiness_ready", "Whether the last readiness check passed."
+).labels()
+_failed = registry.counter(
+    "readiness_failed_total", "Readiness checks failed, per check.", ["check"]
+)
+
+
+class CachedProbe:
+    """Run a probe at most once per interval, sharing its result meanwhile."""
+
+    def __init__(
+        self,
+        probe: Callable[[], Awaitable[None]],
+        interval_seconds: float,
+        timeout_seconds: float,
+    ) -> None:
+        self.probe = probe
+        self.interval_seconds = interval_seconds
+        self.timeout_seconds = timeout_seconds
+        # Made on first use, to be bound to the running loop on Python 3.9
+        self._lock: Optional[asyncio.Lock] = None
+        self._probed_at: Optional[float] = None
+        self._failure: Optional[str] = None
+
+    async def check(self) -> Optional[str]:
+        """Get why the probe last failed, probing again if the result is stale."""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            now = time.monotonic()
+            if (
+                self._probed_at is not None
+                and now - self._probed_at < self.interval_seconds
+            ):
+                return self._failure
+            try:
+                await asyncio.wait_for(self.probe(), self.timeout_seconds)
+                self._failure = None
+            except asyncio.TimeoutError:
+                self._failure = f"Timed out after {self.timeout_seconds}s"
+            except Exception as e:
+                self._failure = f"{type(e).__name__}: {e}"
+            self._probed_at = time.monotonic()
+            return self._failure
+
+
+def over(name: str, value: float, threshold: float) -> Optional[str]:
+    """Fail if a value is over its threshold."""
+    return f"{name} {value:g} over {threshold:g}" if value > threshold else None
+
+
+class Readiness:
+    """Run every check, ready if they all pass."""
+
+    def __init__(self) -> None:
+        self._checks: List[Tuple[str, Check, Counter]] = []
+        self._was_ready = True
+        _ready.set(1)
+
+    def add_check(self, name: str, check: Check) -> None:
+        """Add a check, run on every probe."""
+        self._checks.append((name, check, _failed.labels(name)))
+
+    async def check(self) -> Dict[str, str]:
+        """Run every check, get why each failing one is failing, empty if ready."""
+        failing: Dict[str, str] = {}
+        for name, check, failed in self._checks:
+            failure = await check()
+            if failure is not None:
+                failing[name] = failure
+                failed.inc()
+        ready = not failing
+        _ready.set(1 if ready else 0)
+        if ready != self._was_ready:
+            if ready:
+                logger.info("Ready again")
+            else:
+                logger.warning("Not ready", extra={"failing": failing})
+            self._was_ready = ready
+        return failing
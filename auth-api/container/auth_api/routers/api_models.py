@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import Dict, List, Optional
 
 from pydantic import BaseModel
 
@@ -37,6 +37,30 @@ class LoginResponse(BaseModel):
     token_type: str = "bearer"
 
 
+class MemoryAllocation(BaseModel):
+    size_diff_bytes: int
+    count_diff: int
+    size_bytes: int
+    route: Optional[str]
+    call: Optional[str]
+    traceback: List[str]
+
+
+class MemoryDiffResponse(BaseModel):
+    size_diff_bytes: int
+    by_route: Dict[str, int]
+    by_call: Dict[str, int]
+    top: List[MemoryAllocation]
+
+
+class MemorySnapshotResponse(BaseModel):
+    traced_bytes: int
+
+
+class MemoryTracingRequest(BaseModel):
+    frames: int = 64
+
+
 class PreRegisterRequest(BaseModel):
     email_address: str
 
@@ -45,6 +69,22 @@ class PreRegisterResponse(BaseModel):
     verify_code: Optional[str]
 
 
+class ProfilerResponse(BaseModel):
+    sample_rate: float
+    route: str
+    stats: Dict[str, float]
+
+
+class ProfilerUpdateRequest(BaseModel):
+    sample_rate: float = 0.0
+    route: str = ""
+
+
+class ReadinessResponse(BaseModel):
+    ready: bool
+    failing: Dict[str, str]
+
+
 class RegisterRequest(BaseModel):
     email_address: str
     password: str
@@ -65,3 +105,8 @@ class ResetPasswordRequest(BaseModel):
     email_address: str
     password: str
     reset_code: str
+
+
+class StatsResponse(BaseModel):
+    token_cache: Dict[str, int]
+    signed_tokens: Dict[str, float]
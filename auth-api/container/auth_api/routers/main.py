@@ -1,39 +1,223 @@
+import asyncio
+from typing import Dict, Optional
+
+import anyio.to_thread
 from fastapi import Depends, FastAPI, Response, status
 from fastapi.responses import PlainTextResponse
 from fastapi.security import OAuth2PasswordRequestForm
 
-from auth_api import config
-from auth_api.routers import api_models, dependencies
+from auth_api import config, metrics
+from auth_api.bulkhead import Bulkhead
+from auth_api.logs import log_stats, setup_logging, shutdown_logging
+from auth_api.memory import gc_stats, memory_stats, time_gc
+from auth_api.metrics import registry
+from auth_api.readiness import over, Readiness
+from auth_api.routers import api_models, debug, dependencies
+from auth_api.routers.middleware import (
+    apply_bulkheads,
+    instrument_routes,
+    loop_monitor,
+    MetricsMiddleware,
+    profiler,
+    ProfilingMiddleware,
+    TracingMiddleware,
+)
 from auth_api.routers.utils import sanitize_excs
 from auth_api.services import user_api
+from auth_api.tracing import start_exporter, stop_exporter, tracing_stats
 
 
 app = FastAPI(root_path=config.EXPECTED_PREFIX)
 
 success = Response(status_code=status.HTTP_200_OK)
 
+app.include_router(debug.router)
+
+app.add_middleware(ProfilingMiddleware)
+app.add_middleware(MetricsMiddleware)
+# Outermost, so the trace covers everything else
+app.add_middleware(TracingMiddleware)
+
+# Routes making user-api run bcrypt get their own bulkhead, so a flood of logins can't
+# take every connection to user-api from the cheap routes, nor queue behind them
+hashing_bulkhead = Bulkhead(
+    "hashing", config.BULKHEAD_HASHING_LIMIT, config.BULKHEAD_HASHING_QUEUE
+)
+default_bulkhead = Bulkhead(
+    "default", config.BULKHEAD_DEFAULT_LIMIT, config.BULKHEAD_DEFAULT_QUEUE
+)
+BULKHEADS = {
+    "POST /register": hashing_bulkhead,
+    "POST /reset_password": hashing_bulkhead,
+    "POST /login": hashing_bulkhead,
+    "POST /login_json": hashing_bulkhead,
+    "POST /change_password": hashing_bulkhead,
+}
+
+
+def threadpool_stats() -> Dict[str, float]:
+    """Get the use of the threadpool sync endpoints and dependencies run in."""
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    return {
+        "in_use": limiter.borrowed_tokens,
+        "size": limiter.total_tokens,
+        "waiting": limiter.statistics().tasks_waiting,
+    }
+
+
+# Expose the stats of each component as metrics too
+registry.collect_stats(
+    "token_cache",
+    user_api.token_cache.stats,
+    counters={
+        "hits",
+        "negative_hits",
+        "misses",
+        "evictions",
+        "expirations",
+        "invalidations",
+    },
+)
+registry.collect_stats(
+    "signed_tokens",
+    user_api.revocation_stats,
+    counters={"refreshes", "refresh_failures", "local_validations", "remote_fallbacks"},
+)
+registry.collect_stats("threadpool", threadpool_stats, counters=set())
+registry.collect_stats(
+    "logs", log_stats, counters={"sampled_out", "rate_limited", "queue_full"}
+)
+registry.collect_stats(
+    "tracing",
+    tracing_stats,
+    counters={"traces_exported", "traces_dropped", "export_failures"},
+)
+registry.collect_stats("event_loop", loop_monitor.stats, counters=set())
+registry.collect_stats("process", memory_stats, counters=set())
+registry.collect_stats(
+    "gc",
+    gc_stats,
+    counters={
+        "pause_seconds_total",
+        "gen0_collections",
+        "gen1_collections",
+        "gen2_collections",
+        "gen0_collected",
+        "gen1_collected",
+        "gen2_collected",
+        "gen0_uncollectable",
+        "gen1_uncollectable",
+        "gen2_uncollectable",
+    },
+)
+registry.collect_stats(
+    "profiler",
+    profiler.stats,
+    counters={"samples", "dropped_samples", "profiled_requests"},
+)
+
+
+# Whether this worker should get traffic, for Kubernetes' readiness probe
+readiness = Readiness()
+
+
+async def _check_threadpool() -> Optional[str]:
+    waiting = threadpool_stats()["waiting"]
+    return over("Tasks waiting", waiting, config.READY_THREADPOOL_MAX_WAITING)
+
+
+async def _check_event_loop() -> Optional[str]:
+    lag = loop_monitor.stats()["lag_seconds_avg"]
+    return over("Lag seconds", lag, config.READY_MAX_LOOP_LAG_SECONDS)
+
+
+readiness.add_check("threadpool", _check_threadpool)
+readiness.add_check("event_loop", _check_event_loop)
+
 
 @app.on_event("startup")
 async def app_startup() -> None:
     """Verify config, start background tasks."""
+    setup_logging()
+
     # Validate env vars set
     if any([var is None for var in config.REQUIRED_ENV_FOR_DEPLOY]):
         raise Exception(f"Missing required env vars: {config.REQUIRED_ENV_FOR_DEPLOY}")
 
+    # Export sampled traces, if enabled
+    start_exporter()
+
+    # Every route is added by now
+    instrument_routes(app.routes)
+    apply_bulkheads(app.routes, BULKHEADS, default_bulkhead)
+
+    # Watch for anything blocking the event loop, and time gc pauses
+    loop_monitor.start()
+    time_gc()
+
+    # Sample requests selected for profiling, if any
+    profiler.start()
+
+    # Open the shared keep-alive client to user-api
+    await user_api.open_client()
+
+    # Keep up with revoked sessions, to validate signed tokens locally
+    if config.TOKEN_SIGNING_KEYS:
+        asyncio.create_task(user_api.refresh_revocations_loop())
+
+
+@app.on_event("shutdown")
+async def app_shutdown() -> None:
+    """Release shared resources."""
+    await user_api.close_client()
+    stop_exporter()
+    profiler.stop()
+    loop_monitor.stop()
+    shutdown_logging()
+
 
 @app.get("/ping", response_class=PlainTextResponse)
-def ping() -> str:
+async def ping() -> str:
     """Ping pong."""
     return "pong"
 
 
+@app.get("/ready")
+async def ready(response: Response) -> api_models.ReadinessResponse:
+    """Check this worker can take traffic, 503 if it's saturated."""
+    failing = await readiness.check()
+    if failing:
+        response.status_code = 503
+    return api_models.ReadinessResponse(ready=not failing, failing=failing)
+
+
+# Open only to holders of the debug token, as this service faces the public
+@app.get("/stats", dependencies=[Depends(debug.check_debug_token)])
+async def stats() -> api_models.StatsResponse:
+    """Get runtime statistics for this worker."""
+    return api_models.StatsResponse(
+        token_cache=user_api.token_cache.stats(),
+        signed_tokens=user_api.revocation_stats(),
+    )
+
+
+@app.get(
+    "/metrics",
+    response_class=Response,
+    dependencies=[Depends(debug.check_debug_token)],
+)
+async def get_metrics() -> Response:
+    """Get runtime metrics for this worker, in the Prometheus text format."""
+    return Response(content=registry.render(), media_type=metrics.CONTENT_TYPE)
+
+
 @app.post("/preregister")
-def preregister(
+async def preregister(
     pre_register_request: api_models.PreRegisterRequest,
 ) -> api_models.PreRegisterResponse:
     """Pre-register a new user, submitting their email for verification."""
     with sanitize_excs():
-        verify_code = user_api.preregister(
+        verify_code = await user_api.preregister(
             email_address=pre_register_request.email_address
         )
         resp = api_models.PreRegisterResponse(verify_code=verify_code)
@@ -41,11 +225,11 @@ def preregister(
 
 
 @app.get("/preregister")
-def preregister_verify(email_address: str, verify_code: str) -> Response:
+async def preregister_verify(email_address: str, verify_code: str) -> Response:
     """Verify a pre-registration email code."""
     with sanitize_excs():
         # Throws back exc if failed to verify
-        user_api.preregister_verify(
+        await user_api.preregister_verify(
             email_address=email_address,
             verify_code=verify_code,
         )
@@ -53,11 +237,11 @@ def preregister_verify(email_address: str, verify_code: str) -> Response:
 
 
 @app.post("/register")
-def register(register_request: api_models.RegisterRequest) -> Response:
+async def register(register_request: api_models.RegisterRequest) -> Response:
     """Register a new user."""
     with sanitize_excs():
         # Don't expand with ** to avoid leaking request params
-        user_api.register(
+        await user_api.register(
             email_address=register_request.email_address,
             password=register_request.password,
             first_name=register_request.first_name,
@@ -68,13 +252,13 @@ def register(register_request: api_models.RegisterRequest) -> Response:
 
 
 @app.post("/request_reset_password")
-def request_reset_password(
+async def request_reset_password(
     request_reset_password_request: api_models.RequestResetPasswordRequest,
 ) -> api_models.RequestResetPasswordResponse:
     """Request a password reset."""
     with sanitize_excs():
         # Don't expand with ** to avoid leaking request params
-        reset_code = user_api.request_reset_password(
+        reset_code = await user_api.request_reset_password(
             email_address=request_reset_password_request.email_address,
         )
         resp = api_models.RequestResetPasswordResponse(reset_code=reset_code)
@@ -82,11 +266,13 @@ def request_reset_password(
 
 
 @app.post("/reset_password")
-def reset_password(reset_password_request: api_models.ResetPasswordRequest) -> Response:
+async def reset_password(
+    reset_password_request: api_models.ResetPasswordRequest,
+) -> Response:
     """Reset a user's password."""
     with sanitize_excs():
         # Don't expand with ** to avoid leaking request params
-        user_api.reset_password(
+        await user_api.reset_password(
             email_address=reset_password_request.email_address,
             new_password=reset_password_request.password,
             reset_code=reset_password_request.reset_code,
@@ -95,11 +281,13 @@ def reset_password(reset_password_request: api_models.ResetPasswordRequest) -> R
 
 
 @app.post("/login")
-def login(form_data: OAuth2PasswordRequestForm = Depends()) -> api_models.LoginResponse:
+async def login(
+    form_data: OAuth2PasswordRequestForm = Depends(),
+) -> api_models.LoginResponse:
     """Log a user in."""
     with sanitize_excs():
         # Don't expand with ** to avoid leaking request params
-        client_token = user_api.login(
+        client_token = await user_api.login(
             email_address=form_data.username,
             password=form_data.password,
         )
@@ -108,13 +296,13 @@ def login(form_data: OAuth2PasswordRequestForm = Depends()) -> api_models.LoginR
 
 
 @app.post("/login_json")
-def login_json(
+async def login_json(
     login_request: api_models.LoginJsonRequest,
 ) -> api_models.LoginJsonResponse:
     """Log a user in, using json (non-oauth2-compliant endpoint)."""
     with sanitize_excs():
         # Don't expand with ** to avoid leaking request params
-        client_token = user_api.login(
+        client_token = await user_api.login(
             email_address=login_request.email_address,
             password=login_request.password,
         )
@@ -123,20 +311,20 @@ def login_json(
 
 
 @app.post("/logout")
-def logout(client_token: str = Depends(dependencies.get_token)) -> Response:
+async def logout(client_token: str = Depends(dependencies.get_token)) -> Response:
     """Log a currently logged-in user out."""
     with sanitize_excs():
-        user_api.logout(client_token=client_token)
+        await user_api.logout(client_token=client_token)
     return success
 
 
 @app.get("/user_data")
-def get_user_data(
+async def get_user_data(
     email_address: str = Depends(dependencies.get_email_address),
 ) -> api_models.GetUserDataResponse:
     """Get the currently authenticated user's basic data."""
     with sanitize_excs():
-        user_data = user_api.get_user(email_address=email_address)
+        user_data = await user_api.get_user(email_address=email_address)
         resp = api_models.GetUserDataResponse(
             email_address=user_data.email_address,
             first_name=user_data.first_name,
@@ -147,13 +335,13 @@ def get_user_data(
 
 
 @app.post("/change_password")
-def change_password(
+async def change_password(
     change_password_request: api_models.ChangePasswordRequest,
     email_address: str = Depends(dependencies.get_email_address),
 ) -> Response:
     """Change the currently authenticated user's password."""
     with sanitize_excs():
-        user_api.change_password(
+        await user_api.change_password(
             email_address=email_address,
             password=change_password_request.password,
         )
@@ -161,13 +349,13 @@ def change_password(
 
 
 @app.post("/change_name")
-def change_name(
+async def change_name(
     change_name_request: api_models.ChangeNameRequest,
     email_address: str = Depends(dependencies.get_email_address),
 ) -> Response:
     """Change the currently authenticated user's name."""
     with sanitize_excs():
-        user_api.change_name(
+        await user_api.change_name(
             email_address=email_address,
             first_name=change_name_request.first_name,
             last_name=change_name_request.last_name,
@@ -176,13 +364,13 @@ def change_name(
 
 
 @app.post("/change_login_notify")
-def change_login_notify(
+async def change_login_notify(
     change_login_notify_request: api_models.ChangeLoginNotifyRequest,
     email_address: str = Depends(dependencies.get_email_address),
 ) -> Response:
     """Change the currently authenticated user's login notification setting."""
     with sanitize_excs():
-        user_api.change_login_notify(
+        await user_api.change_login_notify(
             email_address=email_address,
             login_notify=change_login_notify_request.login_notify,
         )
@@ -190,10 +378,10 @@ def change_login_notify(
 
 
 @app.post("/delete")
-def delete_user(
+async def delete_user(
     email_address: str = Depends(dependencies.get_email_address),
 ) -> Response:
     """Delete the currently logged-in user."""
     with sanitize_excs():
-        user_api.delete_user(email_address=email_address)
+        await user_api.delete_user(email_address=email_address)
     return success
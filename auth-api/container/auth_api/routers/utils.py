@@ -1,9 +1,18 @@
 from contextlib import contextmanager
+import logging
 from typing import Any, Dict, Iterator, List
 
 from fastapi import HTTPException
 
-from auth_api.exceptions import ClientError, InternalError, NotFoundError
+from auth_api.exceptions import (
+    ClientError,
+    InternalError,
+    NotFoundError,
+    OverloadedError,
+)
+
+
+logger = logging.getLogger(__name__)
 
 
 @contextmanager
@@ -12,16 +21,24 @@ def sanitize_excs(*args: List[Any], **kwargs: Dict[Any, Any]) -> Iterator[None]:
     try:
         yield
     except InternalError as e:
-        print(f"INTERNAL ERROR: {str(e)}")  # TODO make this a log error
+        logger.error("Internal error", extra={"error": str(e)})
         raise HTTPException(status_code=500)
     except ClientError as e:
-        print(f"CLIENT ERROR: {str(e)}")  # TODO make this a log debug
+        # Info not debug, so they're seen by default, sampled and rate limited
+        logger.info("Client error", extra={"error": str(e)})
         raise HTTPException(status_code=400, detail=str(e))
     except NotFoundError as e:
-        print(f"NOT FOUND ERROR: {str(e)}")  # TODO make this a log debug
+        logger.info("Not found error", extra={"error": str(e)})
         raise HTTPException(status_code=404, detail=str(e))
-    except Exception as e:
-        print(f"UNHANDLED ERROR: {str(e)}")  # TODO make this a log error/crit?
+    except OverloadedError as e:
+        logger.warning("Overloaded error", extra={"error": str(e)})
+        raise HTTPException(
+            status_code=503,
+            detail="Service overloaded, try again later",
+            headers={"Retry-After": "1"},
+        )
+    except Exception:
+        logger.exception("Unhandled error")
         raise HTTPException(status_code=500)
     finally:
         pass
@@ -13,19 +13,30 @@ from auth_api.services.user_api.client import (
     request_reset_password,
     reset_password,
 )
+from auth_api.services.user_api.revocations import (
+    refresh_revocations_loop,
+    revocation_stats,
+)
+from auth_api.services.user_api.token_cache import token_cache
+from auth_api.services.user_api.utils import close_client, open_client
 
 __all__ = [
     "change_login_notify",
     "change_name",
     "change_password",
+    "close_client",
     "delete_user",
     "email_address_from_token",
     "get_user",
     "register",
     "login",
     "logout",
+    "open_client",
     "preregister",
     "preregister_verify",
+    "refresh_revocations_loop",
     "request_reset_password",
     "reset_password",
+    "revocation_stats",
+    "token_cache",
 ]
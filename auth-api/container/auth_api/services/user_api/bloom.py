@@ -0,0 +1,31 @@
+import hashlib
+from typing import Iterator
+
+
+class BloomFilter(object):
+    """A read-only copy of user-api's revoked sessions bloom filter.
+
+    The hashing must match user_api.internal.bloom exactly.
+    """
+
+    def __init__(self, num_bits: int, num_hashes: int, bits: bytes):
+        if len(bits) * 8 < num_bits:
+            raise ValueError("Bloom filter bits don't match num_bits")
+        self.num_bits = num_bits
+        self.num_hashes = num_hashes
+        self.bits = bits
+
+    def _positions(self, item: str) -> Iterator[int]:
+        """Get the bit positions for an item."""
+        digest = hashlib.sha256(item.encode("utf-8")).digest()
+        h1 = int.from_bytes(digest[:8], "big")
+        h2 = int.from_bytes(digest[8:16], "big") | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def __contains__(self, item: str) -> bool:
+        """Whether the item might have been added."""
+        return all(
+            self.bits[position // 8] & (1 << (position % 8))
+            for position in self._positions(item)
+        )
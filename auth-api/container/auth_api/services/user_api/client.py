@@ -1,28 +1,32 @@
+from datetime import datetime
 from typing import Optional
 
-from auth_api.services.user_api import models
+from auth_api import config
+from auth_api.exceptions import NotFoundError
+from auth_api.services.user_api import models, revocations, signed_tokens
+from auth_api.services.user_api.token_cache import token_cache
 from auth_api.services.user_api.utils import _request, _request_shaped
 
 
-def preregister(email_address: str) -> Optional[str]:
+async def preregister(email_address: str) -> Optional[str]:
     """Pre-register a new user, submitting their email for verification."""
     body = {
         "email_address": email_address,
     }
-    resp = _request_shaped(models.PreRegisterResponse, "POST", "/pre_users", body)
+    resp = await _request_shaped(models.PreRegisterResponse, "POST", "/pre_users", body)
     return resp.verify_code  # Will be None in prod, but actual code in testing / dev
 
 
-def preregister_verify(email_address: str, verify_code: str) -> None:
+async def preregister_verify(email_address: str, verify_code: str) -> None:
     """Check the email verify code, throws relevant exc if bad."""
     body = {
         "email_address": email_address,
         "verify_code": verify_code,
     }
-    _request("POST", "/pre_users/verify", body)
+    await _request("POST", "/pre_users/verify", body)
 
 
-def register(
+async def register(
     email_address: str, password: str, first_name: str, last_name: str, verify_code: str
 ) -> None:
     """Register a new user."""
@@ -33,91 +37,138 @@ def register(
         "last_name": last_name,
         "verify_code": verify_code,
     }
-    _request("POST", "/users", body)
+    await _request(
+        "POST", "/users", body, timeout=config.USER_API_HASHING_TIMEOUT_SECONDS
+    )
 
 
-def get_user(email_address: str) -> models.GetUserResponse:
+async def get_user(email_address: str) -> models.GetUserResponse:
     """Get user data for a given email address."""
     params = {
         "email_address": email_address,
     }
-    resp = _request_shaped(models.GetUserResponse, "GET", "/users", params=params)
+    resp = await _request_shaped(models.GetUserResponse, "GET", "/users", params=params)
     return resp
 
 
-def change_password(email_address: str, password: str) -> None:
+async def change_password(email_address: str, password: str) -> None:
     """Change a user's password."""
     body = {
         "email_address": email_address,
         "password": password,
     }
-    _request("PUT", "/users", body)
+    await _request(
+        "PUT", "/users", body, timeout=config.USER_API_HASHING_TIMEOUT_SECONDS
+    )
 
 
-def change_name(email_address: str, first_name: str, last_name: str) -> None:
+async def change_name(email_address: str, first_name: str, last_name: str) -> None:
     """Change a user's name."""
     body = {
         "email_address": email_address,
         "first_name": first_name,
         "last_name": last_name,
     }
-    _request("PUT", "/users", body)
+    await _request("PUT", "/users", body)
 
 
-def change_login_notify(email_address: str, login_notify: bool) -> None:
+async def change_login_notify(email_address: str, login_notify: bool) -> None:
     """Change a user's login notification setting."""
     body = {
         "email_address": email_address,
         "login_notify": login_notify,
     }
-    _request("PUT", "/users", body)
+    await _request("PUT", "/users", body)
 
 
-def delete_user(email_address: str) -> None:
+async def delete_user(email_address: str) -> None:
     """Delete a user account."""
     params = {
         "email_address": email_address,
     }
-    _request("DELETE", "/users", params=params)
+    await _request("DELETE", "/users", params=params)
+    token_cache.invalidate_email_address(email_address)
+    revocations.revoke_email_address_locally(email_address)
 
 
-def request_reset_password(email_address: str) -> Optional[str]:
+async def request_reset_password(email_address: str) -> Optional[str]:
     """Request a password reset."""
     body = {
         "email_address": email_address,
     }
-    resp = _request_shaped(
+    resp = await _request_shaped(
         models.RequestPasswordResetResponse, "POST", "/password_resets", body
     )
     return resp.reset_code  # Will be None in prod, but actual code in testing / dev
 
 
-def reset_password(email_address: str, new_password: str, reset_code: str) -> None:
+async def reset_password(
+    email_address: str, new_password: str, reset_code: str
+) -> None:
     """Attempt to reset a password."""
     body = {
         "email_address": email_address,
         "password": new_password,
         "reset_code": reset_code,
     }
-    _request("POST", "/users/reset_password", body)
+    await _request(
+        "POST",
+        "/users/reset_password",
+        body,
+        timeout=config.USER_API_HASHING_TIMEOUT_SECONDS,
+    )
 
 
-def login(email_address: str, password: str) -> str:
+async def login(email_address: str, password: str) -> str:
     """Log a user in, return client_token if success."""
     body = {
         "email_address": email_address,
         "password": password,
     }
-    resp = _request_shaped(models.LoginResponse, "POST", "/users/login", body)
+    resp = await _request_shaped(
+        models.LoginResponse,
+        "POST",
+        "/users/login",
+        body,
+        timeout=config.USER_API_HASHING_TIMEOUT_SECONDS,
+    )
     return resp.client_token
 
 
-def logout(client_token: str) -> None:
+async def logout(client_token: str) -> None:
     """Log a given token out."""
-    _request("DELETE", f"/tokens/{client_token}")
-
+    await _request("DELETE", f"/tokens/{client_token}")
+    token_cache.invalidate(client_token)
+    claims = signed_tokens.verify(client_token)
+    if claims is not None:
+        revocations.revoke_session_locally(claims)
+
+
+async def email_address_from_token(client_token: str) -> str:
+    """Get the email address associated with this token, using the cache if able."""
+    cached, email_address = token_cache.get(client_token)
+    if cached:
+        if email_address is None:
+            raise NotFoundError("Failed to find given session")
+        return email_address
+
+    # Signed tokens vouch for themselves, unless their session might be revoked
+    claims = signed_tokens.verify(client_token)
+    if claims is not None and not revocations.might_be_revoked(claims):
+        return claims.email_address
+
+    try:
+        resp = await _request_shaped(
+            models.TokenDataResponse, "GET", f"/tokens/{client_token}"
+        )
+    except NotFoundError:
+        token_cache.put_negative(client_token)
+        raise
+
+    # Never cache past the session's own expiry
+    max_ttl_seconds = token_cache.ttl_seconds
+    if resp.expiry_time is not None:
+        max_ttl_seconds = (resp.expiry_time - datetime.utcnow()).total_seconds()
+    token_cache.put(client_token, resp.email_address, max_ttl_seconds)
 
-def email_address_from_token(client_token: str) -> str:
-    """Get the email address associated with this token."""
-    resp = _request_shaped(models.TokenDataResponse, "GET", f"/tokens/{client_token}")
     return resp.email_address
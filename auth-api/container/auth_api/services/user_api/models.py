@@ -1,3 +1,4 @@
+from datetime import datetime
 from typing import Optional
 
 from pydantic import BaseModel
@@ -22,5 +23,14 @@ class RequestPasswordResetResponse(BaseModel):
     reset_code: Optional[str] = None
 
 
+class RevokedSessionsResponse(BaseModel):
+    num_bits: int
+    num_hashes: int
+    bits: str
+    count: int
+    generated_time: datetime
+
+
 class TokenDataResponse(BaseModel):
     email_address: str
+    expiry_time: Optional[datetime] = None
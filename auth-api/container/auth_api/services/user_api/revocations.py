@@ -0,0 +1,97 @@
+import asyncio
+import base64
+import logging
+import time
+from typing import Dict, Optional
+
+from auth_api import config
+from auth_api.services.user_api import models
+from auth_api.services.user_api.bloom import BloomFilter
+from auth_api.services.user_api.signed_tokens import TokenClaims
+from auth_api.services.user_api.utils import _request_shaped
+
+
+logger = logging.getLogger(__name__)
+
+# Latest copy of user-api's revoked sessions, and the monotonic time it was fetched
+_filter: Optional[BloomFilter] = None
+_fetched_at = 0.0
+
+# Revocations made through this instance -> monotonic time, until the filter has them
+_local_sessions: Dict[str, float] = {}
+_local_email_addresses: Dict[str, float] = {}
+
+_stats: Dict[str, float] = {
+    "refreshes": 0,
+    "refresh_failures": 0,
+    "revoked_count": 0,
+    "local_validations": 0,
+    "remote_fallbacks": 0,
+}
+
+
+async def refresh_revocations() -> None:
+    """Fetch the latest revoked sessions filter from user-api."""
+    global _filter, _fetched_at
+    resp = await _request_shaped(
+        models.RevokedSessionsResponse, "GET", "/revoked_sessions"
+    )
+    _filter = BloomFilter(resp.num_bits, resp.num_hashes, base64.b64decode(resp.bits))
+    _fetched_at = time.monotonic()
+    _stats["refreshes"] += 1
+    _stats["revoked_count"] = resp.count
+
+
+async def refresh_revocations_loop() -> None:
+    """Loop to keep the revoked sessions filter fresh."""
+    while True:
+        try:
+            await refresh_revocations()
+        except Exception as e:
+            _stats["refresh_failures"] += 1
+            logger.error("Revocation refresh error", extra={"error": str(e)})
+        await asyncio.sleep(config.REVOCATION_REFRESH_SECONDS)
+
+
+def _prune_local() -> None:
+    """Forget local revocations old enough for any fresh filter to include."""
+    cutoff = time.monotonic() - config.REVOCATION_MAX_STALENESS_SECONDS
+    for local in (_local_sessions, _local_email_addresses):
+        for key in [key for key, revoked_at in local.items() if revoked_at < cutoff]:
+            del local[key]
+
+
+def revoke_session_locally(claims: TokenClaims) -> None:
+    """Stop validating a session here right away, e.g. after logout."""
+    _prune_local()
+    _local_sessions[str(claims.session_id)] = time.monotonic()
+
+
+def revoke_email_address_locally(email_address: str) -> None:
+    """Stop validating a user's sessions here right away, e.g. after deletion."""
+    _prune_local()
+    _local_email_addresses[email_address] = time.monotonic()
+
+
+def might_be_revoked(claims: TokenClaims) -> bool:
+    """Whether a session could have been revoked, so must be checked with user-api.
+
+    Answers yes whenever the filter is missing or too stale to trust.
+    """
+    if (
+        _filter is None
+        or time.monotonic() - _fetched_at > config.REVOCATION_MAX_STALENESS_SECONDS
+        or str(claims.session_id) in _filter
+        or str(claims.session_id) in _local_sessions
+        or claims.email_address in _local_email_addresses
+    ):
+        _stats["remote_fallbacks"] += 1
+        return True
+    _stats["local_validations"] += 1
+    return False
+
+
+def revocation_stats() -> Dict[str, float]:
+    """Get signed token validation statistics."""
+    age = time.monotonic() - _fetched_at if _filter is not None else -1
+    return {**_stats, "filter_age_seconds": age}
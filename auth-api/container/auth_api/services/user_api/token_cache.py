@@ -0,0 +1,132 @@
+from collections import OrderedDict
+from threading import Lock
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+from auth_api import config
+
+
+class TokenCache(object):
+    """Size-bounded LRU cache from client token to email address, with TTLs.
+
+    Unknown tokens are cached separately (negative entries), so a flood of garbage
+    tokens can't push valid tokens out of the cache.
+    """
+
+    def __init__(
+        self,
+        max_size: int,
+        ttl_seconds: float,
+        negative_max_size: int,
+        negative_ttl_seconds: float,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.negative_max_size = negative_max_size
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self._clock = clock
+        self._lock = Lock()
+
+        # token -> (email address, monotonic expiry), least recently used first
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        # token -> monotonic expiry, oldest first
+        self._negative: "OrderedDict[str, float]" = OrderedDict()
+
+        self._stats: Dict[str, int] = {
+            "hits": 0,
+            "negative_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "invalidations": 0,
+        }
+
+    def get(self, token: str) -> Tuple[bool, Optional[str]]:
+        """Look up a token, returning whether it was cached and its email address.
+
+        A cached token with no email address is known to be invalid.
+        """
+        now = self._clock()
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is not None:
+                if entry[1] > now:
+                    self._entries.move_to_end(token)
+                    self._stats["hits"] += 1
+                    return True, entry[0]
+                del self._entries[token]
+                self._stats["expirations"] += 1
+
+            negative_expiry = self._negative.get(token)
+            if negative_expiry is not None:
+                if negative_expiry > now:
+                    self._stats["negative_hits"] += 1
+                    return True, None
+                del self._negative[token]
+                self._stats["expirations"] += 1
+
+            self._stats["misses"] += 1
+            return False, None
+
+    def put(self, token: str, email_address: str, max_ttl_seconds: float) -> None:
+        """Cache a valid token, for no longer than max_ttl_seconds."""
+        ttl_seconds = min(self.ttl_seconds, max_ttl_seconds)
+        if ttl_seconds <= 0:
+            return
+        expiry = self._clock() + ttl_seconds
+        with self._lock:
+            # Don't resurrect a token invalidated while it was being looked up
+            if token in self._negative:
+                return
+            self._entries[token] = (email_address, expiry)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def put_negative(self, token: str) -> None:
+        """Cache a token as invalid."""
+        expiry = self._clock() + self.negative_ttl_seconds
+        with self._lock:
+            self._negative[token] = expiry
+            self._negative.move_to_end(token)
+            while len(self._negative) > self.negative_max_size:
+                self._negative.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def invalidate(self, token: str) -> None:
+        """Immediately mark a token as invalid, e.g. after logout."""
+        with self._lock:
+            if self._entries.pop(token, None) is not None:
+                self._stats["invalidations"] += 1
+        self.put_negative(token)
+
+    def invalidate_email_address(self, email_address: str) -> None:
+        """Drop every cached token for an email address, e.g. after user deletion."""
+        with self._lock:
+            tokens = [
+                token
+                for token, entry in self._entries.items()
+                if entry[0] == email_address
+            ]
+            for token in tokens:
+                del self._entries[token]
+            self._stats["invalidations"] += len(tokens)
+
+    def stats(self) -> Dict[str, int]:
+        """Get the cache's counters and current sizes."""
+        with self._lock:
+            return {
+                **self._stats,
+                "size": len(self._entries),
+                "negative_size": len(self._negative),
+            }
+
+
+token_cache = TokenCache(
+    max_size=config.TOKEN_CACHE_SIZE,
+    ttl_seconds=config.TOKEN_CACHE_TTL_SECONDS,
+    negative_max_size=config.TOKEN_NEGATIVE_CACHE_SIZE,
+    negative_ttl_seconds=config.TOKEN_NEGATIVE_CACHE_TTL_SECONDS,
+)
@@ -1,11 +1,22 @@
-from typing import Any, Callable, Dict, Type, TypeVar
+import logging
+import time
+from typing import Any, Callable, Dict, Optional, Type, TypeVar
 
-import requests
+import httpx
 
-from auth_api.config import USER_API_URL
-from auth_api.exceptions import ClientError, InternalError, NotFoundError
+from auth_api import config
+from auth_api.exceptions import (
+    ClientError,
+    InternalError,
+    NotFoundError,
+    OverloadedError,
+)
+from auth_api.metrics import Histogram, registry
+from auth_api.tracing import current_trace, new_span_id
 
 
+logger = logging.getLogger(__name__)
+
 T = TypeVar("T")
 
 # Which Errors to propagate expected status codes with
@@ -13,10 +24,59 @@ _handled_codes: Dict[int, Callable[[Any], Exception]] = {
     400: ClientError,
     404: NotFoundError,
     500: InternalError,
+    503: OverloadedError,
+}
+
+# Shared keep-alive client, opened in app_startup
+_client: Optional[httpx.AsyncClient] = None
+
+# Labelled by method alone, paths can hold tokens
+_request_seconds = registry.histogram(
+    "user_api_request_duration_seconds",
+    "Time to get responses from user-api, per method.",
+    ["method"],
+)
+_request_seconds_by_method: Dict[str, Histogram] = {
+    method: _request_seconds.labels(method)
+    for method in ["GET", "POST", "PUT", "DELETE"]
 }
+_pool_timeouts = registry.counter(
+    "user_api_pool_timeouts_total",
+    "Requests to user-api that found no pooled connection free in time.",
+).labels()
+
+
+async def open_client() -> None:
+    """Open the shared user-api client."""
+    global _client
+    if _client is not None:
+        return
+
+    # Backstop to check user api url is actually set
+    if config.USER_API_URL is None:
+        raise Exception("Missing USER_API_URL env var, should have been checked")
 
+    _client = httpx.AsyncClient(
+        base_url=config.USER_API_URL,
+        limits=httpx.Limits(
+            max_connections=config.USER_API_MAX_CONNECTIONS,
+            max_keepalive_connections=config.USER_API_MAX_KEEPALIVE,
+            keepalive_expiry=config.USER_API_KEEPALIVE_SECONDS,
+        ),
+        timeout=config.USER_API_TIMEOUT_SECONDS,
+    )
 
-def _decode_json_safe(resp: requests.Response) -> Any:
+
+async def close_client() -> None:
+    """Close the shared user-api client."""
+    global _client
+    if _client is None:
+        return
+    client, _client = _client, None
+    await client.aclose()
+
+
+def _decode_json_safe(resp: httpx.Response) -> Any:
     """Decode json data, raise InternalError if failure."""
     try:
         return resp.json()
@@ -24,31 +84,74 @@ def _decode_json_safe(resp: requests.Response) -> Any:
         raise InternalError(f"Failed to parse JSON for '{str(e)}' - {resp.text}")
 
 
-def _request(method: str, path: str, body: Any = None, params: Any = None) -> Any:
+async def _request(
+    method: str,
+    path: str,
+    body: Any = None,
+    params: Any = None,
+    timeout: Optional[float] = None,
+) -> Any:
     """Make a request to the user-api, handle bad status codes.
 
     This doesn't need headers, query string params, etc bc user-api currently doesn't
-    have any endpoints making use of those.
+    have any endpoints making use of those. The timeout defaults to
+    USER_API_TIMEOUT_SECONDS. Within a traced request, the trace and request id are
+    passed on, and user-api's timings are added to the trace's as user_api_*.
     """
-    # Backstop to check user api url is actually set
-    if USER_API_URL is None:
-        raise Exception("Missing USER_API_URL env var, should have been checked")
+    if _client is None:
+        raise Exception("User-api client used before being opened")
 
     # Prepare args
     if path and path[0] != "/":
-        print("Path '{path}' doesn't have leading '/'")  # TODO replace with log warning
+        logger.warning("Path doesn't have leading '/'", extra={"path": path})
         path = "/" + path
-    url = USER_API_URL + path
+
+    # Continue the trace into user-api, from a span for this request
+    trace = current_trace()
+    span_id = new_span_id()
+    headers = (
+        {}
+        if trace is None
+        else {
+            "traceparent": trace.traceparent_for(span_id),
+            "X-Request-ID": trace.request_id,
+        }
+    )
 
     # Make the request
-    # Let exceptions propagate as unhandled
-    resp = requests.request(method, url, json=body, params=params)
+    # Let exceptions other than running out of pooled connections propagate unhandled
+    start_t = time.perf_counter()
+    try:
+        resp = await _client.request(
+            method,
+            path,
+            json=body,
+            params=params,
+            headers=headers,
+            timeout=timeout or config.USER_API_TIMEOUT_SECONDS,
+        )
+    except httpx.PoolTimeout as e:
+        _pool_timeouts.inc()
+        raise OverloadedError(f"No connection to user-api available: {str(e)}")
+    end_t = time.perf_counter()
+    _request_seconds_by_method[method].observe(end_t - start_t)
+    if trace is not None:
+        # Not the path, it can hold tokens
+        trace.record(
+            "user_api",
+            start_t,
+            end_t,
+            span_id,
+            method=method,
+            status=resp.status_code,
+        )
+        trace.add_server_timing(resp.headers.get("Server-Timing", ""), "user_api_")
 
     # If 200, pass result up
     if resp.status_code == 200:
         return _decode_json_safe(resp) if resp.text else None
 
-    # If 400/404/500, propagate the same exc onward (unless caller catches)
+    # If 400/404/500/503, propagate the same exc onward (unless caller catches)
     elif resp.status_code in _handled_codes:
         detail = _decode_json_safe(resp).get("detail", "No Detail")
         MatchingError = _handled_codes[resp.status_code]
@@ -59,8 +162,13 @@ def _request(method: str, path: str, body: Any = None, params: Any = None) -> An
         raise Exception(f"Unexpected response {resp.status_code} - {resp.text}")
 
 
-def _request_shaped(
-    output_obj: Type[T], method: str, path: str, body: Any = None, params: Any = None
+async def _request_shaped(
+    output_obj: Type[T],
+    method: str,
+    path: str,
+    body: Any = None,
+    params: Any = None,
+    timeout: Optional[float] = None,
 ) -> T:
     """Request to user-api, shape the output object."""
     # Ensure output_obj is valid
@@ -68,7 +176,9 @@ def _request_shaped(
         raise Exception(f"Cannot parse into bad type '{type(output_obj)}'")
 
     # Get response
-    resp_raw = _request(method=method, path=path, body=body, params=params)
+    resp_raw = await _request(
+        method=method, path=path, body=body, params=params, timeout=timeout
+    )
 
     # Parse object
     # Let parsing exceptions propagate
@@ -0,0 +1,395 @@
+"""Request tracing, for Server-Timing headers and exporting spans.
+
+Each request gets a trace, continuing a trusted caller's from its traceparent header
+(W3C trace context) if it sent one. Timed work within the request is recorded as spans,
+totalled per name for the Server-Timing header. Sampled traces are also exported, in
+the OTLP JSON format, by a background thread - appended as lines to a file, or posted
+to a collector's /v1/traces.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+import json
+import logging
+import queue
+import random
+import re
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+import httpx
+
+from auth_api import config
+
+
+SERVICE_NAME = "auth-api"
+
+# Finished traces waiting to be exported, at most this many
+EXPORT_QUEUE_SIZE = 1000
+EXPORT_BATCH_SIZE = 100
+
+# version-trace_id-parent_id-flags, see https://www.w3.org/TR/trace-context/
+_traceparent_re = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+_request_id_re = re.compile(r"^[a-zA-Z0-9._-]{1,64}$")
+
+logger = logging.getLogger(__name__)
+
+_stats: Dict[str, float] = {
+    "traces_exported": 0,
+    "traces_dropped": 0,
+    "export_failures": 0,
+}
+
+
+def _new_trace_id() -> str:
+    return f"{random.getrandbits(128):032x}"
+
+
+def new_span_id() -> str:
+    """Make a span id, for spans whose id must be known before they're recorded."""
+    return f"{random.getrandbits(64):016x}"
+
+
+class Span:
+    """A timed piece of work within a trace."""
+
+    __slots__ = ("name", "span_id", "parent_id", "start", "end", "attributes")
+
+    def __init__(
+        self,
+        name: str,
+        span_id: str,
+        parent_id: Optional[str],
+        start: float,
+        end: float,
+        attributes: Dict[str, Any],
+    ) -> None:
+        self.name = name
+        self.span_id = span_id
+        self.parent_id = parent_id
+        # Unix seconds
+        self.start = start
+        self.end = end
+        self.attributes = attributes
+
+
+class Trace:
+    """The spans of one request or background job.
+
+    Durations are measured with perf_counter, and placed in wall time relative to
+    when the trace started.
+    """
+
+    __slots__ = (
+        "trace_id",
+        "request_id",
+        "root",
+        "sampled",
+        "timings",
+        "spans",
+        "_wall_start",
+        "_perf_start",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        trace_id: Optional[str] = None,
+        parent_id: Optional[str] = None,
+        request_id: Optional[str] = None,
+        sampled: Optional[bool] = None,
+    ) -> None:
+        self.trace_id = trace_id or _new_trace_id()
+        self.request_id = request_id or self.trace_id
+        self._wall_start = time.time()
+        self._perf_start = time.perf_counter()
+        self.root = Span(name, new_span_id(), parent_id, self._wall_start, 0.0, {})
+        if sampled is None:
+            sampled = bool(config.TRACE_EXPORT) and (
+                random.random() < config.TRACE_SAMPLE_RATE
+            )
+        self.sampled = sampled
+        # Seconds per span name, for Server-Timing
+        self.timings: Dict[str, float] = {}
+        self.spans: List[Span] = []
+
+    @property
+    def traceparent(self) -> str:
+        """Get the traceparent header continuing this trace from its root span."""
+        return self.traceparent_for(self.root.span_id)
+
+    def traceparent_for(self, span_id: str) -> str:
+        """Get the traceparent header continuing this trace from a span."""
+        return f"00-{self.trace_id}-{span_id}-{'01' if self.sampled else '00'}"
+
+    def record(
+        self,
+        name: str,
+        start: float,
+        end: float,
+        span_id: Optional[str] = None,
+        **attributes: Any,
+    ) -> None:
+        """Record a span between two perf_counter times."""
+        self.timings[name] = self.timings.get(name, 0.0) + end - start
+        if self.sampled:
+            offset = self._wall_start - self._perf_start
+            self.spans.append(
+                Span(
+                    name,
+                    span_id or new_span_id(),
+                    self.root.span_id,
+                    start + offset,
+                    end + offset,
+                    attributes,
+                )
+            )
+
+    def finish(self) -> float:
+        """End the trace, export it if sampled, return its duration in seconds."""
+        seconds = time.perf_counter() - self._perf_start
+        self.root.end = self._wall_start + seconds
+        if self.sampled:
+            _export(self)
+        return seconds
+
+    def add_server_timing(self, header: str, prefix: str) -> None:
+        """Add the timings of a service called, from its Server-Timing header."""
+        for metric in header.split(","):
+            name, *params = [part.strip() for part in metric.split(";")]
+            for param in params:
+                key, _, value = param.partition("=")
+                if name and key == "dur":
+                    try:
+                        seconds = float(value) / 1000
+                    except ValueError:
+                        continue
+                    full_name = prefix + name
+                    self.timings[full_name] = self.timings.get(full_name, 0.0) + seconds
+
+    def server_timing(self, total_seconds: float) -> str:
+        """Format the time spent per span name as a Server-Timing header.
+
+        Only the total, unless SERVER_TIMING_DETAIL.
+        """
+        metrics = []
+        if config.SERVER_TIMING_DETAIL:
+            metrics = [f"{name};dur={s * 1000:.1f}" for name, s in self.timings.items()]
+        metrics.append(f"total;dur={total_seconds * 1000:.1f}")
+        return ", ".join(metrics)
+
+
+# Trace of the request or job being handled, if any
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("trace", default=None)
+
+
+def current_trace() -> Optional[Trace]:
+    """Get the trace of the request or job being handled, if any."""
+    return _current_trace.get()
+
+
+def record_span(
+    name: str,
+    start: float,
+    end: Optional[float] = None,
+    span_id: Optional[str] = None,
+    **attributes: Any,
+) -> None:
+    """Record a span in the current trace, if any, between perf_counter times."""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.record(
+            name,
+            start,
+            time.perf_counter() if end is None else end,
+            span_id,
+            **attributes,
+        )
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[None]:
+    """Record the time spent within as a span in the current trace, if any."""
+    start_t = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(name, start_t, **attributes)
+
+
+def trace_from_headers(
+    name: str, traceparent: Optional[str], request_id: Optional[str]
+) -> Trace:
+    """Start a request's trace, continuing the caller's if its headers are valid.
+
+    The caller's traceparent is only followed with TRACE_TRUST_TRACEPARENT, else the
+    trace is a new one, sampled at TRACE_SAMPLE_RATE.
+    """
+    if request_id is not None and not _request_id_re.match(request_id):
+        request_id = None
+    match = _traceparent_re.match(traceparent or "")
+    if match is None or not config.TRACE_TRUST_TRACEPARENT:
+        return Trace(name, request_id=request_id)
+    trace_id, parent_id, flags = match.groups()
+    sampled = bool(config.TRACE_EXPORT) and bool(int(flags, 16) & 1)
+    return Trace(name, trace_id, parent_id, request_id, sampled)
+
+
+@contextmanager
+def start_trace(trace: Trace) -> Iterator[Trace]:
+    """Make the trace current within, including in tasks started within."""
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+@contextmanager
+def background_trace(name: str) -> Iterator[Trace]:
+    """Trace a background job, finishing the trace after."""
+    with start_trace(Trace(name)) as trace:
+        try:
+            yield trace
+        finally:
+            trace.finish()
+
+
+def _attribute(key: str, value: Any) -> Dict[str, Any]:
+    """Format an OTLP attribute."""
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    if isinstance(value, bytes):
+        value = value.decode("utf-8", "replace")
+    return {"key": key, "value": {"stringValue": " ".join(str(value).split())}}
+
+
+def _otlp_span(trace: Trace, span: Span, kind: int) -> Dict[str, Any]:
+    """Format a span in OTLP JSON."""
+    data = {
+        "traceId": trace.trace_id,
+        "spanId": span.span_id,
+        "name": span.name,
+        "kind": kind,
+        "startTimeUnixNano": str(int(span.start * 1e9)),
+        "endTimeUnixNano": str(int(span.end * 1e9)),
+        "attributes": [_attribute(k, v) for k, v in span.attributes.items()],
+    }
+    if span.parent_id is not None:
+        data["parentSpanId"] = span.parent_id
+    return data
+
+
+def otlp_json(traces: List[Trace]) -> Dict[str, Any]:
+    """Format traces as an OTLP JSON export request."""
+    spans = []
+    for trace in traces:
+        # Server for the root, internal for the rest
+        root = _otlp_span(trace, trace.root, 2)
+        root["attributes"].append(_attribute("request_id", trace.request_id))
+        spans.append(root)
+        spans.extend(_otlp_span(trace, span, 1) for span in trace.spans)
+    return {
+        "resourceSpans": [
+            {
+                "resource": {"attributes": [_attribute("service.name", SERVICE_NAME)]},
+                "scopeSpans": [{"scope": {"name": __name__}, "spans": spans}],
+            }
+        ]
+    }
+
+
+class _Exporter(threading.Thread):
+    """Thread writing batches of finished traces to a file or collector."""
+
+    def __init__(self, target: str) -> None:
+        super().__init__(name="trace-exporter", daemon=True)
+        self.target = target
+        self.queue: "queue.Queue[Optional[Trace]]" = queue.Queue(EXPORT_QUEUE_SIZE)
+
+    def run(self) -> None:
+        client = None if self.target.startswith("file:") else httpx.Client(timeout=5)
+        stopping = False
+        while not stopping:
+            batch: List[Trace] = []
+            item = self.queue.get()
+            while True:
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+                if len(batch) >= EXPORT_BATCH_SIZE:
+                    break
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+            if batch:
+                self._write(client, batch)
+        if client is not None:
+            client.close()
+
+    def _write(self, client: Optional[httpx.Client], batch: List[Trace]) -> None:
+        body = json.dumps(otlp_json(batch))
+        try:
+            if client is None:
+                with open(self.target.partition("file:")[2], "a") as f:
+                    f.write(body + "\n")
+            else:
+                client.post(
+                    self.target,
+                    content=body,
+                    headers={"Content-Type": "application/json"},
+                ).raise_for_status()
+            _stats["traces_exported"] += len(batch)
+        except Exception as e:
+            _stats["export_failures"] += 1
+            logger.warning("Trace export failed", extra={"error": str(e)})
+
+
+# Running exporter, started by start_exporter
+_exporter: Optional[_Exporter] = None
+
+
+def _export(trace: Trace) -> None:
+    """Queue a finished trace for export, dropping it if the queue is full."""
+    if _exporter is None:
+        return
+    try:
+        _exporter.queue.put_nowait(trace)
+    except queue.Full:
+        _stats["traces_dropped"] += 1
+
+
+def start_exporter() -> None:
+    """Start exporting sampled traces to TRACE_EXPORT, if set."""
+    global _exporter
+    if _exporter is not None or not config.TRACE_EXPORT:
+        return
+    if not config.TRACE_EXPORT.startswith(("file:", "http://", "https://")):
+        raise Exception(f"Unknown TRACE_EXPORT: {config.TRACE_EXPORT}")
+    _exporter = _Exporter(config.TRACE_EXPORT)
+    _exporter.start()
+
+
+def stop_exporter() -> None:
+    """Export any queued traces and stop the exporter thread."""
+    global _exporter
+    if _exporter is None:
+        return
+    exporter, _exporter = _exporter, None
+    try:
+        exporter.queue.put(None, timeout=10)
+    except queue.Full:
+        return
+    exporter.join(timeout=10)
+
+
+def tracing_stats() -> Dict[str, float]:
+    """Get how many traces were exported, dropped or failed to export."""
+    return dict(_stats)
@@ -0,0 +1,100 @@
+import asyncio
+
+from auth_api import bulkhead
+
+
+def _scope():
+    return {"type": "http", "method": "GET", "path": "/", "headers": []}
+
+
+async def _receive():
+    return {"type": "http.request", "body": b""}
+
+
+def test_limits_queues_and_rejects():
+    """Test that requests past the limit wait their turn, past the queue get 503s."""
+    limiter = bulkhead.Bulkhead("test_limits", limit=2, queue_size=1)
+    release = None
+    running = 0
+    most_running = 0
+
+    async def app(scope, receive, send):
+        nonlocal running, most_running
+        running += 1
+        most_running = max(most_running, running)
+        await release.wait()
+        running -= 1
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    wrapped = limiter.wrap(app)
+
+    async def request():
+        messages = []
+
+        async def send(message):
+            messages.append(message)
+
+        await wrapped(_scope(), _receive, send)
+        return messages[0]
+
+    async def run():
+        nonlocal release
+        release = asyncio.Event()
+        tasks = [asyncio.create_task(request()) for _ in range(4)]
+        await asyncio.sleep(0.01)
+        assert limiter._queued.value == 1
+        release.set()
+        return await asyncio.gather(*tasks)
+
+    starts = asyncio.run(run())
+
+    assert [start["status"] for start in starts] == [200, 200, 200, 503]
+    assert (b"retry-after", b"1") in starts[3]["headers"]
+    assert most_running == 2
+    assert limiter._rejected.value == 1
+    assert limiter._in_flight.value == 0
+    assert limiter._queued.value == 0
+
+
+def test_cancelled_waiter_leaves_queue():
+    """Test that a request cancelled while waiting gives up its place in the queue."""
+    limiter = bulkhead.Bulkhead("test_cancelled", limit=1, queue_size=1)
+
+    async def run():
+        assert await limiter._acquire()
+        waiter = asyncio.create_task(limiter._acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        assert limiter._queued.value == 0
+        limiter._release()
+        # The slot is free again, rather than handed to the cancelled request
+        assert await limiter._acquire()
+        limiter._release()
+
+    asyncio.run(run())
+    assert limiter._in_flight.value == 0
+
+
+def test_cancelled_waiter_skipped_by_release():
+    """Test that a cancelled request the release already skipped re-raises cleanly."""
+    limiter = bulkhead.Bulkhead("test_skipped", limit=1, queue_size=1)
+
+    async def run():
+        assert await limiter._acquire()
+        waiter = asyncio.create_task(limiter._acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        # Released before the cancelled request gets to run
+        limiter._release()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            pass
+        assert limiter._queued.value == 0
+        assert await limiter._acquire()
+        limiter._release()
+
+    asyncio.run(run())
+    assert limiter._in_flight.value == 0
@@ -0,0 +1,77 @@
+import json
+import logging
+
+import pytest
+
+from auth_api import logs, tracing
+
+
+def _record(level, msg="message", **extra):
+    record = logging.makeLogRecord({"levelno": level, "msg": msg, **extra})
+    record.levelname = logging.getLevelName(level)
+    return record
+
+
+def test_json_formatter():
+    """Test that records format as JSON lines, including extra fields."""
+    line = logs.JsonFormatter().format(_record(logging.INFO, error="bad input"))
+    data = json.loads(line)
+    assert data["level"] == "INFO"
+    assert data["message"] == "message"
+    assert data["error"] == "bad input"
+
+
+def test_parse_sample_rates():
+    """Test parsing sample rates by level name."""
+    assert logs.parse_sample_rates("debug=0.01, INFO=0.5") == {
+        logging.DEBUG: 0.01,
+        logging.INFO: 0.5,
+    }
+    assert logs.parse_sample_rates("") == {}
+    with pytest.raises(Exception):
+        logs.parse_sample_rates("LOUD=1")
+
+
+def test_rate_limit():
+    """Test that a burst is let through, then the rest are counted and dropped."""
+    log_filter = logs.SamplingFilter({}, rate_per_second=0, burst=3)
+    kept = [log_filter.filter(_record(logging.INFO)) for _ in range(5)]
+    assert kept == [True, True, True, False, False]
+    assert log_filter.filter(_record(logging.ERROR))
+
+    # The next record let through says how many were dropped before it
+    log_filter._tokens = 1
+    record = _record(logging.INFO)
+    assert log_filter.filter(record)
+    assert record.rate_limited == 2
+
+
+def test_sampling():
+    """Test that sampled levels keep about their rate, and warnings are all kept."""
+    log_filter = logs.SamplingFilter(
+        {logging.DEBUG: 0.1, logging.WARNING: 0.0}, rate_per_second=0, burst=1e6
+    )
+    kept = sum(log_filter.filter(_record(logging.DEBUG)) for _ in range(10000))
+    assert 500 < kept < 1500
+    assert log_filter.filter(_record(logging.WARNING))
+
+
+def test_queued_output(capsys):
+    """Test that records are written as JSON by the writer thread."""
+    logs.setup_logging()
+    try:
+        logging.getLogger("auth_api.test").warning("queued %s", "here", extra={"n": 1})
+    finally:
+        logs.shutdown_logging()
+    data = json.loads(capsys.readouterr().out.strip().splitlines()[-1])
+    assert data["message"] == "queued here"
+    assert data["logger"] == "auth_api.test"
+    assert data["n"] == 1
+
+
+def test_request_id():
+    """Test that records logged within a trace carry its request id."""
+    record = _record(logging.INFO)
+    with tracing.start_trace(tracing.Trace("request", request_id="req-1")):
+        assert logs._add_request_id(record)
+    assert record.request_id == "req-1"
@@ -0,0 +1,55 @@
+import asyncio
+import logging
+import time
+
+from auth_api import loop_monitor
+
+
+class _Records(logging.Handler):
+    def __init__(self) -> None:
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+def _block_the_loop():
+    time.sleep(0.3)
+
+
+def test_catches_blocking_call():
+    """Test that a blocking call is logged with its stack and route, and lag seen."""
+    monitor = loop_monitor.LoopMonitor(
+        lambda task: "GET /slow" if task.get_name() == "slow" else None,
+        interval_seconds=0.01,
+        threshold_seconds=0.05,
+    )
+    blocked_before = loop_monitor._blocked.labels("GET /slow").value
+    handler = _Records()
+    loop_monitor.logger.addHandler(handler)
+
+    async def slow():
+        _block_the_loop()
+
+    async def run():
+        monitor.start()
+        try:
+            await asyncio.sleep(0.05)
+            await asyncio.create_task(slow(), name="slow")
+            await asyncio.sleep(0.05)
+        finally:
+            monitor.stop()
+
+    try:
+        asyncio.run(run())
+    finally:
+        loop_monitor.logger.removeHandler(handler)
+
+    assert loop_monitor._blocked.labels("GET /slow").value == blocked_before + 1
+    assert monitor.stats()["lag_seconds_max"] >= 0.25
+    (record,) = handler.records
+    assert record.route == "GET /slow"
+    assert record.blocked_ms >= 250
+    assert record.stack[0].startswith("_block_the_loop (")
+    assert record.stack[1].startswith("slow (")
@@ -0,0 +1,88 @@
+import time
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+import pytest
+
+from auth_api import config
+from auth_api.routers import main, middleware
+
+
+def test_profiles_route():
+    """Test that a route's stacks are sampled, with the route as their root."""
+    app = FastAPI()
+
+    @app.get("/busy")
+    async def busy() -> str:
+        end_t = time.perf_counter() + 0.2
+        while time.perf_counter() < end_t:
+            pass
+        return "done"
+
+    @app.get("/quiet")
+    async def quiet() -> str:
+        end_t = time.perf_counter() + 0.1
+        while time.perf_counter() < end_t:
+            pass
+        return "done"
+
+    app.add_middleware(middleware.ProfilingMiddleware)
+    app.add_event_handler("startup", middleware.profiler.start)
+    app.add_event_handler("shutdown", middleware.profiler.stop)
+    middleware.instrument_routes(app.routes)
+
+    middleware.profiler.configure(0, "GET /busy")
+    try:
+        with TestClient(app) as client:
+            client.get("/busy")
+            client.get("/quiet")
+    finally:
+        middleware.profiler.configure(0, "")
+
+    stacks = middleware.profiler.collapsed().splitlines()
+    middleware.profiler.clear()
+    assert stacks
+    assert all(stack.startswith("GET /busy;") for stack in stacks)
+    assert any(";busy (" in stack for stack in stacks)
+    assert sum(int(stack.rsplit(" ", 1)[1]) for stack in stacks) >= 5
+
+
+@pytest.fixture
+def debug_token(monkeypatch):
+    monkeypatch.setattr(config, "DEBUG_TOKEN", "let-me-in")
+    return {"Authorization": "Bearer let-me-in"}
+
+
+def test_debug_endpoints(debug_token, monkeypatch):
+    """Test that the profiler is configured through the protected endpoints."""
+    client = TestClient(main.app)
+    assert client.get("/debug/profiler").status_code == 401
+    assert (
+        client.get("/debug/profiler", headers={"Authorization": "x"}).status_code == 401
+    )
+
+    resp = client.put("/debug/profiler", json={"sample_rate": 2}, headers=debug_token)
+    assert resp.status_code == 400
+    resp = client.put(
+        "/debug/profiler", json={"route": "GET /nowhere"}, headers=debug_token
+    )
+    assert resp.status_code == 400
+
+    main.instrument_routes(main.app.routes)
+    try:
+        resp = client.put(
+            "/debug/profiler",
+            json={"sample_rate": 0.5, "route": "POST /login"},
+            headers=debug_token,
+        )
+        assert resp.status_code == 200
+        assert resp.json()["sample_rate"] == 0.5
+        assert middleware.profiler.route == "POST /login"
+    finally:
+        middleware.profiler.configure(0, "")
+
+    resp = client.get("/debug/profiler/stacks", headers=debug_token)
+    assert resp.status_code == 200
+
+    monkeypatch.setattr(config, "DEBUG_TOKEN", "")
+    assert client.get("/debug/profiler", headers=debug_token).status_code == 404
@@ -0,0 +1,81 @@
+import base64
+import time
+from uuid import UUID
+
+from auth_api.services.user_api import revocations, signed_tokens
+from auth_api.services.user_api.bloom import BloomFilter
+from auth_api.services.user_api.signed_tokens import TokenClaims
+
+
+# Issued by user-api with key k1:test-secret, expiring in 2100
+TOKEN = (
+    "v1.k1.eyJzaWQiOiI2ZjFjMWM1Mi0wZDhlLTRmNDQtOWYwZS00ZDFhOWI2YzFlMDEiLCJ1aWQiOiIw"
+    "YjhlNGE1NS0zYjBmLTRjM2UtOGY1NS03ZDJjOWE0ZjNlMDIiLCJlbWwiOiJzb21lb25lQGV4YW1wbG"
+    "UuY29tIiwiZXhwIjo0MTAyNDQ0ODAwfQ.yWPUAja2GXwpn1pK8Nbc-VH2RrocoA9e60qkSpz-_GE"
+)
+SESSION_ID = UUID("6f1c1c52-0d8e-4f44-9f0e-4d1a9b6c1e01")
+OTHER_SESSION_ID = UUID("2a4b7c3d-1e5f-4a6b-8c7d-9e0f1a2b3c4d")
+USER_ID = UUID("0b8e4a55-3b0f-4c3e-8f55-7d2c9a4f3e02")
+
+# Built by user-api holding only SESSION_ID
+FILTER_BITS = base64.b64decode("YDA4HA4Hg8E=")
+
+
+def test_verifies_user_api_tokens(monkeypatch):
+    """Test that tokens issued by user-api verify here, only with the right key."""
+    monkeypatch.setattr(signed_tokens, "_signing_keys", [("k1", b"test-secret")])
+    claims = signed_tokens.verify(TOKEN)
+    assert claims is not None
+    assert claims.session_id == SESSION_ID
+    assert claims.email_address == "someone@example.com"
+
+    assert signed_tokens.verify(TOKEN.replace("eyJzaWQi", "eyJzaWqi")) is None
+    assert signed_tokens.verify("0f8e4a553b0f4c3e8f557d2c9a4f3e02") is None
+
+    monkeypatch.setattr(signed_tokens, "_signing_keys", [("k1", b"other")])
+    assert signed_tokens.verify(TOKEN) is None
+    monkeypatch.setattr(signed_tokens, "_signing_keys", [("k2", b"test-secret")])
+    assert signed_tokens.verify(TOKEN) is None
+
+
+def _claims(session_id, email_address="someone@example.com"):
+    return TokenClaims(
+        sid=session_id, uid=USER_ID, eml=email_address, exp=int(time.time()) + 60
+    )
+
+
+def test_might_be_revoked(monkeypatch):
+    """Test that revoked, stale or unknown filters send validation to user-api."""
+    bloom = BloomFilter(64, 22, FILTER_BITS)
+    monkeypatch.setattr(revocations, "_filter", bloom)
+    monkeypatch.setattr(revocations, "_fetched_at", time.monotonic())
+    assert revocations.might_be_revoked(_claims(SESSION_ID))
+    assert not revocations.might_be_revoked(_claims(OTHER_SESSION_ID))
+
+    monkeypatch.setattr(revocations.config, "REVOCATION_MAX_STALENESS_SECONDS", 10)
+    monkeypatch.setattr(revocations, "_fetched_at", time.monotonic() - 11)
+    assert revocations.might_be_revoked(_claims(OTHER_SESSION_ID))
+
+    monkeypatch.setattr(revocations, "_filter", None)
+    assert revocations.might_be_revoked(_claims(OTHER_SESSION_ID))
+
+
+def test_local_revocations(monkeypatch):
+    """Test that revocations made here apply before the filter catches up."""
+    monkeypatch.setattr(revocations, "_filter", BloomFilter(64, 22, FILTER_BITS))
+    monkeypatch.setattr(revocations, "_fetched_at", time.monotonic())
+    monkeypatch.setattr(revocations, "_local_sessions", {})
+    monkeypatch.setattr(revocations, "_local_email_addresses", {})
+
+    revocations.revoke_session_locally(_claims(OTHER_SESSION_ID))
+    assert revocations.might_be_revoked(_claims(OTHER_SESSION_ID))
+
+    third_session_id = UUID("3b5c8d4e-2f60-4b7c-9d8e-0f1a2b3c4d5e")
+    assert not revocations.might_be_revoked(_claims(third_session_id, "a@b.c"))
+    revocations.revoke_email_address_locally("a@b.c")
+    assert revocations.might_be_revoked(_claims(third_session_id, "a@b.c"))
+
+    monkeypatch.setattr(revocations.config, "REVOCATION_MAX_STALENESS_SECONDS", 10)
+    revocations._local_email_addresses["a@b.c"] = time.monotonic() - 11
+    revocations._prune_local()
+    assert not revocations.might_be_revoked(_claims(third_session_id, "a@b.c"))
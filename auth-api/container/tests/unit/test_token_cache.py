@@ -0,0 +1,80 @@
+from auth_api.services.user_api.token_cache import TokenCache
+
+
+class FakeClock:
+    """A clock that only moves when told to."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _make_cache(clock, max_size=2):
+    return TokenCache(
+        max_size=max_size,
+        ttl_seconds=30,
+        negative_max_size=2,
+        negative_ttl_seconds=5,
+        clock=clock,
+    )
+
+
+def test_hit_miss_and_expiry():
+    """Test that entries hit until their TTL, capped by the given max TTL."""
+    clock = FakeClock()
+    cache = _make_cache(clock)
+    assert cache.get("a") == (False, None)
+
+    cache.put("a", "a@b.c", max_ttl_seconds=10)
+    assert cache.get("a") == (True, "a@b.c")
+
+    clock.now += 11
+    assert cache.get("a") == (False, None)
+    assert cache.stats()["expirations"] == 1
+
+
+def test_lru_eviction():
+    """Test that the least recently used entry is evicted when full."""
+    cache = _make_cache(FakeClock())
+    cache.put("a", "a@b.c", max_ttl_seconds=60)
+    cache.put("b", "b@b.c", max_ttl_seconds=60)
+    cache.get("a")
+    cache.put("c", "c@b.c", max_ttl_seconds=60)
+
+    assert cache.get("b") == (False, None)
+    assert cache.get("a") == (True, "a@b.c")
+    assert cache.stats()["evictions"] == 1
+
+
+def test_negative_and_invalidate():
+    """Test that unknown and logged-out tokens are cached as invalid."""
+    clock = FakeClock()
+    cache = _make_cache(clock)
+    cache.put_negative("bad")
+    assert cache.get("bad") == (True, None)
+
+    cache.put("a", "a@b.c", max_ttl_seconds=60)
+    cache.invalidate("a")
+    assert cache.get("a") == (True, None)
+
+    # A lookup finishing after logout must not re-validate the token
+    cache.put("a", "a@b.c", max_ttl_seconds=60)
+    assert cache.get("a") == (True, None)
+
+    clock.now += 6
+    assert cache.get("bad") == (False, None)
+
+
+def test_invalidate_email_address():
+    """Test that all of a user's tokens are dropped together."""
+    cache = _make_cache(FakeClock(), max_size=10)
+    cache.put("a", "a@b.c", max_ttl_seconds=60)
+    cache.put("b", "a@b.c", max_ttl_seconds=60)
+    cache.put("c", "c@b.c", max_ttl_seconds=60)
+    cache.invalidate_email_address("a@b.c")
+
+    assert cache.get("a") == (False, None)
+    assert cache.get("b") == (False, None)
+    assert cache.get("c") == (True, "c@b.c")
@@ -0,0 +1,108 @@
+import json
+import time
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from auth_api import config, tracing
+from auth_api.routers import middleware
+
+
+PARENT = "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01"
+
+
+def test_trace_from_headers(monkeypatch):
+    """Test that a valid traceparent is continued, and invalid headers ignored."""
+    monkeypatch.setattr(config, "TRACE_EXPORT", "file:/dev/null")
+    monkeypatch.setattr(config, "TRACE_TRUST_TRACEPARENT", True)
+    trace = tracing.trace_from_headers("request", PARENT, "req-1")
+    assert trace.trace_id == "0af7651916cd43dd8448eb211c80319c"
+    assert trace.root.parent_id == "b7ad6b7169203331"
+    assert trace.request_id == "req-1"
+    assert trace.sampled
+    assert trace.traceparent.startswith("00-0af7651916cd43dd8448eb211c80319c-")
+    assert trace.traceparent.endswith("-01")
+
+    trace = tracing.trace_from_headers("request", "00-bad", "no spaces allowed")
+    assert len(trace.trace_id) == 32
+    assert trace.root.parent_id is None
+    assert trace.request_id == trace.trace_id
+
+
+def test_untrusted_traceparent(monkeypatch):
+    """Test that an untrusted caller's traceparent can't choose what's exported."""
+    monkeypatch.setattr(config, "TRACE_EXPORT", "file:/dev/null")
+    monkeypatch.setattr(config, "TRACE_TRUST_TRACEPARENT", False)
+    monkeypatch.setattr(config, "TRACE_SAMPLE_RATE", 0)
+    trace = tracing.trace_from_headers("request", PARENT, "req-1")
+    assert trace.trace_id != "0af7651916cd43dd8448eb211c80319c"
+    assert trace.root.parent_id is None
+    assert trace.request_id == "req-1"
+    assert not trace.sampled
+
+
+def test_server_timing(monkeypatch):
+    """Test that spans are totalled per name in the Server-Timing header."""
+    monkeypatch.setattr(config, "SERVER_TIMING_DETAIL", True)
+    trace = tracing.Trace("request", sampled=False)
+    with tracing.start_trace(trace):
+        tracing.record_span("db", 1.0, 1.002)
+        tracing.record_span("db", 2.0, 2.003)
+        tracing.record_span("hash", 3.0, 3.25)
+    assert trace.spans == []
+    assert trace.server_timing(0.3) == "db;dur=5.0, hash;dur=250.0, total;dur=300.0"
+    monkeypatch.setattr(config, "SERVER_TIMING_DETAIL", False)
+    assert trace.server_timing(0.3) == "total;dur=300.0"
+    # Nothing is recorded outside a trace
+    tracing.record_span("db", 1.0, 2.0)
+    assert trace.timings["db"] < 1
+
+
+def test_file_export(tmp_path, monkeypatch):
+    """Test that sampled traces are written to the file as OTLP JSON."""
+    path = tmp_path / "traces.jsonl"
+    monkeypatch.setattr(config, "TRACE_EXPORT", f"file:{path}")
+    monkeypatch.setattr(config, "TRACE_TRUST_TRACEPARENT", True)
+    tracing.start_exporter()
+    try:
+        trace = tracing.trace_from_headers("request", PARENT, "req-1")
+        with tracing.start_trace(trace):
+            start_t = time.perf_counter()
+            tracing.record_span("db", start_t, statement=b"SELECT\n  1")
+        trace.finish()
+    finally:
+        tracing.stop_exporter()
+
+    data = json.loads(path.read_text().splitlines()[-1])
+    root, db = data["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    assert root["traceId"] == db["traceId"] == trace.trace_id
+    assert root["parentSpanId"] == "b7ad6b7169203331"
+    assert db["parentSpanId"] == root["spanId"]
+    assert db["attributes"] == [
+        {"key": "statement", "value": {"stringValue": "SELECT 1"}}
+    ]
+    assert int(root["startTimeUnixNano"]) <= int(db["startTimeUnixNano"])
+
+
+def test_middleware_headers(monkeypatch):
+    """Test that responses get Server-Timing and the caller's request id."""
+    monkeypatch.setattr(config, "SERVER_TIMING_DETAIL", True)
+    app = FastAPI()
+
+    @app.get("/slow")
+    def slow() -> str:
+        with tracing.span("work"):
+            time.sleep(0.01)
+        return "done"
+
+    app.add_middleware(middleware.TracingMiddleware)
+    client = TestClient(app)
+
+    resp = client.get("/slow", headers={"X-Request-ID": "abc", "traceparent": PARENT})
+    assert resp.headers["X-Request-ID"] == "abc"
+    work, total = resp.headers["Server-Timing"].split(", ")
+    assert work.startswith("work;dur=")
+    assert float(work.split("=")[1]) >= 10
+    assert total.startswith("total;dur=")
+
+    assert len(client.get("/slow").headers["X-Request-ID"]) == 32
@@ -0,0 +1,76 @@
+import asyncio
+
+import httpx
+import pytest
+
+from auth_api import tracing
+from auth_api.exceptions import ClientError, NotFoundError, OverloadedError
+from auth_api.services.user_api import utils
+
+
+def _respond(status_code, json=None):
+    """Make a client whose every request gets the given response."""
+    transport = httpx.MockTransport(
+        lambda request: httpx.Response(status_code, json=json)
+    )
+    return httpx.AsyncClient(base_url="http://user-api", transport=transport)
+
+
+def test_request_ok(monkeypatch):
+    """Test that a 200 response's json is passed back."""
+    monkeypatch.setattr(utils, "_client", _respond(200, {"a": 1}))
+    assert asyncio.run(utils._request("GET", "/users")) == {"a": 1}
+
+
+@pytest.mark.parametrize(
+    "status_code,error",
+    [(400, ClientError), (404, NotFoundError), (503, OverloadedError)],
+)
+def test_request_errors(monkeypatch, status_code, error):
+    """Test that handled status codes become the matching exceptions."""
+    monkeypatch.setattr(utils, "_client", _respond(status_code, {"detail": "nope"}))
+    with pytest.raises(error, match="nope"):
+        asyncio.run(utils._request("GET", "/users"))
+
+
+def test_request_metrics(monkeypatch):
+    """Test that request latency is recorded per method, and pool timeouts counted."""
+    histogram = utils._request_seconds_by_method["PUT"]
+    count_before = histogram.count
+    monkeypatch.setattr(utils, "_client", _respond(200))
+    asyncio.run(utils._request("PUT", "/users"))
+    assert histogram.count == count_before + 1
+
+    def _timeout(request):
+        raise httpx.PoolTimeout("no connections")
+
+    timeouts_before = utils._pool_timeouts.value
+    client = httpx.AsyncClient(
+        base_url="http://user-api", transport=httpx.MockTransport(_timeout)
+    )
+    monkeypatch.setattr(utils, "_client", client)
+    with pytest.raises(OverloadedError):
+        asyncio.run(utils._request("PUT", "/users"))
+    assert utils._pool_timeouts.value == timeouts_before + 1
+
+
+def test_request_tracing(monkeypatch):
+    """Test that the trace is passed on, and user-api's timings added to it."""
+    sent = {}
+
+    def _handle(request):
+        sent.update(request.headers)
+        return httpx.Response(200, headers={"Server-Timing": "db;dur=2.5, total;dur=4"})
+
+    client = httpx.AsyncClient(
+        base_url="http://user-api", transport=httpx.MockTransport(_handle)
+    )
+    monkeypatch.setattr(utils, "_client", client)
+    trace = tracing.Trace("request", request_id="req-1", sampled=False)
+    with tracing.start_trace(trace):
+        asyncio.run(utils._request("GET", "/users"))
+
+    assert sent["x-request-id"] == "req-1"
+    assert sent["traceparent"].startswith(f"00-{trace.trace_id}-")
+    assert set(trace.timings) == {"user_api", "user_api_db", "user_api_total"}
+    assert trace.timings["user_api_db"] == 0.0025
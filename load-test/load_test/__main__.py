@@ -0,0 +1,129 @@
+"""Load test auth-api and user-api, or compare two load test results.
+
+Run `python3 -m load_test run --out result.json` to start fake sendgrid, user-api and
+auth-api locally against the Postgres in the DB_* env vars, drive a traffic mix
+through them, and write per-endpoint throughput, latency and error rates. Pass
+--auth-api-url and --user-api-url to target services that are already running.
+Run `python3 -m load_test compare old.json new.json` to see what changed.
+"""
+
+import argparse
+import asyncio
+from datetime import datetime, timezone
+import json
+from pathlib import Path
+import subprocess
+import sys
+import tempfile
+from typing import Any, Dict, List
+
+from load_test.report import compare_results, format_result
+from load_test.stack import REPO_ROOT, StackUrls, local_stack
+from load_test.traffic import MIXES, run_load
+
+
+def _git_revision() -> str:
+    """Get the checked out revision, to tell results apart, or "unknown"."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=REPO_ROOT,
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _parse_env(pairs: List[str]) -> Dict[str, str]:
+    """Parse KEY=VALUE pairs."""
+    env = {}
+    for pair in pairs:
+        key, sep, value = pair.partition("=")
+        if not sep:
+            raise SystemExit(f"Expected KEY=VALUE, got '{pair}'")
+        env[key] = value
+    return env
+
+
+def run(args: argparse.Namespace) -> None:
+    """Run a load test and write its result."""
+
+    def _load(urls: StackUrls) -> Dict[str, Any]:
+        return asyncio.run(
+            run_load(urls, args.mix, args.concurrency, args.seconds, args.seed_users)
+        )
+
+    if args.auth_api_url:
+        if not args.user_api_url:
+            raise SystemExit("--user-api-url is needed with --auth-api-url")
+        result = _load(
+            StackUrls(args.auth_api_url, args.user_api_url, args.sendgrid_url)
+        )
+        env: Dict[str, str] = {}
+    else:
+        env = _parse_env(args.env)
+        log_dir = Path(args.log_dir or tempfile.mkdtemp(prefix="load-test-"))
+        print(f"Starting local stack, logs in {log_dir}", file=sys.stderr)
+        with local_stack(args.base_port, env, log_dir) as urls:
+            result = _load(urls)
+
+    result = {
+        "revision": _git_revision(),
+        "time": datetime.now(timezone.utc).isoformat(),
+        "env": env,
+        **result,
+    }
+    print(format_result(result), file=sys.stderr)
+    if args.out:
+        Path(args.out).write_text(json.dumps(result, indent=2) + "\n")
+    else:
+        print(json.dumps(result, indent=2))
+
+
+def compare(args: argparse.Namespace) -> None:
+    """Print the changes between two load test results."""
+    old = json.loads(Path(args.old).read_text())
+    new = json.loads(Path(args.new).read_text())
+    print(compare_results(old, new))
+
+
+def main() -> None:
+    """Run the load test tool from the command line."""
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    subparsers = parser.add_subparsers(required=True)
+
+    run_parser = subparsers.add_parser("run", help="run a load test")
+    run_parser.set_defaults(func=run)
+    run_parser.add_argument("--mix", choices=sorted(MIXES), default="validate-heavy")
+    run_parser.add_argument("--concurrency", type=int, default=20)
+    run_parser.add_argument("--seconds", type=float, default=30)
+    run_parser.add_argument("--seed-users", type=int, default=50)
+    run_parser.add_argument("--out", help="write the result here, not stdout")
+    run_parser.add_argument(
+        "--env",
+        action="append",
+        default=[],
+        metavar="KEY=VALUE",
+        help="env var for the local services, e.g. BCRYPT_COST=10, repeatable",
+    )
+    run_parser.add_argument("--base-port", type=int, default=8300)
+    run_parser.add_argument("--log-dir", help="where local services log")
+    run_parser.add_argument("--auth-api-url", help="use running services instead")
+    run_parser.add_argument("--user-api-url")
+    run_parser.add_argument("--sendgrid-url", help="fake sendgrid of running services")
+
+    compare_parser = subparsers.add_parser("compare", help="compare two results")
+    compare_parser.set_defaults(func=compare)
+    compare_parser.add_argument("old")
+    compare_parser.add_argument("new")
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+from typing import Any, Dict, List
+
+
+def _row(name: str, summary: Dict[str, Any]) -> str:
+    """Format one endpoint's summary as a table row."""
+    latency = summary["latency_ms"]
+    return (
+        f"{name:<40} {summary['requests']:>8} {summary['rps']:>9.1f} "
+        f"{latency['p50']:>8.1f} {latency['p95']:>8.1f} {latency['p99']:>8.1f} "
+        f"{summary['error_rate']:>7.2%}"
+    )
+
+
+def format_result(result: Dict[str, Any]) -> str:
+    """Format a run's result as a table, for reading rather than comparing."""
+    lines = [
+        f"{'endpoint':<40} {'requests':>8} {'rps':>9} "
+        f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}"
+    ]
+    for name, summary in result["endpoints"].items():
+        lines.append(_row(name, summary))
+    lines.append(_row("total", result["total"]))
+    return "\n".join(lines)
+
+
+def _change(old: float, new: float) -> str:
+    """Format the relative change from old to new."""
+    if old == 0:
+        return "     new" if new else "       -"
+    return f"{(new - old) / old:>+8.1%}"
+
+
+def compare_results(old: Dict[str, Any], new: Dict[str, Any]) -> str:
+    """Format the change in throughput, latency and errors between two runs.
+
+    Endpoints only in one run are listed without changes.
+    """
+    lines: List[str] = []
+    for key in ["mix", "concurrency"]:
+        if old["config"][key] != new["config"][key]:
+            lines.append(
+                f"Warning: {key} differs, {old['config'][key]} vs {new['config'][key]}"
+            )
+    lines.append(
+        f"{'endpoint':<40} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8} "
+        f"{'errors':>15}"
+    )
+    rows = {**old["endpoints"], "total": old["total"]}
+    new_rows = {**new["endpoints"], "total": new["total"]}
+    names = sorted((set(rows) | set(new_rows)) - {"total"})
+    for name in [*names, "total"]:
+        if name not in new_rows:
+            lines.append(f"{name:<40} only in old")
+            continue
+        if name not in rows:
+            lines.append(f"{name:<40} only in new")
+            continue
+        before, after = rows[name], new_rows[name]
+        latency_changes = " ".join(
+            _change(before["latency_ms"][p], after["latency_ms"][p])
+            for p in ["p50", "p95", "p99"]
+        )
+        lines.append(
+            f"{name:<40} {_change(before['rps'], after['rps'])} {latency_changes} "
+            f"{before['error_rate']:>6.2%} -> {after['error_rate']:.2%}"
+        )
+    return "\n".join(lines)
@@ -0,0 +1,155 @@
+from contextlib import contextmanager
+import os
+from pathlib import Path
+import subprocess
+import sys
+import time
+from typing import Dict, Iterator, List, NamedTuple, Optional
+
+import httpx
+
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+USER_API_DIR = REPO_ROOT / "user-api" / "container"
+AUTH_API_DIR = REPO_ROOT / "auth-api" / "container"
+
+DB_ENV_VARS = ["DB_USER", "DB_PASS", "DB_ADDRESS", "DB_PORT", "DB_NAME"]
+STARTUP_TIMEOUT_SECONDS = 30
+
+
+class StackUrls(NamedTuple):
+    """Where each service of a running stack is listening."""
+
+    auth_api: str
+    user_api: str
+    # None if user-api has email disabled, and hands verify codes back directly
+    sendgrid: Optional[str]
+
+
+class _Process(NamedTuple):
+    """A service started by the stack, with its log file."""
+
+    name: str
+    popen: "subprocess.Popen[bytes]"
+    log_path: Path
+
+
+def _start(
+    name: str,
+    app: str,
+    port: int,
+    cwd: Path,
+    env: Dict[str, str],
+    log_dir: Path,
+) -> _Process:
+    """Start an app under uvicorn, logging to a file."""
+    log_path = log_dir / f"{name}.log"
+    with open(log_path, "wb") as log:
+        popen = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", app, "--port", str(port)],
+            cwd=cwd,
+            env=env,
+            stdout=log,
+            stderr=subprocess.STDOUT,
+        )
+    return _Process(name, popen, log_path)
+
+
+def _wait_until_up(process: _Process, url: str) -> None:
+    """Wait for a started service to answer, raise if it exits or takes too long."""
+    deadline = time.monotonic() + STARTUP_TIMEOUT_SECONDS
+    while time.monotonic() < deadline:
+        if process.popen.poll() is not None:
+            raise Exception(f"{process.name} exited, see {process.log_path}")
+        try:
+            if httpx.get(url).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.2)
+    raise Exception(f"{process.name} didn't start, see {process.log_path}")
+
+
+@contextmanager
+def local_stack(
+    base_port: int, extra_env: Dict[str, str], log_dir: Path
+) -> Iterator[StackUrls]:
+    """Run fake sendgrid, user-api and auth-api locally, stop them on exit.
+
+    User-api uses the Postgres named by the DB_* env vars, which is migrated first.
+    The extra env vars are passed to both services, overriding the defaults here.
+    """
+    missing = [var for var in DB_ENV_VARS if not os.getenv(var)]
+    if missing:
+        raise Exception(f"Missing env vars for the local Postgres: {missing}")
+    log_dir.mkdir(parents=True, exist_ok=True)
+
+    urls = StackUrls(
+        auth_api=f"http://127.0.0.1:{base_port}",
+        user_api=f"http://127.0.0.1:{base_port + 1}",
+        sendgrid=f"http://127.0.0.1:{base_port + 2}",
+    )
+    user_api_env = {
+        **os.environ,
+        "SENDGRID_KEY": "load-test",
+        "SENDGRID_URL": str(urls.sendgrid),
+        "EMAIL_OUTBOX_POLL_SECONDS": "0.1",
+        "DB_POOL_STARTUP_JITTER_SECONDS": "0",
+        **extra_env,
+    }
+    auth_api_env = {**os.environ, "USER_API_URL": urls.user_api, **extra_env}
+
+    with open(log_dir / "migrations.log", "wb") as log:
+        subprocess.run(
+            [sys.executable, "-m", "migrations.entrypoint"],
+            cwd=USER_API_DIR,
+            env=user_api_env,
+            stdout=log,
+            stderr=subprocess.STDOUT,
+            check=True,
+        )
+
+    processes: List[_Process] = []
+    try:
+        sendgrid = _start(
+            "fake-sendgrid",
+            "tests.fakes.sendgrid_server:app",
+            base_port + 2,
+            USER_API_DIR,
+            user_api_env,
+            log_dir,
+        )
+        processes.append(sendgrid)
+        _wait_until_up(sendgrid, f"{urls.sendgrid}/stats")
+
+        user_api = _start(
+            "user-api",
+            "user_api.routers.main:app",
+            base_port + 1,
+            USER_API_DIR,
+            user_api_env,
+            log_dir,
+        )
+        processes.append(user_api)
+        _wait_until_up(user_api, f"{urls.user_api}/ping")
+
+        auth_api = _start(
+            "auth-api",
+            "auth_api.routers.main:app",
+            base_port,
+            AUTH_API_DIR,
+            auth_api_env,
+            log_dir,
+        )
+        processes.append(auth_api)
+        _wait_until_up(auth_api, f"{urls.auth_api}/ping")
+
+        yield urls
+    finally:
+        for process in reversed(processes):
+            process.popen.terminate()
+        for process in processes:
+            try:
+                process.popen.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.popen.kill()
@@ -0,0 +1,75 @@
+import math
+from typing import Any, Dict, List, Optional
+
+
+PERCENTILES = [50, 95, 99]
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Get the nearest-rank percentile of already sorted values, 0 if empty."""
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(pct / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+class EndpointStats:
+    """Latencies and outcomes of every request made to one endpoint."""
+
+    def __init__(self) -> None:
+        self.latencies_ms: List[float] = []
+        self.errors: Dict[str, int] = {}
+
+    def record(self, latency_ms: float, error: Optional[str] = None) -> None:
+        """Record one request, with its status code or exception if it failed."""
+        self.latencies_ms.append(latency_ms)
+        if error is not None:
+            self.errors[error] = self.errors.get(error, 0) + 1
+
+    def summary(self, seconds: float) -> Dict[str, Any]:
+        """Summarize the requests made over a run of the given length."""
+        latencies = sorted(self.latencies_ms)
+        requests = len(latencies)
+        errors = sum(self.errors.values())
+        return {
+            "requests": requests,
+            "rps": requests / seconds if seconds > 0 else 0.0,
+            "errors": errors,
+            "error_rate": errors / requests if requests else 0.0,
+            "errors_by_kind": dict(sorted(self.errors.items())),
+            "latency_ms": {
+                **{f"p{pct}": percentile(latencies, pct) for pct in PERCENTILES},
+                "mean": sum(latencies) / requests if requests else 0.0,
+                "max": latencies[-1] if latencies else 0.0,
+            },
+        }
+
+
+class RunStats:
+    """Per-endpoint stats of a load test run."""
+
+    def __init__(self) -> None:
+        self.endpoints: Dict[str, EndpointStats] = {}
+
+    def record(
+        self, endpoint: str, latency_ms: float, error: Optional[str] = None
+    ) -> None:
+        """Record one request to an endpoint, named like 'auth-api GET /ping'."""
+        if endpoint not in self.endpoints:
+            self.endpoints[endpoint] = EndpointStats()
+        self.endpoints[endpoint].record(latency_ms, error)
+
+    def summary(self, seconds: float) -> Dict[str, Any]:
+        """Summarize every endpoint, and all of them together."""
+        total = EndpointStats()
+        for stats in self.endpoints.values():
+            total.latencies_ms.extend(stats.latencies_ms)
+            for kind, count in stats.errors.items():
+                total.errors[kind] = total.errors.get(kind, 0) + count
+        return {
+            "endpoints": {
+                name: self.endpoints[name].summary(seconds)
+                for name in sorted(self.endpoints)
+            },
+            "total": total.summary(seconds),
+        }
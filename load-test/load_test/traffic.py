@@ -0,0 +1,278 @@
+import asyncio
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+from load_test.stack import StackUrls
+from load_test.stats import RunStats
+
+
+PASSWORD = "load-test-password"
+VERIFY_CODE_TIMEOUT_SECONDS = 30
+LAST_NAMES = ["Test", "Tester", "Testing"]
+
+# Relative weights of each action, per named traffic mix
+MIXES: Dict[str, Dict[str, int]] = {
+    # Mostly token validation, like games checking their players on every request
+    "validate-heavy": {
+        "validate_token": 75,
+        "lookup_token": 10,
+        "login": 8,
+        "register": 4,
+        "logout": 2,
+        "change_name": 1,
+    },
+    # Sign-up spike, mostly bcrypt and email
+    "register-heavy": {
+        "validate_token": 30,
+        "login": 25,
+        "register": 25,
+        "change_name": 15,
+        "logout": 5,
+    },
+}
+
+
+class LoadUser:
+    """A registered user the load test acts as, and their current token."""
+
+    def __init__(self, email_address: str) -> None:
+        self.email_address = email_address
+        self.client_token: Optional[str] = None
+
+
+class Traffic:
+    """Makes requests to a stack as a pool of users, recording every request."""
+
+    def __init__(self, urls: StackUrls, client: httpx.AsyncClient, stats: RunStats):
+        self.urls = urls
+        self.client = client
+        self.stats = stats
+        self.users: List[LoadUser] = []
+        self.actions: Dict[str, Callable[[], Awaitable[None]]] = {
+            "validate_token": self.validate_token,
+            "lookup_token": self.lookup_token,
+            "login": self.login,
+            "register": self.register,
+            "logout": self.logout,
+            "change_name": self.change_name,
+        }
+
+    async def _request(
+        self, service: str, method: str, path: str, name: str = "", **kwargs: Any
+    ) -> Optional[httpx.Response]:
+        """Make a request and record it, return the response if it succeeded.
+
+        Requests are recorded under the name, or the path if it has no parameters.
+        """
+        base_url = self.urls.auth_api if service == "auth-api" else self.urls.user_api
+        endpoint = f"{service} {method} {name or path}"
+        error: Optional[str] = None
+        resp: Optional[httpx.Response] = None
+        start_t = time.perf_counter()
+        try:
+            resp = await self.client.request(method, f"{base_url}{path}", **kwargs)
+            if resp.status_code != 200:
+                error = str(resp.status_code)
+        except httpx.HTTPError as e:
+            error = type(e).__name__
+        self.stats.record(endpoint, (time.perf_counter() - start_t) * 1000, error)
+        return None if error else resp
+
+    def _random_user(self, logged_in: bool) -> Optional[LoadUser]:
+        """Pick a random user, optionally one that's logged in."""
+        users = [u for u in self.users if u.client_token] if logged_in else self.users
+        return random.choice(users) if users else None
+
+    async def _verify_code(self, email_address: str) -> Optional[str]:
+        """Wait for a verification email to reach fake sendgrid, get its code.
+
+        The wait is recorded too, as how long user-api's outbox takes to send it.
+        """
+        if self.urls.sendgrid is None:
+            raise Exception("No verify code returned, and no fake sendgrid to check")
+        start_t = time.perf_counter()
+        deadline = time.monotonic() + VERIFY_CODE_TIMEOUT_SECONDS
+        verify_code: Optional[str] = None
+        while verify_code is None and time.monotonic() < deadline:
+            resp = await self.client.get(f"{self.urls.sendgrid}/inbox/{email_address}")
+            if resp.status_code == 200:
+                verify_code = str(resp.json()["-verify_code-"])
+            else:
+                await asyncio.sleep(0.05)
+        self.stats.record(
+            "user-api email verification",
+            (time.perf_counter() - start_t) * 1000,
+            None if verify_code else "Timeout",
+        )
+        return verify_code
+
+    async def validate_token(self) -> None:
+        """Validate a token through auth-api, as games do."""
+        user = self._random_user(logged_in=True)
+        if user is None:
+            await self.login()
+            return
+        await self._request(
+            "auth-api",
+            "GET",
+            "/user_data",
+            headers={"Authorization": f"Bearer {user.client_token}"},
+        )
+
+    async def lookup_token(self) -> None:
+        """Look a token up directly in user-api, as internal services do."""
+        user = self._random_user(logged_in=True)
+        if user is None:
+            await self.login()
+            return
+        await self._request(
+            "user-api",
+            "GET",
+            f"/tokens/{user.client_token}",
+            name="/tokens/{client_token}",
+        )
+
+    async def login(self) -> None:
+        """Log a user in, replacing their token."""
+        user = self._random_user(logged_in=False)
+        if user is None:
+            await self.register()
+            return
+        await self._login_user(user)
+
+    async def _login_user(self, user: LoadUser) -> None:
+        """Log a specific user in, replacing their token."""
+        resp = await self._request(
+            "auth-api",
+            "POST",
+            "/login_json",
+            json={"email_address": user.email_address, "password": PASSWORD},
+        )
+        if resp is not None:
+            user.client_token = resp.json()["client_token"]
+
+    async def register(self) -> None:
+        """Register a new user, from preregistration to verified account."""
+        email_address = f"load-{random.getrandbits(64):016x}@example.com"
+        resp = await self._request(
+            "auth-api", "POST", "/preregister", json={"email_address": email_address}
+        )
+        if resp is None:
+            return
+        # Email disabled hands the code straight back
+        verify_code = resp.json().get("verify_code") or await self._verify_code(
+            email_address
+        )
+        if verify_code is None:
+            return
+        resp = await self._request(
+            "auth-api",
+            "GET",
+            "/preregister",
+            params={"email_address": email_address, "verify_code": verify_code},
+        )
+        if resp is None:
+            return
+        resp = await self._request(
+            "auth-api",
+            "POST",
+            "/register",
+            json={
+                "email_address": email_address,
+                "password": PASSWORD,
+                "first_name": "Load",
+                "last_name": "Test",
+                "verify_code": verify_code,
+            },
+        )
+        if resp is not None:
+            self.users.append(LoadUser(email_address))
+
+    async def logout(self) -> None:
+        """Log a user out."""
+        user = self._random_user(logged_in=True)
+        if user is None:
+            return
+        client_token, user.client_token = user.client_token, None
+        await self._request(
+            "auth-api",
+            "POST",
+            "/logout",
+            headers={"Authorization": f"Bearer {client_token}"},
+        )
+
+    async def change_name(self) -> None:
+        """Change a user's name."""
+        user = self._random_user(logged_in=True)
+        if user is None:
+            await self.login()
+            return
+        await self._request(
+            "auth-api",
+            "POST",
+            "/change_name",
+            json={"first_name": "Load", "last_name": random.choice(LAST_NAMES)},
+            headers={"Authorization": f"Bearer {user.client_token}"},
+        )
+
+
+async def _seed(traffic: Traffic, users: int, concurrency: int) -> None:
+    """Register and log in users before the run, without recording it."""
+    recorded, traffic.stats = traffic.stats, RunStats()
+    try:
+        for start in range(0, users, concurrency):
+            count = min(concurrency, users - start)
+            await asyncio.gather(*[traffic.register() for _ in range(count)])
+        for start in range(0, len(traffic.users), concurrency):
+            end = start + concurrency
+            batch = traffic.users[start:end]
+            await asyncio.gather(*[traffic._login_user(user) for user in batch])
+    finally:
+        seeded_stats, traffic.stats = traffic.stats, recorded
+    if not traffic.users:
+        raise Exception(f"Failed to seed any users: {seeded_stats.summary(1)}")
+
+
+async def run_load(
+    urls: StackUrls,
+    mix: str,
+    concurrency: int,
+    seconds: float,
+    seed_users: int,
+) -> Dict[str, Any]:
+    """Drive a traffic mix against a stack with concurrent workers, summarize it.
+
+    Each worker runs one action at a time, so this is a closed loop - throughput is
+    what the stack sustains at the given concurrency.
+    """
+    weights = MIXES[mix]
+    limits = httpx.Limits(max_connections=concurrency * 2)
+    async with httpx.AsyncClient(limits=limits, timeout=30) as client:
+        traffic = Traffic(urls, client, RunStats())
+        await _seed(traffic, seed_users, concurrency)
+
+        names = list(weights)
+        deadline = time.monotonic() + seconds
+
+        async def _worker() -> None:
+            while time.monotonic() < deadline:
+                [action] = random.choices(names, weights=[weights[n] for n in names])
+                await traffic.actions[action]()
+
+        start_t = time.monotonic()
+        await asyncio.gather(*[_worker() for _ in range(concurrency)])
+        elapsed = time.monotonic() - start_t
+
+    return {
+        "config": {
+            "mix": mix,
+            "weights": weights,
+            "concurrency": concurrency,
+            "seconds": elapsed,
+            "seed_users": seed_users,
+        },
+        **traffic.stats.summary(elapsed),
+    }
@@ -0,0 +1,16 @@
+#!/usr/bin/env bash
+# Expects to be run from load-test root
+
+set -e
+
+mypy load_test --strict
+black --check --diff load_test
+flake8 --max-line-length=88 load_test
+
+# No mypy for tests (gets messy with patching / mocking sometimes)
+black --check --diff tests
+flake8 --max-line-length=88 tests
+
+# shellcheck disable=SC2038
+find . -iname "*.sh" | xargs shellcheck
+echo "Shellcheck successful"
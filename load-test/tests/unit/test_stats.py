@@ -0,0 +1,57 @@
+from load_test.report import compare_results
+from load_test.stats import percentile, RunStats
+
+
+def test_percentile_nearest_rank():
+    """Test percentiles pick the nearest ranked value, and handle no values."""
+    values = [float(i) for i in range(1, 101)]
+    assert percentile(values, 50) == 50
+    assert percentile(values, 95) == 95
+    assert percentile(values, 99) == 99
+    assert percentile(values, 100) == 100
+    assert percentile([7.0], 99) == 7
+    assert percentile([], 50) == 0
+
+
+def test_summary_per_endpoint_and_total():
+    """Test requests are summarized per endpoint and all together."""
+    stats = RunStats()
+    for i in range(1, 11):
+        stats.record("auth-api GET /user_data", float(i))
+    stats.record("auth-api POST /login_json", 100, "500")
+    stats.record("auth-api POST /login_json", 50, "ReadTimeout")
+
+    summary = stats.summary(seconds=2)
+    user_data = summary["endpoints"]["auth-api GET /user_data"]
+    assert user_data["requests"] == 10
+    assert user_data["rps"] == 5
+    assert user_data["error_rate"] == 0
+    assert user_data["latency_ms"]["p50"] == 5
+    assert user_data["latency_ms"]["max"] == 10
+
+    login = summary["endpoints"]["auth-api POST /login_json"]
+    assert login["errors_by_kind"] == {"500": 1, "ReadTimeout": 1}
+    assert login["error_rate"] == 1
+
+    assert summary["total"]["requests"] == 12
+    assert summary["total"]["errors"] == 2
+    assert summary["total"]["latency_ms"]["max"] == 100
+
+
+def test_compare_results():
+    """Test comparing runs shows relative changes and unmatched endpoints."""
+    old_stats = RunStats()
+    old_stats.record("auth-api GET /user_data", 10)
+    old_stats.record("auth-api GET /gone", 10)
+    new_stats = RunStats()
+    new_stats.record("auth-api GET /user_data", 15)
+    new_stats.record("auth-api GET /user_data", 15)
+
+    config = {"mix": "validate-heavy", "concurrency": 1}
+    old = {"config": config, **old_stats.summary(seconds=1)}
+    new = {"config": config, **new_stats.summary(seconds=1)}
+    lines = compare_results(old, new).splitlines()
+    assert lines[1].startswith("auth-api GET /gone")
+    assert lines[1].endswith("only in old")
+    assert lines[2].split()[3:5] == ["+100.0%", "+50.0%"]
+    assert lines[-1].startswith("total")
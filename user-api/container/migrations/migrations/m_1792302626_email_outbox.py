@@ -0,0 +1,44 @@
+"""A single migration to run."""
+
+from typing import Any
+
+from psycopg import AsyncConnection
+
+from migrations.migration import BaseMigration
+
+
+class Migration(BaseMigration):
+    """A base migration."""
+
+    async def upgrade(self, conn: AsyncConnection[Any]) -> None:
+        """Run the migration."""
+        async with conn.cursor() as cur:
+            # Create tables
+            await cur.execute(
+                """
+                    CREATE TABLE email_outbox (
+                        email_id uuid PRIMARY KEY,
+                        to_email varchar(400) NOT NULL,
+                        subject text NOT NULL,
+                        html_content text NOT NULL,
+                        priority smallint NOT NULL,
+                        created_time timestamp NOT NULL,
+                        attempts integer NOT NULL,
+                        next_attempt_time timestamp NOT NULL
+                    );
+
+                    CREATE INDEX ON email_outbox (priority, next_attempt_time);
+                """,
+            )
+
+    async def was_successful(self, conn: AsyncConnection[Any]) -> bool:
+        """Check if the migration was successful.
+
+        Function may return False to indicate generic error. You are encouraged to raise
+        a descriptive exception inside the function instead. Both of these behaviors are
+        handled in the runner.
+
+        This function should _always_ return False / raise Exception if the migration
+        did not run at all.
+        """
+        return True
@@ -0,0 +1,67 @@
+"""A single migration to run."""
+
+from datetime import timedelta
+import os
+from typing import Any
+
+from psycopg import AsyncConnection
+
+from migrations.migration import BaseMigration
+
+
+class Migration(BaseMigration):
+    """A base migration."""
+
+    async def upgrade(self, conn: AsyncConnection[Any]) -> None:
+        """Run the migration."""
+        # Backfill with the TTLs the app was running with
+        ttl_hours = {
+            "pre_users": int(os.getenv("PREUSER_TTL_HOURS") or "24"),
+            "sessions": int(os.getenv("SESSION_TTL_HOURS") or "12"),
+            "password_resets": int(os.getenv("PASSWORD_RESET_TTL_HOURS") or "12"),
+        }
+
+        async with conn.cursor() as cur:
+            # Add expiry columns
+            for table, hours in ttl_hours.items():
+                await cur.execute(
+                    f"ALTER TABLE {table} ADD COLUMN expires_at timestamp"
+                )
+                await cur.execute(
+                    f"UPDATE {table} SET expires_at = created_time + %s",
+                    (timedelta(hours=hours),),
+                )
+                await cur.execute(
+                    f"ALTER TABLE {table} ALTER COLUMN expires_at SET NOT NULL"
+                )
+
+            # Index for expiry lookups and cleanup range deletes
+            await cur.execute(
+                """
+                    CREATE INDEX pre_users_expires_at_idx ON pre_users (expires_at);
+                    CREATE INDEX sessions_expires_at_idx ON sessions (expires_at);
+                    CREATE INDEX password_resets_expires_at_idx
+                    ON password_resets (expires_at);
+                """,
+            )
+
+            # Token lookups can be answered from the index alone
+            await cur.execute(
+                """
+                    ALTER TABLE sessions DROP CONSTRAINT sessions_client_token_key;
+                    CREATE UNIQUE INDEX sessions_client_token_key
+                    ON sessions (client_token) INCLUDE (user_id, expires_at);
+                """,
+            )
+
+    async def was_successful(self, conn: AsyncConnection[Any]) -> bool:
+        """Check if the migration was successful.
+
+        Function may return False to indicate generic error. You are encouraged to raise
+        a descriptive exception inside the function instead. Both of these behaviors are
+        handled in the runner.
+
+        This function should _always_ return False / raise Exception if the migration
+        did not run at all.
+        """
+        return True
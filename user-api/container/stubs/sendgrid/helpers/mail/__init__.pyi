@@ -1,9 +1,15 @@
 from .mail import Mail
 from .mail_settings import MailSettings
+from .personalization import Personalization
 from .sandbox_mode import SandBoxMode
+from .substitution import Substitution
+from .to_email import To
 
 __all__ = [
     "Mail",
     "MailSettings",
+    "Personalization",
     "SandBoxMode",
+    "Substitution",
+    "To",
 ]
@@ -1,6 +1,7 @@
 from typing import Any, Dict, List, Optional, Union
 
 from .mail_settings import MailSettings
+from .personalization import Personalization
 
 
 class Mail(object):
@@ -17,3 +18,11 @@ class Mail(object):
         global_substitutions: Optional[Dict[Any, Any]] = ...,
         is_multiple: bool = ...,
     ) -> None: ...
+
+    def add_personalization(
+        self,
+        personalization: Personalization,
+        index: int = ...,
+    ) -> None: ...
+
+    def get(self) -> Dict[str, Any]: ...
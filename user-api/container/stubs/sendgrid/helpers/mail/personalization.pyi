@@ -0,0 +1,17 @@
+from typing import Any, Dict, Union
+
+from .substitution import Substitution
+from .to_email import To
+
+
+class Personalization(object):
+    def __init__(self) -> None: ...
+
+    def add_to(self, email: To) -> None: ...
+
+    def add_substitution(
+        self,
+        substitution: Union[Substitution, Dict[str, str]],
+    ) -> None: ...
+
+    def get(self) -> Dict[str, Any]: ...
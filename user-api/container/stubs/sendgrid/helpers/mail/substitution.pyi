@@ -0,0 +1,12 @@
+from typing import Any, Optional
+
+
+class Substitution(object):
+    def __init__(
+        self,
+        key: Optional[str] = ...,
+        value: Optional[str] = ...,
+        p: Optional[int] = ...,
+    ) -> None: ...
+
+    def get(self) -> Any: ...
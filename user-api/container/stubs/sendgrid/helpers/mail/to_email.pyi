@@ -0,0 +1,13 @@
+from typing import Any, Optional
+
+
+class To(object):
+    def __init__(
+        self,
+        email: Optional[str] = ...,
+        name: Optional[str] = ...,
+        substitutions: Any = ...,
+        subject: Optional[str] = ...,
+        p: int = ...,
+        dynamic_template_data: Any = ...,
+    ) -> None: ...
@@ -0,0 +1,104 @@
+"""Benchmark email throughput against the local fake sendgrid server.
+
+Run with `python3 -m tests.bench.bench_email_client --emails 500`. Compares a new
+connection per email (how emails used to be sent), a shared pool with one request
+per email, and personalization batches.
+"""
+
+import argparse
+import asyncio
+import os
+import threading
+import time
+from typing import Awaitable, Callable, List
+
+import uvicorn
+
+
+PORT = 8025
+
+# Must be set before user_api.config is imported
+os.environ["SENDGRID_KEY"] = "bench"
+os.environ["SENDGRID_URL"] = f"http://127.0.0.1:{PORT}"
+
+from user_api.services import email  # noqa: E402
+
+
+def start_fake_sendgrid() -> None:
+    """Start the fake sendgrid server in a background thread."""
+    config = uvicorn.Config(
+        "tests.fakes.sendgrid_server:app", port=PORT, log_level="warning"
+    )
+    server = uvicorn.Server(config)
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+
+
+def recipients(count: int) -> List[email.EmailRecipient]:
+    """Make distinct recipients of a templated email."""
+    return [
+        email.EmailRecipient(f"user{i}@example.com", {"-verify_code-": f"{i:06d}"})
+        for i in range(count)
+    ]
+
+
+async def send(recipients: List[email.EmailRecipient]) -> None:
+    """Send the verification email to recipients, raising if any wasn't accepted."""
+    content = email.verification_email("000000")
+    errors = await email.send_batch(recipients, content.subject, content.html_content)
+    for error in errors:
+        if error is not None:
+            raise error
+
+
+async def new_connection_each(count: int) -> None:
+    """Send each email with its own client, one at a time."""
+    for recipient in recipients(count):
+        await email.open_email_client()
+        try:
+            await send([recipient])
+        finally:
+            await email.close_email_client()
+
+
+async def pooled_each(count: int) -> None:
+    """Send each email as its own request through the shared pool, concurrently."""
+    await email.open_email_client()
+    try:
+        await asyncio.gather(*[send([recipient]) for recipient in recipients(count)])
+    finally:
+        await email.close_email_client()
+
+
+async def pooled_batched(count: int) -> None:
+    """Send every email through the shared pool, batched into personalizations."""
+    await email.open_email_client()
+    try:
+        await send(recipients(count))
+    finally:
+        await email.close_email_client()
+
+
+def run(name: str, func: Callable[[int], Awaitable[None]], count: int) -> None:
+    """Time one strategy and print its throughput."""
+    start_t = time.perf_counter()
+    asyncio.run(func(count))
+    seconds = time.perf_counter() - start_t
+    print(f"{name:>20}: {count / seconds:10.1f} emails/s ({seconds:.2f} s)")
+
+
+def main() -> None:
+    """Run the benchmark from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--emails", type=int, default=500)
+    args = parser.parse_args()
+
+    start_fake_sendgrid()
+    run("new connection each", new_connection_each, min(args.emails, 100))
+    run("pooled each", pooled_each, args.emails)
+    run("pooled batched", pooled_batched, args.emails)
+
+
+if __name__ == "__main__":
+    main()
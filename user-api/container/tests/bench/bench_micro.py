@@ -0,0 +1,283 @@
+"""Microbenchmark hot user-api functions, failing on regressions against a baseline.
+
+Run with `python3 -m tests.bench.bench_micro`, which exits non-zero if any benchmark
+is slower than its baseline by more than --threshold. Record a new baseline with
+--save, on the machine the comparisons will run on. Timings are scaled by a pure
+python reference loop timed alongside them, so a uniformly faster or slower machine
+doesn't read as a change.
+"""
+
+import argparse
+import asyncio
+from datetime import datetime
+import json
+from pathlib import Path
+import sys
+import timeit
+from typing import Any, Callable, Dict, List, NamedTuple
+from uuid import uuid4
+
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from user_api import config
+from user_api.daos import Session, User
+from user_api.exceptions import ClientError
+from user_api.internal import hashing
+from user_api.internal.utils import (
+    legal_email_address,
+    legal_name,
+    legal_password,
+    legal_verify_code,
+    random_digits,
+)
+from user_api.routers import api_models
+from user_api.routers.utils import sanitize_excs
+
+
+BASELINE_PATH = Path(__file__).parent / "baselines" / "micro.json"
+BCRYPT_COSTS = [4, 8, 12]
+
+
+class Benchmark(NamedTuple):
+    """A function to time, and how many times to repeat the timing."""
+
+    name: str
+    func: Callable[[], Any]
+    repeat: int = 5
+
+
+def _reference() -> None:
+    """Fixed pure python work, to scale timings by the machine's speed."""
+    total = 0
+    for i in range(1000):
+        total += i * i
+
+
+def _validator_benchmarks() -> List[Benchmark]:
+    """Benchmark the input validators and verify code generation."""
+    return [
+        Benchmark(
+            "legal_email_address",
+            lambda: legal_email_address("someone.else+games@mail.example.com"),
+        ),
+        Benchmark(
+            "legal_email_address_too_long",
+            lambda: legal_email_address("a" * 320 + "@example.com"),
+        ),
+        Benchmark("legal_password", lambda: legal_password("c0rrect-h0rse-b@ttery")),
+        Benchmark("legal_name", lambda: legal_name("Peter-Schmidt")),
+        Benchmark("legal_verify_code", lambda: legal_verify_code("012345")),
+        Benchmark("random_digits", lambda: random_digits(config.VERIFY_CODE_LENGTH)),
+    ]
+
+
+def _hashing_benchmarks(loop: asyncio.AbstractEventLoop) -> List[Benchmark]:
+    """Benchmark hashing and verifying through the hash executor, at a few costs."""
+    benchmarks: List[Benchmark] = []
+    for cost in BCRYPT_COSTS:
+
+        def _hash(cost: int = cost) -> str:
+            config.BCRYPT_COST = cost
+            return loop.run_until_complete(hashing.password_hash("c0rrect-h0rse"))
+
+        hashed = _hash()
+
+        def _verify(hashed: str = hashed) -> bool:
+            return loop.run_until_complete(
+                hashing.password_verify("c0rrect-h0rse", hashed)
+            )
+
+        repeat = 3 if cost > 10 else 5
+        benchmarks.append(Benchmark(f"password_hash_cost_{cost}", _hash, repeat))
+        benchmarks.append(Benchmark(f"password_verify_cost_{cost}", _verify, repeat))
+    return benchmarks
+
+
+def _row_benchmarks() -> List[Benchmark]:
+    """Benchmark mapping DAO rows to objects, and objects back to query params."""
+    now = datetime.utcnow()
+    user_row = (uuid4(), "a@example.com", "x" * 60, "First", "Last", now, False)
+    session_row = (uuid4(), uuid4(), uuid4(), now, now)
+    user = User(*user_row)
+    return [
+        Benchmark("dao_row_user", lambda: User(*user_row)),
+        Benchmark("dao_row_session", lambda: Session(*session_row)),
+        Benchmark("dao_params_user", lambda: user._params()),
+    ]
+
+
+def _sanitize_ok() -> None:
+    with sanitize_excs():
+        pass
+
+
+def _sanitize_client_error() -> None:
+    try:
+        with sanitize_excs():
+            raise ClientError("Invalid email address")
+    except HTTPException:
+        pass
+
+
+def _sanitize_benchmarks() -> List[Benchmark]:
+    """Benchmark sanitize_excs, with and without an exception to translate."""
+    return [
+        Benchmark("sanitize_excs_ok", _sanitize_ok),
+        Benchmark("sanitize_excs_client_error", _sanitize_client_error),
+    ]
+
+
+def _model_benchmarks() -> List[Benchmark]:
+    """Benchmark parsing request models and rendering response models."""
+    create_body = json.dumps(
+        {
+            "email_address": "a@example.com",
+            "password": "c0rrect-h0rse",
+            "first_name": "First",
+            "last_name": "Last",
+            "verify_code": "012345",
+        }
+    )
+    reset_body = json.dumps(
+        {"email_address": "a@example.com", "password": "x", "reset_code": str(uuid4())}
+    )
+    user_resp = api_models.UserGetResponse(
+        email_address="a@example.com",
+        first_name="First",
+        last_name="Last",
+        login_notify=False,
+    )
+    token_resp = api_models.TokenGetResponse(
+        email_address="a@example.com", expiry_time=datetime.utcnow()
+    )
+
+    # Same steps as FastAPI - decode, validate, encode, dump
+    def _parse(model: Any, body: str) -> Callable[[], Any]:
+        return lambda: model.parse_obj(json.loads(body))
+
+    def _render(resp: Any) -> Callable[[], Any]:
+        return lambda: JSONResponse(content=jsonable_encoder(resp)).body
+
+    return [
+        Benchmark(
+            "parse_user_create_request",
+            _parse(api_models.UserCreateRequest, create_body),
+        ),
+        Benchmark(
+            "parse_user_reset_password_request",
+            _parse(api_models.UserResetPasswordRequest, reset_body),
+        ),
+        Benchmark("render_user_get_response", _render(user_resp)),
+        Benchmark("render_token_get_response", _render(token_resp)),
+    ]
+
+
+def measure(benchmark: Benchmark) -> float:
+    """Get the fastest nanoseconds per call over the benchmark's repeats.
+
+    Each repeat runs enough calls to take at least 0.2s. The fastest is the one least
+    disturbed by everything else running on the machine.
+    """
+    timer = timeit.Timer(benchmark.func)
+    number, _ = timer.autorange()
+    number = max(number, 1)
+    best = min(timer.repeat(repeat=benchmark.repeat, number=number))
+    return best / number * 1e9
+
+
+def find_regressions(
+    results: Dict[str, float], baseline: Dict[str, Any], threshold: float
+) -> Dict[str, str]:
+    """Describe each benchmark slower than its scaled baseline by over threshold."""
+    scale = results["reference"] / baseline["results"]["reference"]
+    regressions = {}
+    for name, ns in results.items():
+        if name == "reference" or name not in baseline["results"]:
+            continue
+        expected = baseline["results"][name] * scale
+        if ns > expected * (1 + threshold):
+            regressions[
+                name
+            ] = f"{ns:.0f} ns vs {expected:.0f} ns expected ({ns / expected - 1:+.0%})"
+    return regressions
+
+
+def run(benchmarks: List[Benchmark], results: Dict[str, float]) -> None:
+    """Measure benchmarks, keeping the fastest of this and any earlier result."""
+    for benchmark in benchmarks:
+        ns = measure(benchmark)
+        results[benchmark.name] = min(ns, results.get(benchmark.name, ns))
+        print(f"{benchmark.name:>36}: {results[benchmark.name]:14.0f} ns")
+
+
+def main() -> None:
+    """Run the benchmarks from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--threshold", type=float, default=0.25)
+    parser.add_argument(
+        "--retries", type=int, default=2, help="re-measure regressions this many times"
+    )
+    parser.add_argument("--save", action="store_true", help="write a new baseline")
+    parser.add_argument("--filter", default="", help="only run names containing this")
+    args = parser.parse_args()
+
+    loop = asyncio.new_event_loop()
+    benchmarks = [
+        Benchmark("reference", _reference),
+        *_validator_benchmarks(),
+        *_hashing_benchmarks(loop),
+        *_row_benchmarks(),
+        *_sanitize_benchmarks(),
+        *_model_benchmarks(),
+    ]
+    benchmarks = [
+        b for b in benchmarks if b.name == "reference" or args.filter in b.name
+    ]
+
+    results: Dict[str, float] = {}
+    try:
+        run(benchmarks, results)
+        if args.save:
+            # Filtered runs only update the baselines of what they ran
+            baseline: Dict[str, Any] = {"results": {}}
+            if args.baseline.exists():
+                baseline = json.loads(args.baseline.read_text())
+            saved = dict(results)
+            old_reference = baseline["results"].get("reference")
+            if args.filter and old_reference is not None:
+                # Keep the reference the rest were measured against, scaling these
+                scale = old_reference / saved.pop("reference")
+                saved = {name: ns * scale for name, ns in saved.items()}
+            baseline["results"].update(
+                {name: round(ns, 1) for name, ns in saved.items()}
+            )
+            args.baseline.parent.mkdir(parents=True, exist_ok=True)
+            args.baseline.write_text(json.dumps(baseline, indent=2) + "\n")
+            print(f"Saved baseline to {args.baseline}")
+            return
+
+        # Noise only ever slows a benchmark down, so re-measure before failing
+        baseline = json.loads(args.baseline.read_text())
+        regressions = find_regressions(results, baseline, args.threshold)
+        for _ in range(args.retries):
+            if not regressions:
+                break
+            print(f"Re-measuring {len(regressions)} possible regressions")
+            run([b for b in benchmarks if b.name in regressions], results)
+            regressions = find_regressions(results, baseline, args.threshold)
+    finally:
+        hashing.shutdown_hash_executor()
+        loop.close()
+
+    for name, regression in regressions.items():
+        print(f"REGRESSION {name}: {regression}")
+    if regressions:
+        sys.exit(1)
+    print(f"No regressions past {args.threshold:.0%}")
+
+
+if __name__ == "__main__":
+    main()
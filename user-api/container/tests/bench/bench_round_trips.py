@@ -0,0 +1,156 @@
+"""Count database round trips per auth flow.
+
+Run with `python3 -m tests.bench.bench_round_trips`, with the DB_* env vars pointing
+at a migrated database. Queries go through a local proxy that counts each burst of
+server replies to the client - one network round trip, however many statements it
+carries. Each flow is run with DB_PIPELINE off then on.
+"""
+
+import asyncio
+import os
+from typing import Awaitable, Callable, Dict, List, Tuple
+from uuid import uuid4
+
+PROXY_PORT = 6543
+
+# Must be set before user_api.config is imported
+DB_TARGET = (os.environ["DB_ADDRESS"], int(os.environ["DB_PORT"]))
+os.environ["DB_ADDRESS"] = "127.0.0.1"
+os.environ["DB_PORT"] = str(PROXY_PORT)
+os.environ["DB_POOL_MIN_SIZE"] = "1"
+os.environ["DB_POOL_MAX_SIZE"] = "1"
+os.environ["DB_POOL_STARTUP_JITTER_SECONDS"] = "0"
+os.environ["BCRYPT_COST"] = "4"
+os.environ.pop("SENDGRID_KEY", None)
+
+from user_api import config  # noqa: E402
+from user_api.daos import close_db_pool, open_db_pool  # noqa: E402
+from user_api.internal import auth  # noqa: E402
+
+
+round_trips = 0
+
+
+async def _pipe(
+    reader: asyncio.StreamReader,
+    writer: asyncio.StreamWriter,
+    from_client: bool,
+    server_spoke_last: List[bool],
+) -> None:
+    """Forward one direction of a proxied connection, counting round trips."""
+    global round_trips
+    while data := await reader.read(65536):
+        if not from_client and not server_spoke_last[0]:
+            round_trips += 1
+        server_spoke_last[0] = not from_client
+        writer.write(data)
+        await writer.drain()
+    writer.close()
+
+
+async def _proxy(
+    client_reader: asyncio.StreamReader, client_writer: asyncio.StreamWriter
+) -> None:
+    """Proxy one connection to the real database."""
+    host, port = DB_TARGET
+    if host.startswith("/"):
+        # A libpq-style unix socket directory
+        server_reader, server_writer = await asyncio.open_unix_connection(
+            f"{host}/.s.PGSQL.{port}"
+        )
+    else:
+        server_reader, server_writer = await asyncio.open_connection(host, port)
+    server_spoke_last = [True]
+    await asyncio.gather(
+        _pipe(client_reader, server_writer, True, server_spoke_last),
+        _pipe(server_reader, client_writer, False, server_spoke_last),
+    )
+
+
+async def run_flows() -> List[Tuple[str, int]]:
+    """Run every auth flow once as a new user, counting round trips of each."""
+    global round_trips
+    email_address = f"bench-{uuid4().hex[:12]}@example.com"
+    password = "bench-password-1"
+    state: Dict[str, str] = {}
+
+    async def preregister() -> None:
+        state["verify_code"] = (await auth.preregister(email_address)).verify_code
+
+    async def preregister_verify() -> None:
+        await auth.preregister_verify(email_address, state["verify_code"])
+
+    async def register() -> None:
+        await auth.register(
+            email_address, password, "Bench", "User", state["verify_code"]
+        )
+
+    async def login() -> None:
+        state["client_token"] = await auth.login(email_address, password)
+
+    async def find_token_owner() -> None:
+        await auth.find_token_owner(state["client_token"])
+
+    async def find_by_token() -> None:
+        await auth.find_by_token(state["client_token"])
+
+    async def change_name() -> None:
+        await auth.change_name(email_address, "Bench", "Renamed")
+
+    async def request_reset_password() -> None:
+        reset = await auth.request_reset_password(email_address)
+        state["reset_code"] = str(reset.reset_code)
+
+    async def reset_password() -> None:
+        await auth.reset_password(email_address, password, state["reset_code"])
+
+    async def logout() -> None:
+        await auth.logout_by_client_token(state["client_token"])
+
+    async def delete() -> None:
+        await auth.delete(email_address)
+
+    flows: List[Tuple[str, Callable[[], Awaitable[None]]]] = [
+        ("preregister", preregister),
+        ("preregister_verify", preregister_verify),
+        ("register", register),
+        ("login", login),
+        ("find_token_owner", find_token_owner),
+        ("find_by_token", find_by_token),
+        ("change_name", change_name),
+        ("request_reset_password", request_reset_password),
+        ("reset_password", reset_password),
+        ("logout", logout),
+        ("delete", delete),
+    ]
+    results = []
+    for name, flow in flows:
+        round_trips = 0
+        await flow()
+        results.append((name, round_trips))
+    return results
+
+
+async def main() -> None:
+    """Count round trips per flow, without then with pipelining."""
+    server = await asyncio.start_server(_proxy, "127.0.0.1", PROXY_PORT)
+    await open_db_pool()
+    try:
+        # Warm up, so prepared statements don't count against the first flows
+        await run_flows()
+
+        counts: Dict[bool, List[Tuple[str, int]]] = {}
+        for pipeline in (False, True):
+            config.DB_PIPELINE = pipeline
+            counts[pipeline] = await run_flows()
+    finally:
+        await close_db_pool()
+        server.close()
+
+    print(f"{'flow':<24}{'sequential':>12}{'pipelined':>12}")
+    for (name, before), (_, after) in zip(counts[False], counts[True]):
+        print(f"{name:<24}{before:>12}{after:>12}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,92 @@
+"""Benchmark building DAO rows, as pydantic models versus slotted dataclasses.
+
+Run with `python3 -m tests.bench.bench_rows --rows 100000`. Doesn't need a database -
+rows are built from tuples the way psycopg's row factories build them. The pydantic
+model is how User was defined when rows were read with class_row.
+"""
+
+import argparse
+from datetime import datetime
+import time
+import tracemalloc
+from typing import Any, Callable, List, Sequence, Tuple
+from uuid import uuid4
+
+from pydantic import BaseModel, UUID4
+
+from user_api.daos import User
+
+
+class PydanticUser(BaseModel):
+    """A registered user, as it was read before rows were slotted."""
+
+    user_id: UUID4
+    email_address: str
+    password_hash: str
+    first_name: str
+    last_name: str
+    created_time: datetime
+    login_notify: bool = False
+
+
+NAMES = [
+    "user_id",
+    "email_address",
+    "password_hash",
+    "first_name",
+    "last_name",
+    "created_time",
+    "login_notify",
+]
+
+
+def raw_rows(count: int) -> List[Tuple[Any, ...]]:
+    """Make rows as the database driver hands them over."""
+    now = datetime.utcnow()
+    return [
+        (uuid4(), f"user{i}@example.com", "x" * 60, "First", "Last", now, False)
+        for i in range(count)
+    ]
+
+
+def pydantic_row(values: Sequence[Any]) -> PydanticUser:
+    """Build a row the way class_row does, by keyword."""
+    return PydanticUser(**dict(zip(NAMES, values)))
+
+
+def slotted_row(values: Sequence[Any]) -> User:
+    """Build a row the way args_row does, positionally."""
+    return User(*values)
+
+
+def run(name: str, make: Callable[[Sequence[Any]], Any], rows: List[Any]) -> None:
+    """Time and measure building every row, print the per-row cost."""
+    start_t = time.perf_counter()
+    for row in rows:
+        make(row)
+    seconds = time.perf_counter() - start_t
+
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    kept = [make(row) for row in rows]
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    per_row_us = seconds / len(rows) * 1e6
+    per_row_bytes = (after - before) / len(kept)
+    print(f"{name:>10}: {per_row_us:6.2f} us/row {per_row_bytes:8.1f} bytes/row")
+
+
+def main() -> None:
+    """Run the benchmark from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100000)
+    args = parser.parse_args()
+
+    rows = raw_rows(args.rows)
+    run("pydantic", pydantic_row, rows)
+    run("slotted", slotted_row, rows)
+
+
+if __name__ == "__main__":
+    main()
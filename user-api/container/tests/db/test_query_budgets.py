@@ -0,0 +1,134 @@
+"""Check that endpoints run no more statements than their budget.
+
+Drives each endpoint through the app against the database in the DB_* env vars, and
+reads the statements each request ran from the route's query count metric. Raise a
+budget only when an endpoint's statements were added on purpose - a budget failing
+unexpectedly usually means a query inside a loop. Needs email disabled, like the
+integration tests, so verify and reset codes are returned.
+"""
+
+from contextlib import contextmanager
+from typing import Dict, Iterator
+from uuid import uuid4
+
+from fastapi.testclient import TestClient
+import pytest
+
+from user_api import config
+from user_api.routers import main, middleware
+
+
+def _query_counts() -> Dict[str, float]:
+    """Get the total statements run by each route so far."""
+    return {
+        f"{route.method} {route.path}": route.db_queries.sum
+        for route in middleware._route_metrics.values()
+    }
+
+
+@contextmanager
+def assert_max_queries(route: str, max_queries: int) -> Iterator[None]:
+    """Assert requests made within ran at most max_queries statements in total."""
+    before = _query_counts()
+    yield
+    ran = _query_counts()[route] - before.get(route, 0)
+    assert ran <= max_queries, f"{route} ran {ran:.0f} statements, over {max_queries}"
+
+
+@pytest.fixture(scope="module")
+def client() -> Iterator[TestClient]:
+    """Run the app, cheaply hashing passwords."""
+    if config.EMAIL_ENABLED:
+        pytest.skip("Needs email disabled")
+    config.BCRYPT_COST = 4
+    config.DB_POOL_STARTUP_JITTER_SECONDS = 0
+    with TestClient(main.app) as client:
+        yield client
+
+
+def _ok(resp):
+    """Assert a response succeeded, return its json if any."""
+    assert resp.status_code == 200, resp.text
+    return resp.json() if resp.text else None
+
+
+def test_user_lifecycle_budgets(client):
+    """Test that each step of a user's life stays within its statement budget."""
+    email = f"budget-{uuid4().hex[:12]}@example.com"
+    password = "c0rrect-h0rse"
+
+    with assert_max_queries("POST /pre_users", 3):
+        pre_user = _ok(client.post("/pre_users", json={"email_address": email}))
+    verify_code = pre_user["verify_code"]
+
+    with assert_max_queries("POST /pre_users/verify", 1):
+        _ok(
+            client.post(
+                "/pre_users/verify",
+                json={"email_address": email, "verify_code": verify_code},
+            )
+        )
+
+    with assert_max_queries("POST /users", 4):
+        _ok(
+            client.post(
+                "/users",
+                json={
+                    "email_address": email,
+                    "password": password,
+                    "first_name": "Budget",
+                    "last_name": "Test",
+                    "verify_code": verify_code,
+                },
+            )
+        )
+
+    with assert_max_queries("POST /users/login", 2):
+        login = _ok(
+            client.post(
+                "/users/login", json={"email_address": email, "password": password}
+            )
+        )
+    client_token = login["client_token"]
+
+    with assert_max_queries("GET /tokens/{client_token}", 1):
+        _ok(client.get(f"/tokens/{client_token}"))
+
+    with assert_max_queries("GET /users", 1):
+        _ok(client.get("/users", params={"email_address": email}))
+
+    # Every field at once, each is its own transaction
+    with assert_max_queries("PUT /users", 6):
+        _ok(
+            client.put(
+                "/users",
+                json={
+                    "email_address": email,
+                    "password": password + "2",
+                    "first_name": "Changed",
+                    "last_name": "Name",
+                    "login_notify": True,
+                },
+            )
+        )
+
+    with assert_max_queries("POST /password_resets", 3):
+        reset = _ok(client.post("/password_resets", json={"email_address": email}))
+
+    with assert_max_queries("POST /users/reset_password", 4):
+        _ok(
+            client.post(
+                "/users/reset_password",
+                json={
+                    "email_address": email,
+                    "password": password,
+                    "reset_code": reset["reset_code"],
+                },
+            )
+        )
+
+    with assert_max_queries("DELETE /tokens/{client_token}", 1):
+        _ok(client.delete(f"/tokens/{client_token}"))
+
+    with assert_max_queries("DELETE /users", 2):
+        _ok(client.delete("/users", params={"email_address": email}))
@@ -0,0 +1,181 @@
+"""Check that hot DAO queries are planned as index scans.
+
+Runs each DAO method against seeded tables, with a cursor that EXPLAINs the query
+instead of running it. Everything happens in a transaction that's rolled back, so
+this is safe to run against a live database. Needs the same DB_* env vars as the app.
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+import os
+from typing import Any, Dict, List
+from uuid import uuid4
+
+import psycopg
+from psycopg.rows import tuple_row
+
+from user_api.daos import PasswordReset, PreUser, Session, User
+
+
+SEED_ROWS = 2000
+
+
+class _Explained(Exception):
+    """Raised instead of running a query, carrying its plan."""
+
+    def __init__(self, plan: Dict[str, Any]):
+        super().__init__("Query explained")
+        self.plan = plan
+
+
+class _ExplainCursor(psycopg.AsyncCursor):
+    """Cursor that explains the first query it's given, rather than running it."""
+
+    async def execute(self, query, params=None, **kwargs):
+        cur = psycopg.AsyncCursor(self.connection, row_factory=tuple_row)
+        await cur.execute("EXPLAIN (FORMAT JSON) " + query, params)
+        row = await cur.fetchone()
+        raise _Explained(row[0][0]["Plan"])
+
+
+def _nodes(plan: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Flatten a plan tree into its nodes."""
+    nodes = [plan]
+    for child in plan.get("Plans", []):
+        nodes.extend(_nodes(child))
+    return nodes
+
+
+async def _seed(conn: psycopg.AsyncConnection) -> Dict[str, Any]:
+    """Fill the tables enough for the planner to prefer indexes, return some keys."""
+    now = datetime.utcnow()
+    users = [(uuid4(), f"plan-{i}@example.com") for i in range(SEED_ROWS)]
+    sessions = [(uuid4(), uuid4(), user_id) for user_id, _ in users]
+    async with conn.cursor() as cur:
+        await cur.executemany(
+            "INSERT INTO users VALUES (%s, %s, 'x', 'a', 'b', %s, false)",
+            [(user_id, email, now) for user_id, email in users],
+        )
+        await cur.executemany(
+            "INSERT INTO sessions VALUES (%s, %s, %s, %s, %s)",
+            [
+                (*session, now, now + timedelta(hours=i))
+                for i, session in enumerate(sessions)
+            ],
+        )
+        await cur.executemany(
+            "INSERT INTO pre_users VALUES (%s, '000000', %s, 0, %s)",
+            [
+                (email, now, now + timedelta(hours=i))
+                for i, (_, email) in enumerate(users)
+            ],
+        )
+        await cur.executemany(
+            "INSERT INTO password_resets VALUES (%s, %s, %s, %s)",
+            [
+                (uuid4(), user_id, now, now + timedelta(hours=i))
+                for i, (user_id, _) in enumerate(users)
+            ],
+        )
+        await cur.execute("ANALYZE users, sessions, pre_users, password_resets")
+    return {
+        "user_id": users[0][0],
+        "email_address": users[0][1],
+        "session_id": sessions[0][0],
+        "client_token": sessions[0][1],
+    }
+
+
+def _explain_all(calls):
+    """Explain each DAO call against seeded tables, return their plans by name."""
+
+    async def _inner():
+        conn = await psycopg.AsyncConnection.connect(
+            user=os.getenv("DB_USER"),
+            password=os.getenv("DB_PASS"),
+            host=os.getenv("DB_ADDRESS"),
+            port=os.getenv("DB_PORT"),
+            dbname=os.getenv("DB_NAME"),
+        )
+        try:
+            keys = await _seed(conn)
+            conn.cursor_factory = _ExplainCursor
+            plans = {}
+            for name, call in calls.items():
+                try:
+                    await call(conn, keys)
+                except _Explained as e:
+                    plans[name] = e.plan
+                else:
+                    raise Exception(f"{name} ran no query")
+            return plans
+        finally:
+            await conn.rollback()
+            await conn.close()
+
+    return asyncio.run(_inner())
+
+
+def _assert_index_scans(plan, index_name, index_only=False):
+    """Assert a plan reads via the given index, and never seq scans."""
+    nodes = _nodes(plan)
+    assert not [n for n in nodes if n["Node Type"] == "Seq Scan"], plan
+    scans = [n for n in nodes if n.get("Index Name") == index_name]
+    assert scans, plan
+    if index_only:
+        assert all(n["Node Type"] == "Index Only Scan" for n in scans), plan
+
+
+def test_lookups_use_indexes():
+    """Test that lookups filter expiry in SQL and are planned as index scans."""
+    plans = _explain_all(
+        {
+            "session_by_id": lambda conn, k: Session.find_by_id(conn, k["session_id"]),
+            "session_by_token": lambda conn, k: Session.find_by_token(
+                conn, k["client_token"]
+            ),
+            "profile_by_token": lambda conn, k: User.find_profile_by_token(
+                conn, k["client_token"]
+            ),
+            "token_owner": lambda conn, k: User.find_token_owner(
+                conn, k["client_token"]
+            ),
+            "session_owner": lambda conn, k: User.find_session_owner(
+                conn, k["session_id"]
+            ),
+            "pre_user": lambda conn, k: PreUser.find_by_email_address(
+                conn, k["email_address"]
+            ),
+            "reset_by_user": lambda conn, k: PasswordReset.find_by_user_id(
+                conn, k["user_id"]
+            ),
+        }
+    )
+    _assert_index_scans(plans["session_by_id"], "sessions_pkey")
+    _assert_index_scans(plans["session_by_token"], "sessions_client_token_key")
+    _assert_index_scans(
+        plans["profile_by_token"], "sessions_client_token_key", index_only=True
+    )
+    _assert_index_scans(
+        plans["token_owner"], "sessions_client_token_key", index_only=True
+    )
+    _assert_index_scans(plans["session_owner"], "sessions_pkey")
+    _assert_index_scans(plans["profile_by_token"], "users_pkey")
+    _assert_index_scans(plans["pre_user"], "pre_users_email_address_key")
+    _assert_index_scans(plans["reset_by_user"], "password_resets_user_id_key")
+
+
+def test_cleanup_uses_expiry_indexes():
+    """Test that cleanup range deletes find expired rows by their expiry index."""
+    plans = _explain_all(
+        {
+            "sessions": lambda conn, k: Session.cleanup_expired(conn, 1000),
+            "pre_users": lambda conn, k: PreUser.cleanup_expired(conn, 1000),
+            "password_resets": lambda conn, k: PasswordReset.cleanup_expired(
+                conn, 1000
+            ),
+        }
+    )
+    _assert_index_scans(plans["sessions"], "sessions_expires_at_idx")
+    _assert_index_scans(plans["pre_users"], "pre_users_expires_at_idx")
+    _assert_index_scans(plans["password_resets"], "password_resets_expires_at_idx")
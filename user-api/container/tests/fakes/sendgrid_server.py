@@ -0,0 +1,75 @@
+"""A local stand-in for sendgrid's mail send API, for offline benchmarking.
+
+Run with `uvicorn tests.fakes.sendgrid_server:app --port 8025`, then point user-api
+at it with `SENDGRID_URL=http://localhost:8025`. Set FAKE_SENDGRID_LATENCY_MS to
+simulate sendgrid's response time. The latest substitutions sent to each address can
+be read back from /inbox, so load tests can register users with email enabled.
+"""
+
+import asyncio
+from collections import OrderedDict
+import os
+from typing import Any, Dict
+
+from fastapi import FastAPI, Header, HTTPException, Request, Response
+
+
+LATENCY_SECONDS = float(os.getenv("FAKE_SENDGRID_LATENCY_MS") or "50") / 1000
+MAX_PERSONALIZATIONS = 1000
+MAX_INBOX_SIZE = 100000
+
+
+app = FastAPI()
+
+_stats: Dict[str, int] = {"requests": 0, "personalizations": 0, "in_flight_max": 0}
+_in_flight = 0
+_inbox: "OrderedDict[str, Dict[str, str]]" = OrderedDict()
+
+
+@app.post("/v3/mail/send")
+async def mail_send(
+    request: Request, authorization: str = Header(default="")
+) -> Response:
+    """Accept a mail send like sendgrid would, after a delay."""
+    global _in_flight
+    if not authorization.startswith("Bearer "):
+        raise HTTPException(status_code=401, detail="Missing api key")
+
+    body = await request.json()
+    personalizations = body.get("personalizations") or []
+    if not 1 <= len(personalizations) <= MAX_PERSONALIZATIONS:
+        raise HTTPException(status_code=400, detail="Bad personalizations")
+    if not body.get("subject") or not body.get("content"):
+        raise HTTPException(status_code=400, detail="Missing subject or content")
+
+    _in_flight += 1
+    _stats["in_flight_max"] = max(_stats["in_flight_max"], _in_flight)
+    try:
+        await asyncio.sleep(LATENCY_SECONDS)
+    finally:
+        _in_flight -= 1
+
+    _stats["requests"] += 1
+    _stats["personalizations"] += len(personalizations)
+    for personalization in personalizations:
+        for to in personalization.get("to") or []:
+            _inbox[to["email"]] = personalization.get("substitutions") or {}
+            _inbox.move_to_end(to["email"])
+    while len(_inbox) > MAX_INBOX_SIZE:
+        _inbox.popitem(last=False)
+    sandbox = body.get("mail_settings", {}).get("sandbox_mode", {}).get("enable")
+    return Response(status_code=200 if sandbox else 202)
+
+
+@app.get("/stats")
+def stats() -> Dict[str, Any]:
+    """Get counts of what's been sent so far."""
+    return _stats
+
+
+@app.get("/inbox/{to_email}")
+def inbox(to_email: str) -> Dict[str, str]:
+    """Get the substitutions of the latest email sent to an address."""
+    if to_email not in _inbox:
+        raise HTTPException(status_code=404, detail="No email sent to address")
+    return _inbox[to_email]
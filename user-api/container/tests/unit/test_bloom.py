@@ -0,0 +1,40 @@
+import base64
+from uuid import uuid4
+
+from user_api.internal.bloom import BloomFilter
+
+
+def test_no_false_negatives():
+    """Test that everything added is reported present."""
+    bloom = BloomFilter.for_capacity(1000, 0.01)
+    items = [str(uuid4()) for _ in range(1000)]
+    for item in items:
+        bloom.add(item)
+    assert all(item in bloom for item in items)
+
+
+def test_false_positive_rate():
+    """Test that a full filter stays near its false positive rate."""
+    bloom = BloomFilter.for_capacity(1000, 0.01)
+    for _ in range(1000):
+        bloom.add(str(uuid4()))
+    false_positives = sum(str(uuid4()) in bloom for _ in range(10000))
+    assert false_positives < 300
+
+
+def test_empty():
+    """Test that an empty filter contains nothing and still has a usable size."""
+    bloom = BloomFilter.for_capacity(0, 0.01)
+    assert bloom.num_bits >= 1024
+    assert str(uuid4()) not in bloom
+
+
+def test_rebuild():
+    """Test that a filter rebuilt from its transport form matches."""
+    bloom = BloomFilter.for_capacity(10, 0.01)
+    bloom.add("a")
+    rebuilt = BloomFilter(
+        bloom.num_bits, bloom.num_hashes, base64.b64decode(bloom.bits_b64())
+    )
+    assert "a" in rebuilt
+    assert rebuilt.bits == bloom.bits
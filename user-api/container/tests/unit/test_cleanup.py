@@ -0,0 +1,54 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+
+from user_api.internal import cleanup
+
+
+def test_next_interval_jittered(monkeypatch):
+    """Test that cleanup intervals vary within the jitter, and never go negative."""
+    monkeypatch.setattr(cleanup.config, "CLEANUP_INTERVAL_SECONDS", 3600)
+    monkeypatch.setattr(cleanup.config, "CLEANUP_JITTER_SECONDS", 300)
+    intervals = [cleanup.next_interval() for _ in range(100)]
+    assert all(3300 <= interval <= 3900 for interval in intervals)
+    assert len(set(intervals)) > 1
+
+    monkeypatch.setattr(cleanup.config, "CLEANUP_INTERVAL_SECONDS", 10)
+    assert all(cleanup.next_interval() >= 0 for _ in range(100))
+
+
+class _BrokenConnection:
+    """A connection that breaks once cleanup is done with it."""
+
+    def __init__(self):
+        self.closed = False
+
+    async def commit(self):
+        pass
+
+    async def rollback(self):
+        raise Exception("connection lost")
+
+    async def close(self):
+        self.closed = True
+
+
+def test_lock_released_if_unlock_fails(monkeypatch):
+    """Test that the connection is closed, not repooled holding the lock."""
+    conn = _BrokenConnection()
+
+    @asynccontextmanager
+    async def get_db_connection():
+        yield conn
+
+    async def try_advisory_lock(conn, lock_id):
+        return True
+
+    monkeypatch.setattr(cleanup, "get_db_connection", get_db_connection)
+    monkeypatch.setattr(cleanup, "try_advisory_lock", try_advisory_lock)
+    monkeypatch.setattr(cleanup, "_cleaners", {})
+
+    with pytest.raises(Exception, match="connection lost"):
+        asyncio.run(cleanup.run_cleanup())
+    assert conn.closed
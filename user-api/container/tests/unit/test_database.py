@@ -0,0 +1,67 @@
+import asyncio
+
+from psycopg.errors import PipelineAborted
+
+from user_api.daos import QueryStats, gather_queries
+
+
+async def _returns(value):
+    await asyncio.sleep(0)
+    return value
+
+
+async def _raises(exc):
+    await asyncio.sleep(0)
+    raise exc
+
+
+def test_gather_queries_results():
+    """Test that results come back in argument order."""
+    assert asyncio.run(gather_queries(_returns(1), _returns("a"))) == (1, "a")
+    assert asyncio.run(gather_queries()) == ()
+
+
+def test_gather_queries_raises_cause():
+    """Test that the failure behind an aborted pipeline is the one raised."""
+    finished = []
+
+    async def _finishes():
+        await asyncio.sleep(0.01)
+        finished.append(True)
+
+    async def _run():
+        await gather_queries(
+            _raises(PipelineAborted("aborted")),
+            _raises(ValueError("cause")),
+            _finishes(),
+        )
+
+    try:
+        asyncio.run(_run())
+    except ValueError as e:
+        assert str(e) == "cause"
+    else:
+        raise AssertionError("Expected ValueError")
+    assert finished == [True]
+
+    try:
+        asyncio.run(gather_queries(_raises(PipelineAborted("aborted"))))
+    except PipelineAborted:
+        pass
+    else:
+        raise AssertionError("Expected PipelineAborted")
+
+
+def test_query_stats_overlap():
+    """Test that overlapping statements count once towards busy time."""
+    stats = QueryStats()
+    stats._started(0.0)
+    stats._started(1.0)
+    stats._finished("SELECT 1", 0.0, 2.0)
+    stats._finished("SELECT   2\n  FROM x", 1.0, 4.0)
+    stats.transaction_seconds = 10.0
+    assert stats.count == 2
+    assert stats.busy_seconds == 4.0
+    assert stats.idle_in_transaction_seconds == 6.0
+    assert stats.slowest_seconds == 3.0
+    assert stats.slowest_statement() == "SELECT 2 FROM x"
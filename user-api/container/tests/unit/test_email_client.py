@@ -0,0 +1,117 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from user_api.services.email import client
+
+
+def _recording_client(requests, status_code=202):
+    """Make a client recording each request body, responding with the given code."""
+
+    def _handler(request):
+        requests.append(json.loads(request.content))
+        return httpx.Response(status_code)
+
+    transport = httpx.MockTransport(_handler)
+    return httpx.AsyncClient(base_url="http://sendgrid", transport=transport)
+
+
+@pytest.fixture
+def enabled(monkeypatch):
+    """Pretend a sendgrid key is configured."""
+    monkeypatch.setattr(client, "EMAIL_ENABLED", True)
+    monkeypatch.setattr(client, "SENDGRID_KEY", "key")
+
+
+def test_send_batch_personalizes(monkeypatch, enabled):
+    """Test that each recipient gets their own personalization, chunked by size."""
+    requests = []
+    monkeypatch.setattr(client, "_client", _recording_client(requests))
+    monkeypatch.setattr(client, "SENDGRID_MAX_BATCH_SIZE", 2)
+
+    recipients = [
+        client.EmailRecipient(f"u{i}@example.com", {"-code-": str(i)}) for i in range(5)
+    ]
+    asyncio.run(client.send_batch(recipients, "Subject", "Code -code-"))
+
+    assert [len(r["personalizations"]) for r in requests] == [2, 2, 1]
+    personalizations = [p for r in requests for p in r["personalizations"]]
+    assert sorted(p["to"][0]["email"] for p in personalizations) == sorted(
+        r.to_email for r in recipients
+    )
+    for p in personalizations:
+        assert p["substitutions"]["-code-"] == p["to"][0]["email"][1]
+
+
+def test_send_batch_isolates_rejected(monkeypatch, enabled):
+    """Test that a rejected chunk is resent per recipient, failing only the bad one."""
+    requests = []
+
+    def _handler(request):
+        body = json.loads(request.content)
+        requests.append(body)
+        emails = [p["to"][0]["email"] for p in body["personalizations"]]
+        return httpx.Response(400 if "bad@example.com" in emails else 202)
+
+    transport = httpx.MockTransport(_handler)
+    monkeypatch.setattr(
+        client,
+        "_client",
+        httpx.AsyncClient(base_url="http://sendgrid", transport=transport),
+    )
+    monkeypatch.setattr(client, "SENDGRID_MAX_BATCH_SIZE", 2)
+
+    addresses = ["u0@example.com", "bad@example.com", "u2@example.com"]
+    recipients = [client.EmailRecipient(a, {}) for a in addresses]
+    errors = asyncio.run(client.send_batch(recipients, "Subject", "Body"))
+
+    assert errors[0] is None and errors[2] is None
+    assert isinstance(errors[1], client.SendError) and errors[1].rejected
+    # The rejected chunk, then each of its recipients, then the last chunk
+    assert [len(r["personalizations"]) for r in requests] == [2, 1, 1, 1]
+
+
+def test_send_batch_outage(monkeypatch, enabled):
+    """Test that chunks after a failed one aren't tried, and every one fails."""
+    requests = []
+    monkeypatch.setattr(client, "_client", _recording_client(requests, status_code=503))
+    monkeypatch.setattr(client, "SENDGRID_MAX_BATCH_SIZE", 2)
+
+    recipients = [client.EmailRecipient(f"u{i}@example.com", {}) for i in range(3)]
+    errors = asyncio.run(client.send_batch(recipients, "Subject", "Body"))
+
+    assert len(requests) == 1
+    assert all(isinstance(e, client.SendError) and not e.rejected for e in errors)
+    assert "unexpected mail status: 503" in str(errors[2])
+
+
+def test_send_batch_outage_while_resending(monkeypatch, enabled):
+    """Test that resends stop at an outage, leaving the rest to retry with backoff."""
+    requests = []
+
+    def _handler(request):
+        body = json.loads(request.content)
+        requests.append(body)
+        emails = [p["to"][0]["email"] for p in body["personalizations"]]
+        if len(emails) > 1:
+            return httpx.Response(400)
+        return httpx.Response(503 if emails == ["u1@example.com"] else 202)
+
+    transport = httpx.MockTransport(_handler)
+    monkeypatch.setattr(
+        client,
+        "_client",
+        httpx.AsyncClient(base_url="http://sendgrid", transport=transport),
+    )
+    monkeypatch.setattr(client, "SENDGRID_MAX_BATCH_SIZE", 3)
+
+    recipients = [client.EmailRecipient(f"u{i}@example.com", {}) for i in range(5)]
+    errors = asyncio.run(client.send_batch(recipients, "Subject", "Body"))
+
+    # The rejected chunk, then its recipients up to the outage, nothing after
+    assert [len(r["personalizations"]) for r in requests] == [3, 1, 1]
+    assert errors[0] is None
+    assert all(e is errors[1] for e in errors[1:])
+    assert isinstance(errors[1], client.SendError) and not errors[1].rejected
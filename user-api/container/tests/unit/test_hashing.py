@@ -0,0 +1,51 @@
+import asyncio
+
+import pytest
+
+from user_api import calibrate
+from user_api.exceptions import OverloadedError
+from user_api.internal import hashing
+
+
+def test_hash_verify_roundtrip():
+    """Test that a hashed password verifies, and a different one doesn't."""
+
+    async def _inner():
+        hashed = await hashing.password_hash("hunter22")
+        assert await hashing.password_verify("hunter22", hashed)
+        assert not await hashing.password_verify("hunter23", hashed)
+
+    asyncio.run(_inner())
+    stats = hashing.hashing_stats()
+    assert stats["completed"] >= 3
+    assert stats["in_flight"] == 0
+
+
+def test_rejects_when_queue_full(monkeypatch):
+    """Test that hashes beyond the workers and queue are rejected."""
+    monkeypatch.setattr(hashing.config, "HASH_WORKERS", 1)
+    monkeypatch.setattr(hashing.config, "HASH_QUEUE_SIZE", 0)
+    monkeypatch.setattr(hashing, "_in_flight", 1)
+
+    with pytest.raises(OverloadedError):
+        asyncio.run(hashing.password_hash("hunter22"))
+
+
+def test_needs_rehash(monkeypatch):
+    """Test that hashes are flagged for rehash only when their cost differs."""
+    monkeypatch.setattr(hashing.config, "BCRYPT_COST", 12)
+    hash_12 = "$2b$12$" + "a" * 53
+    hash_10 = "$2b$10$" + "a" * 53
+
+    assert hashing.hash_cost(hash_12) == 12
+    assert not hashing.needs_rehash(hash_12)
+    assert hashing.needs_rehash(hash_10)
+
+
+def test_calibrate_stops_over_target():
+    """Test that calibration stops at the first cost over the target."""
+    recommended, results = calibrate.calibrate(
+        target_seconds=0.0, min_cost=4, max_cost=6, rounds=1
+    )
+    assert recommended is None
+    assert len(results) == 1
@@ -0,0 +1,62 @@
+import gc
+
+import pytest
+
+from user_api import memory
+from user_api.daos import User
+
+
+_kept = []
+
+
+def _cache_things():
+    _kept.append([object() for _ in range(10000)])
+
+
+def _handle_request():
+    _cache_things()
+
+
+def test_stats():
+    """Test that memory and gc stats are read, and collections timed."""
+    memory.time_gc()
+    gc.collect()
+    stats = memory.memory_stats()
+    assert stats["resident_bytes"] > 0
+    assert stats["resident_bytes_max"] >= stats["resident_bytes"] / 2
+    gc_stats = memory.gc_stats()
+    assert gc_stats["gen2_collections"] >= 1
+    assert gc_stats["pause_seconds_total"] > 0
+
+
+def test_package_functions():
+    """Test that methods are found, including classmethods."""
+    functions = memory.package_functions("user_api.daos")
+    assert functions[User.create.__code__] == "user_api.daos.user.User.create"
+    assert (
+        functions[User.find_by_email_address.__code__]
+        == "user_api.daos.user.User.find_by_email_address"
+    )
+
+
+def test_diff_attribution():
+    """Test that allocations kept since the snapshot are attributed."""
+    routes = memory.FunctionIndex({_handle_request.__code__: "GET /things"})
+    calls = memory.FunctionIndex({_cache_things.__code__: "cache_things"})
+    with pytest.raises(Exception, match="isn't started"):
+        memory.take_snapshot()
+
+    memory.start_tracing(16)
+    try:
+        memory.take_snapshot()
+        _handle_request()
+        diff = memory.diff_snapshot(routes, calls, limit=5)
+    finally:
+        memory.stop_tracing()
+        _kept.clear()
+
+    assert diff["by_route"]["GET /things"] > 10000 * 16
+    assert diff["by_call"]["cache_things"] == diff["by_route"]["GET /things"]
+    assert diff["top"][0]["route"] == "GET /things"
+    assert "test_memory.py:" in diff["top"][0]["traceback"][0]
+    assert memory.memory_stats()["traced_bytes"] == 0
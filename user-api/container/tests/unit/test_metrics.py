@@ -0,0 +1,88 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from user_api import config
+from user_api.metrics import Registry
+from user_api.routers import main, middleware
+
+
+def test_render():
+    """Test that counters and gauges render with their help, type and labels."""
+    registry = Registry()
+    counter = registry.counter("things_total", "Things.", ["kind"])
+    counter.labels('a"b').inc(2)
+    registry.gauge("level", "Level.").labels().set(1.5)
+    assert registry.render() == (
+        "# HELP things_total Things.\n"
+        "# TYPE things_total counter\n"
+        'things_total{kind="a\\"b"} 2.0\n'
+        "# HELP level Level.\n"
+        "# TYPE level gauge\n"
+        "level 1.5\n"
+    )
+
+
+def test_histogram_buckets():
+    """Test that histogram buckets are cumulative and end with +Inf."""
+    registry = Registry()
+    histogram = registry.histogram("wait_seconds", "Wait.", ["op"], [0.1, 1.0])
+    child = histogram.labels("x")
+    for value in [0.05, 0.1, 0.5, 5.0]:
+        child.observe(value)
+    lines = registry.render().splitlines()
+    assert lines[2:] == [
+        'wait_seconds_bucket{op="x",le="0.1"} 2',
+        'wait_seconds_bucket{op="x",le="1.0"} 3',
+        'wait_seconds_bucket{op="x",le="+Inf"} 4',
+        'wait_seconds_sum{op="x"} 5.65',
+        'wait_seconds_count{op="x"} 4',
+    ]
+
+
+def test_collect_stats():
+    """Test that stats are read when rendered, counters getting a _total suffix."""
+    registry = Registry()
+    stats = {"runs": 1, "seconds_total": 2.0, "depth": 3}
+    registry.collect_stats("job", lambda: stats, counters={"runs", "seconds_total"})
+    stats["runs"] = 4
+    samples = [
+        line for line in registry.render().splitlines() if not line.startswith("#")
+    ]
+    assert samples == ["job_runs_total 4.0", "job_seconds_total 2.0", "job_depth 3.0"]
+
+
+def test_middleware():
+    """Test that requests are recorded under their route, unmatched ones together."""
+    app = FastAPI()
+
+    @app.get("/things/{thing_id}")
+    def get_thing(thing_id: str) -> str:
+        return thing_id
+
+    app.add_middleware(middleware.MetricsMiddleware)
+    middleware.instrument_routes(app.routes)
+    route = middleware._route_metrics[get_thing]
+    unmatched_before = middleware._unmatched.statuses[404].value
+
+    client = TestClient(app)
+    client.get("/things/a")
+    client.get("/things/b")
+    client.get("/nothing")
+
+    assert route.path == "/things/{thing_id}"
+    assert route.duration.count == 2
+    assert route.statuses[200].value == 2
+    assert middleware._unmatched.statuses[404].value == unmatched_before + 1
+
+
+def test_metrics_token(monkeypatch):
+    """Test that metrics need the debug token only once it's required."""
+    monkeypatch.setattr(config, "DEBUG_TOKEN", "let-me-in")
+    client = TestClient(main.app)
+    assert client.get("/metrics").status_code == 200
+
+    monkeypatch.setattr(config, "METRICS_REQUIRE_TOKEN", True)
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/stats").status_code == 401
+    resp = client.get("/metrics", headers={"Authorization": "Bearer let-me-in"})
+    assert resp.status_code == 200
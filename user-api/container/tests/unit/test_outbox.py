@@ -0,0 +1,96 @@
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime
+from uuid import uuid4
+
+from user_api.daos import OutboxEmail
+from user_api.internal import outbox
+from user_api.services import email
+
+
+def test_retry_delay_backs_off_to_cap(monkeypatch):
+    """Test that retry delays double per attempt, jittered, up to the cap."""
+    monkeypatch.setattr(outbox.config, "EMAIL_OUTBOX_BACKOFF_SECONDS", 5)
+    monkeypatch.setattr(outbox.config, "EMAIL_OUTBOX_MAX_BACKOFF_SECONDS", 60)
+
+    for attempts, ceiling in [(1, 5), (2, 10), (3, 20), (4, 40), (5, 60), (20, 60)]:
+        for _ in range(20):
+            delay = outbox.retry_delay(attempts)
+            assert ceiling / 2 <= delay <= ceiling
+
+
+def _outbox_email(to_email, subject="Subject", priority=0):
+    now = datetime.utcnow()
+    return OutboxEmail(uuid4(), to_email, subject, "Body", priority, now, 1, now, {})
+
+
+def test_codes_sent_before_notifications(monkeypatch):
+    """Test that emails the user is waiting on are sent before the rest."""
+    Priority = outbox.EmailPriority
+    claimed = [
+        _outbox_email("a@example.com", "Login", Priority.LOGIN_NOTIFICATION),
+        _outbox_email("b@example.com", "Welcome", Priority.WELCOME),
+        _outbox_email("c@example.com", "Reset", Priority.PASSWORD_RESET),
+        _outbox_email("d@example.com", "Login", Priority.LOGIN_NOTIFICATION),
+        _outbox_email("e@example.com", "Verify", Priority.VERIFICATION),
+    ]
+
+    @asynccontextmanager
+    async def get_db_connection():
+        yield None
+
+    async def claim_due(conn, limit, lease_until):
+        return claimed
+
+    async def count_by_priority(conn):
+        return []
+
+    sent = []
+
+    async def send_batch(recipients, subject, html_content):
+        sent.append((subject, [r.to_email for r in recipients]))
+        await asyncio.sleep(0.01)
+        return [None] * len(recipients)
+
+    async def settle(outbox_email, error):
+        pass
+
+    monkeypatch.setattr(outbox, "get_db_connection", get_db_connection)
+    monkeypatch.setattr(outbox.OutboxEmail, "claim_due", claim_due)
+    monkeypatch.setattr(outbox.OutboxEmail, "count_by_priority", count_by_priority)
+    monkeypatch.setattr(outbox.email, "send_batch", send_batch)
+    monkeypatch.setattr(outbox, "_settle", settle)
+    assert asyncio.run(outbox.send_outbox_once()) == 5
+
+    assert sent == [
+        ("Verify", ["e@example.com"]),
+        ("Reset", ["c@example.com"]),
+        ("Welcome", ["b@example.com"]),
+        ("Login", ["a@example.com", "d@example.com"]),
+    ]
+
+
+def test_send_batch_settles_each_email(monkeypatch):
+    """Test that each email is settled by its own outcome, despite others failing."""
+    batch = [_outbox_email(f"u{i}@example.com") for i in range(3)]
+    bad = email.SendError("Got unexpected mail status: 400", 400)
+
+    async def send_batch(recipients, subject, html_content):
+        return [None, bad, None]
+
+    settled = []
+
+    async def settle(outbox_email, error):
+        settled.append((outbox_email.to_email, error))
+        if outbox_email.to_email == "u0@example.com":
+            raise Exception("OutboxEmail missing or reclaimed in db")
+
+    monkeypatch.setattr(outbox.email, "send_batch", send_batch)
+    monkeypatch.setattr(outbox, "_settle", settle)
+    asyncio.run(outbox._send_batch(batch))
+
+    assert settled == [
+        ("u0@example.com", None),
+        ("u1@example.com", bad),
+        ("u2@example.com", None),
+    ]
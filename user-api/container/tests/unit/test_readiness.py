@@ -0,0 +1,79 @@
+import asyncio
+
+import fastapi.routing
+from fastapi.testclient import TestClient
+
+from user_api import config, readiness
+from user_api.routers import main
+
+
+def test_cached_probe():
+    """Test that the probe runs once per interval however often it's checked."""
+    calls = 0
+    fail = False
+
+    async def probe():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        if fail:
+            raise Exception("db down")
+
+    cached = readiness.CachedProbe(probe, interval_seconds=0.1, timeout_seconds=1)
+
+    async def run():
+        nonlocal fail
+        assert await asyncio.gather(*[cached.check() for _ in range(5)]) == [None] * 5
+        assert calls == 1
+        fail = True
+        assert await cached.check() is None
+        await asyncio.sleep(0.1)
+        assert await cached.check() == "Exception: db down"
+        assert calls == 2
+
+    asyncio.run(run())
+
+
+def test_cached_probe_timeout():
+    """Test that a hung probe fails once it's timed out."""
+
+    async def probe():
+        await asyncio.sleep(1)
+
+    cached = readiness.CachedProbe(probe, interval_seconds=1, timeout_seconds=0.01)
+    assert asyncio.run(cached.check()) == "Timed out after 0.01s"
+
+
+def test_readiness():
+    """Test that every failing check is reported, and ready once they pass."""
+    lag = 0.5
+
+    async def check_lag():
+        return readiness.over("Lag seconds", lag, 0.25)
+
+    async def check_db():
+        return None
+
+    ready = readiness.Readiness()
+    ready.add_check("event_loop", check_lag)
+    ready.add_check("db", check_db)
+
+    assert asyncio.run(ready.check()) == {"event_loop": "Lag seconds 0.5 over 0.25"}
+    assert readiness._ready.value == 0
+    lag = 0.1
+    assert asyncio.run(ready.check()) == {}
+    assert readiness._ready.value == 1
+
+
+def test_liveness_skips_threadpool(monkeypatch):
+    """Test that /ping and /stats answer without the threadpool, however saturated."""
+
+    async def saturated(func, *args, **kwargs):
+        raise Exception("Threadpool saturated")
+
+    monkeypatch.setattr(fastapi.routing, "run_in_threadpool", saturated)
+    monkeypatch.setattr(config, "DEBUG_TOKEN", "let-me-in")
+    client = TestClient(main.app)
+    assert client.get("/ping").text == "pong"
+    resp = client.get("/stats", headers={"Authorization": "Bearer let-me-in"})
+    assert resp.status_code == 200
@@ -0,0 +1,80 @@
+import time
+from uuid import uuid4
+
+from user_api.internal import signed_tokens
+from user_api.internal.signed_tokens import TokenClaims
+
+
+def _claims(expires_in: float = 3600) -> TokenClaims:
+    """Make claims for a fresh session."""
+    return TokenClaims(
+        sid=uuid4(),
+        uid=uuid4(),
+        eml="someone@example.com",
+        exp=int(time.time() + expires_in),
+    )
+
+
+def test_roundtrip(monkeypatch):
+    """Test that issued tokens verify back to their claims."""
+    monkeypatch.setattr(signed_tokens, "_signing_keys", [("k1", b"secret1")])
+    claims = _claims()
+    token = signed_tokens.issue(claims)
+    assert signed_tokens.is_signed_token(token)
+    assert token.startswith("v1.k1.")
+    assert signed_tokens.verify(token) == claims
+
+
+def test_rejects_tampering(monkeypatch):
+    """Test that altered, truncated and foreign tokens don't verify."""
+    monkeypatch.setattr(signed_tokens, "_signing_keys", [("k1", b"secret1")])
+    token = signed_tokens.issue(_claims())
+    _, key_id, claims_b64, signature_b64 = token.split(".")
+
+    forged_b64 = signed_tokens._b64encode(
+        signed_tokens._b64decode(claims_b64).replace(b"someone", b"someone2")
+    )
+    assert signed_tokens.verify(f"v1.{key_id}.{forged_b64}.{signature_b64}") is None
+    assert signed_tokens.verify(token[:-2]) is None
+    assert signed_tokens.verify(f"v1.{key_id}.{claims_b64}") is None
+    assert signed_tokens.verify(f"v1.k2.{claims_b64}.{signature_b64}") is None
+    assert signed_tokens.verify(uuid4().hex) is None
+
+    monkeypatch.setattr(signed_tokens, "_signing_keys", [("k1", b"other")])
+    assert signed_tokens.verify(token) is None
+
+
+def test_rejects_expired(monkeypatch):
+    """Test that tokens stop verifying once expired."""
+    monkeypatch.setattr(signed_tokens, "_signing_keys", [("k1", b"secret1")])
+    assert signed_tokens.verify(signed_tokens.issue(_claims(-1))) is None
+
+
+def test_key_rotation(monkeypatch):
+    """Test that tokens from a retired key verify until the key is removed."""
+    monkeypatch.setattr(signed_tokens, "_signing_keys", [("k1", b"secret1")])
+    old_token = signed_tokens.issue(_claims())
+
+    monkeypatch.setattr(
+        signed_tokens, "_signing_keys", [("k2", b"secret2"), ("k1", b"secret1")]
+    )
+    assert signed_tokens.issue(_claims()).startswith("v1.k2.")
+    assert signed_tokens.verify(old_token) is not None
+
+    monkeypatch.setattr(signed_tokens, "_signing_keys", [("k2", b"secret2")])
+    assert signed_tokens.verify(old_token) is None
+
+
+def test_parse_signing_keys():
+    """Test parsing configured keys."""
+    assert signed_tokens.parse_signing_keys("") == []
+    assert signed_tokens.parse_signing_keys("a:x, b:y:z") == [
+        ("a", b"x"),
+        ("b", b"y:z"),
+    ]
+    for raw in ["nosecret", "a:", "a.b:x"]:
+        try:
+            signed_tokens.parse_signing_keys(raw)
+        except Exception:
+            continue
+        raise AssertionError(f"Accepted malformed keys {raw}")
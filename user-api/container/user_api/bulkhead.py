@@ -0,0 +1,118 @@
+"""Bulkheads, limiting how many requests of each class of routes run at once.
+
+Routes are split into classes by cost, each with its own bulkhead, so a flood of one
+class can't take every worker and db connection from the others. A request over its
+bulkhead's limit waits in a bounded queue, first come first served. Once that's full
+too, it's turned away right away with a 503 and Retry-After, rather than waiting on
+the caller's timeout.
+"""
+
+import asyncio
+from collections import deque
+import logging
+import time
+from typing import Deque
+
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from user_api.metrics import LATENCY_BUCKETS, registry
+
+
+logger = logging.getLogger(__name__)
+
+_in_flight = registry.gauge(
+    "bulkhead_in_flight", "Requests running within each bulkhead.", ["bulkhead"]
+)
+_queued = registry.gauge(
+    "bulkhead_queued", "Requests waiting to enter each bulkhead.", ["bulkhead"]
+)
+_rejected = registry.counter(
+    "bulkhead_rejected_total",
+    "Requests turned away with each bulkhead's queue full.",
+    ["bulkhead"],
+)
+_wait_seconds = registry.histogram(
+    "bulkhead_wait_seconds",
+    "Time requests waited to enter each bulkhead.",
+    ["bulkhead"],
+    (0.0, *LATENCY_BUCKETS),
+)
+
+
+class Bulkhead:
+    """Run at most limit requests at once, queueing at most queue_size more."""
+
+    def __init__(self, name: str, limit: int, queue_size: int) -> None:
+        self.name = name
+        self.limit = limit
+        self.queue_size = queue_size
+        self._running = 0
+        # Each waiting request's future, resolved when it's handed a slot
+        self._waiters: "Deque[asyncio.Future[None]]" = deque()
+        self._in_flight = _in_flight.labels(name)
+        self._queued = _queued.labels(name)
+        self._rejected = _rejected.labels(name)
+        self._wait_seconds = _wait_seconds.labels(name)
+
+    async def _acquire(self) -> bool:
+        """Take a slot, waiting in the queue if needed, False if the queue is full."""
+        if self._running < self.limit and not self._waiters:
+            self._running += 1
+            self._in_flight.set(self._running)
+            self._wait_seconds.observe(0.0)
+            return True
+        if len(self._waiters) >= self.queue_size:
+            self._rejected.inc()
+            return False
+
+        waiter: "asyncio.Future[None]" = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._queued.set(len(self._waiters))
+        start_t = time.perf_counter()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Handed a slot just as it was cancelled, pass it on
+                self._release()
+            elif waiter in self._waiters:
+                # Still queued, unless _release already skipped past it
+                self._waiters.remove(waiter)
+                self._queued.set(len(self._waiters))
+            raise
+        self._wait_seconds.observe(time.perf_counter() - start_t)
+        return True
+
+    def _release(self) -> None:
+        """Hand the slot to the next waiting request, or free it."""
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            self._queued.set(len(self._waiters))
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self._running -= 1
+        self._in_flight.set(self._running)
+
+    def wrap(self, app: ASGIApp) -> ASGIApp:
+        """Wrap a route's app, to run its requests within this bulkhead."""
+
+        async def bulkheaded_app(scope: Scope, receive: Receive, send: Send) -> None:
+            if not await self._acquire():
+                # Info not warning, so a flood of these is sampled and rate limited
+                logger.info("Bulkhead full", extra={"bulkhead": self.name})
+                # A new response each time, as middleware may add to its headers
+                response = JSONResponse(
+                    {"detail": "Service overloaded, try again later"},
+                    status_code=503,
+                    headers={"Retry-After": "1"},
+                )
+                await response(scope, receive, send)
+                return
+            try:
+                await app(scope, receive, send)
+            finally:
+                self._release()
+
+        return bulkheaded_app
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""Benchmark bcrypt on this machine and recommend a BCRYPT_COST.
+
+Run with `python3 -m user_api.calibrate --target-ms 250`.
+"""
+
+import argparse
+import statistics
+import time
+from typing import List, Optional, Tuple
+
+import bcrypt
+
+
+def time_cost(cost: int, rounds: int) -> float:
+    """Get the median seconds to hash a password at a given cost."""
+    password = b"calibration-password"
+    timings: List[float] = []
+    for _ in range(rounds):
+        start_t = time.perf_counter()
+        bcrypt.hashpw(password, bcrypt.gensalt(cost))
+        timings.append(time.perf_counter() - start_t)
+    return statistics.median(timings)
+
+
+def calibrate(
+    target_seconds: float, min_cost: int, max_cost: int, rounds: int
+) -> Tuple[Optional[int], List[Tuple[int, float]]]:
+    """Find the highest cost whose median hash time meets the target.
+
+    Returns the recommended cost (None if even min_cost is too slow), and the timing
+    of each cost tried. Stops at the first cost over target, since each step doubles.
+    """
+    recommended: Optional[int] = None
+    results: List[Tuple[int, float]] = []
+    for cost in range(min_cost, max_cost + 1):
+        seconds = time_cost(cost, rounds)
+        results.append((cost, seconds))
+        if seconds > target_seconds:
+            break
+        recommended = cost
+    return recommended, results
+
+
+def main() -> None:
+    """Run the calibration from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--target-ms", type=float, default=250.0)
+    parser.add_argument("--min-cost", type=int, default=10)
+    parser.add_argument("--max-cost", type=int, default=16)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    recommended, results = calibrate(
+        target_seconds=args.target_ms / 1000,
+        min_cost=args.min_cost,
+        max_cost=args.max_cost,
+        rounds=args.rounds,
+    )
+
+    for cost, seconds in results:
+        print(f"cost {cost:2d}: {seconds * 1000:8.1f} ms")
+
+    if recommended is None:
+        print(f"No cost ≥{args.min_cost} meets {args.target_ms} ms on this machine")
+        print(f"Recommended: BCRYPT_COST={args.min_cost} (at minimum), or faster nodes")
+    else:
+        print(f"Recommended: BCRYPT_COST={recommended}")
+
+
+if __name__ == "__main__":
+    main()
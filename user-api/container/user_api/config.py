@@ -8,14 +8,116 @@ DB_PASS = os.getenv("DB_PASS")
 DB_ADDRESS = os.getenv("DB_ADDRESS")
 DB_PORT = os.getenv("DB_PORT")
 DB_NAME = os.getenv("DB_NAME")
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE") or "2")
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE") or "10")
+DB_POOL_TIMEOUT_SECONDS = float(os.getenv("DB_POOL_TIMEOUT_SECONDS") or "5")
+DB_POOL_MAX_WAITING = int(os.getenv("DB_POOL_MAX_WAITING") or "0")
+DB_POOL_CHECK_SECONDS = float(os.getenv("DB_POOL_CHECK_SECONDS") or "30")
+# Prepare each statement server-side after this many runs on a connection, -1 never
+DB_PREPARE_THRESHOLD = int(os.getenv("DB_PREPARE_THRESHOLD") or "0")
+# Pipeline statements in request flows, disable if a connection proxy can't handle it
+DB_PIPELINE = (os.getenv("DB_PIPELINE") or "true").lower() == "true"
+DB_POOL_STARTUP_JITTER_SECONDS = float(
+    os.getenv("DB_POOL_STARTUP_JITTER_SECONDS") or "2"
+)
+# Print requests running more statements, or leaving transactions idle for longer
+DB_REQUEST_QUERIES_WARN = int(os.getenv("DB_REQUEST_QUERIES_WARN") or "10")
+DB_IDLE_IN_TRANSACTION_WARN_SECONDS = float(
+    os.getenv("DB_IDLE_IN_TRANSACTION_WARN_SECONDS") or "0.25"
+)
 SENDGRID_KEY = os.getenv("SENDGRID_KEY")
+SENDGRID_URL = os.getenv("SENDGRID_URL") or "https://api.sendgrid.com"
+SENDGRID_MAX_CONNECTIONS = int(os.getenv("SENDGRID_MAX_CONNECTIONS") or "10")
+SENDGRID_KEEPALIVE_SECONDS = float(os.getenv("SENDGRID_KEEPALIVE_SECONDS") or "30")
+SENDGRID_TIMEOUT_SECONDS = float(os.getenv("SENDGRID_TIMEOUT_SECONDS") or "10")
+# Sendgrid allows at most 1000 personalizations per request
+SENDGRID_MAX_BATCH_SIZE = int(os.getenv("SENDGRID_MAX_BATCH_SIZE") or "100")
 EMAIL_FROM = os.getenv("EMAIL_FROM") or "Web Games <no-reply@games.levilutz.com>"
+EMAIL_OUTBOX_POLL_SECONDS = float(os.getenv("EMAIL_OUTBOX_POLL_SECONDS") or "1")
+EMAIL_OUTBOX_BATCH_SIZE = int(os.getenv("EMAIL_OUTBOX_BATCH_SIZE") or "100")
+EMAIL_OUTBOX_LEASE_SECONDS = float(os.getenv("EMAIL_OUTBOX_LEASE_SECONDS") or "60")
+EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.getenv("EMAIL_OUTBOX_MAX_ATTEMPTS") or "8")
+EMAIL_OUTBOX_BACKOFF_SECONDS = float(os.getenv("EMAIL_OUTBOX_BACKOFF_SECONDS") or "5")
+EMAIL_OUTBOX_MAX_BACKOFF_SECONDS = float(
+    os.getenv("EMAIL_OUTBOX_MAX_BACKOFF_SECONDS") or "900"
+)
 ALLOWED_FAILED_VERIFICATIONS = int(os.getenv("ALLOWED_FAILED_VERIFICATIONS") or "5")
 VERIFY_CODE_LENGTH = int(os.getenv("VERIFY_CODE_LENGTH") or "6")
 PASSWORD_RESET_TTL_HOURS = int(os.getenv("PASSWORD_RESET_TTL_HOURS") or "12")
 PREUSER_TTL_HOURS = int(os.getenv("PREUSER_TTL_HOURS") or "24")
 SESSION_TTL_HOURS = int(os.getenv("SESSION_TTL_HOURS") or "12")
+CLEANUP_INTERVAL_SECONDS = float(os.getenv("CLEANUP_INTERVAL_SECONDS") or "3600")
+CLEANUP_JITTER_SECONDS = float(os.getenv("CLEANUP_JITTER_SECONDS") or "300")
+CLEANUP_BATCH_SIZE = int(os.getenv("CLEANUP_BATCH_SIZE") or "1000")
+CLEANUP_BATCH_PAUSE_SECONDS = float(os.getenv("CLEANUP_BATCH_PAUSE_SECONDS") or "0.1")
+TOKEN_FORMAT = os.getenv("TOKEN_FORMAT") or "uuid"  # "uuid" or "signed"
+# Comma separated key_id:secret, the first signs and all verify, share with auth-api
+TOKEN_SIGNING_KEYS = os.getenv("TOKEN_SIGNING_KEYS") or ""
+REVOCATION_FILTER_FALSE_POSITIVE_RATE = float(
+    os.getenv("REVOCATION_FILTER_FALSE_POSITIVE_RATE") or "0.01"
+)
+REVOCATION_FILTER_CACHE_SECONDS = float(
+    os.getenv("REVOCATION_FILTER_CACHE_SECONDS") or "1"
+)
+BCRYPT_COST = int(os.getenv("BCRYPT_COST") or "12")
+HASH_EXECUTOR = os.getenv("HASH_EXECUTOR") or "thread"  # "thread" or "process"
+HASH_WORKERS = int(os.getenv("HASH_WORKERS") or str(os.cpu_count() or 1))
+HASH_QUEUE_SIZE = int(os.getenv("HASH_QUEUE_SIZE") or "32")
 
+LOG_LEVEL = os.getenv("LOG_LEVEL") or "INFO"
+# Fraction of records kept per level below WARNING, e.g. "DEBUG=0.01,INFO=0.5"
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES") or ""
+# Records below WARNING kept per second, after a burst, once sampled
+LOG_RATE_LIMIT_PER_SECOND = float(os.getenv("LOG_RATE_LIMIT_PER_SECOND") or "20")
+LOG_RATE_LIMIT_BURST = float(os.getenv("LOG_RATE_LIMIT_BURST") or "100")
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE") or "10000")
+
+# Where to export sampled traces, "file:<path>" or a collector's OTLP/HTTP traces url
+TRACE_EXPORT = os.getenv("TRACE_EXPORT") or ""
+# Fraction of traces started here to export, trusted callers' traceparent decides theirs
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE") or "1")
+# Whether to continue callers' traceparent, sampled as they say. Off when callers
+# aren't trusted, who could otherwise have every one of their requests exported
+TRACE_TRUST_TRACEPARENT = (
+    os.getenv("TRACE_TRUST_TRACEPARENT") or "true"
+).lower() == "true"
+# Whether Server-Timing breaks the time down per span, or only gives the total. Off
+# when callers aren't trusted, time spent hashing shows whether a login's email exists
+SERVER_TIMING_DETAIL = (os.getenv("SERVER_TIMING_DETAIL") or "true").lower() == "true"
+
+# Bearer token for the /debug endpoints, which are disabled without one
+DEBUG_TOKEN = os.getenv("DEBUG_TOKEN") or ""
+# Whether /metrics and /stats need the debug token too. On when callers aren't trusted,
+# they give away per route traffic and the state of every component
+METRICS_REQUIRE_TOKEN = (
+    os.getenv("METRICS_REQUIRE_TOKEN") or "false"
+).lower() == "true"
+# Fraction of requests profiled at startup, and a route ("POST /users") to profile all
+PROFILER_SAMPLE_RATE = float(os.getenv("PROFILER_SAMPLE_RATE") or "0")
+PROFILER_ROUTE = os.getenv("PROFILER_ROUTE") or ""
+PROFILER_INTERVAL_SECONDS = float(os.getenv("PROFILER_INTERVAL_SECONDS") or "0.01")
+# How often the event loop's lag is measured, and lag past which it's logged as blocked
+LOOP_LAG_INTERVAL_SECONDS = float(os.getenv("LOOP_LAG_INTERVAL_SECONDS") or "0.05")
+LOOP_BLOCKED_THRESHOLD_SECONDS = float(
+    os.getenv("LOOP_BLOCKED_THRESHOLD_SECONDS") or "0.1"
+)
+# Requests of each class of routes run at once, and how many more may wait, past that
+# they're turned away with a 503. Hashing routes run bcrypt, the default is the rest
+BULKHEAD_HASHING_LIMIT = int(os.getenv("BULKHEAD_HASHING_LIMIT") or "8")
+BULKHEAD_HASHING_QUEUE = int(os.getenv("BULKHEAD_HASHING_QUEUE") or "32")
+BULKHEAD_DEFAULT_LIMIT = int(os.getenv("BULKHEAD_DEFAULT_LIMIT") or "64")
+BULKHEAD_DEFAULT_QUEUE = int(os.getenv("BULKHEAD_DEFAULT_QUEUE") or "128")
+# /ready fails past these, so traffic shifts to other replicas. The db is probed at
+# most once per interval, however often /ready is called
+READY_DB_PROBE_INTERVAL_SECONDS = float(
+    os.getenv("READY_DB_PROBE_INTERVAL_SECONDS") or "2"
+)
+READY_DB_PROBE_TIMEOUT_SECONDS = float(
+    os.getenv("READY_DB_PROBE_TIMEOUT_SECONDS") or "0.5"
+)
+READY_DB_POOL_MAX_WAITING = int(os.getenv("READY_DB_POOL_MAX_WAITING") or "10")
+READY_HASH_MAX_QUEUE_DEPTH = int(os.getenv("READY_HASH_MAX_QUEUE_DEPTH") or "16")
+READY_MAX_LOOP_LAG_SECONDS = float(os.getenv("READY_MAX_LOOP_LAG_SECONDS") or "0.25")
 
 # Env vars required for a full deployment, checked in app_startup
 REQUIRED_ENV_FOR_DEPLOY = [
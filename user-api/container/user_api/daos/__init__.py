@@ -1,14 +1,43 @@
-from user_api.daos.database import AsyncConnection, get_db_connection
+from user_api.daos.database import (
+    AsyncConnection,
+    QueryStats,
+    advisory_unlock,
+    check_db_pool_loop,
+    close_db_pool,
+    db_pool_stats,
+    gather_queries,
+    get_db_connection,
+    open_db_pool,
+    ping_db,
+    track_queries,
+    try_advisory_lock,
+)
+from user_api.daos.email_outbox import OutboxEmail
 from user_api.daos.password_reset import PasswordReset
 from user_api.daos.pre_user import PreUser
+from user_api.daos.revoked_session import RevokedSession
 from user_api.daos.session import Session
-from user_api.daos.user import User
+from user_api.daos.user import TokenOwner, User, UserProfile
 
 __all__ = [
     "AsyncConnection",
+    "OutboxEmail",
     "PasswordReset",
     "PreUser",
+    "QueryStats",
+    "RevokedSession",
     "Session",
+    "TokenOwner",
     "User",
+    "UserProfile",
+    "advisory_unlock",
+    "check_db_pool_loop",
+    "close_db_pool",
+    "db_pool_stats",
+    "gather_queries",
     "get_db_connection",
+    "open_db_pool",
+    "ping_db",
+    "track_queries",
+    "try_advisory_lock",
 ]
@@ -1,15 +1,202 @@
-from typing import Any
+import asyncio
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+import random
+import time
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+    overload,
+)
 
 import psycopg
+from psycopg.abc import Params, Query
+from psycopg.errors import PipelineAborted
+from psycopg.rows import Row
+from psycopg_pool import AsyncConnectionPool, PoolTimeout, TooManyRequests
 
 from user_api import config
+from user_api.exceptions import InternalError, OverloadedError
+from user_api.metrics import registry
+from user_api.tracing import record_span
 
 
 AsyncConnection = psycopg.AsyncConnection[Any]
 
+T = TypeVar("T")
+T1 = TypeVar("T1")
+T2 = TypeVar("T2")
+
+# Shared pool, opened in app_startup
+_pool: Optional[AsyncConnectionPool] = None
+
+_query_seconds = registry.histogram(
+    "db_query_duration_seconds",
+    "Time from sending a statement to having its results.",
+).labels()
+
+
+class QueryStats:
+    """Statements run while handling one request, see track_queries."""
+
+    __slots__ = (
+        "count",
+        "slowest_seconds",
+        "slowest_query",
+        "transaction_seconds",
+        "busy_seconds",
+        "_running",
+        "_busy_since",
+    )
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.slowest_seconds = 0.0
+        self.slowest_query: Optional[Query] = None
+        self.transaction_seconds = 0.0
+        # Time with any statement running, overlapping statements counted once
+        self.busy_seconds = 0.0
+        self._running = 0
+        self._busy_since = 0.0
+
+    @property
+    def idle_in_transaction_seconds(self) -> float:
+        """Time spent holding a transaction open without a statement running."""
+        return max(0.0, self.transaction_seconds - self.busy_seconds)
+
+    def slowest_statement(self, max_length: int = 200) -> str:
+        """Get the slowest statement's text, on one line and truncated."""
+        query = self.slowest_query
+        if query is None:
+            return ""
+        if isinstance(query, bytes):
+            query = query.decode("utf-8", "replace")
+        text = " ".join(str(query).split())
+        return text if len(text) <= max_length else text[: max_length - 3] + "..."
+
+    def _started(self, now: float) -> None:
+        if self._running == 0:
+            self._busy_since = now
+        self._running += 1
+
+    def _finished(self, query: Query, start: float, now: float) -> None:
+        seconds = now - start
+        self.count += 1
+        if seconds >= self.slowest_seconds:
+            self.slowest_seconds = seconds
+            self.slowest_query = query
+        self._running -= 1
+        if self._running == 0:
+            self.busy_seconds += now - self._busy_since
+
+
+# Stats of the request being handled, if tracked
+_request_queries: ContextVar[Optional[QueryStats]] = ContextVar(
+    "request_queries", default=None
+)
+
+
+@contextmanager
+def track_queries() -> Iterator[QueryStats]:
+    """Count and time every statement run within, including in tasks started within.
+
+    Also times how long connections are held, which is how long their transaction is
+    open, to tell how long transactions sit idle.
+    """
+    stats = QueryStats()
+    token = _request_queries.set(stats)
+    try:
+        yield stats
+    finally:
+        _request_queries.reset(token)
+
+
+class TimedCursor(psycopg.AsyncCursor[Row]):
+    """Cursor recording how long each statement takes to get its results.
+
+    In pipeline mode execute returns before the statement has run, so the statement
+    is timed until its results are first fetched, or the cursor is closed.
+    """
+
+    _query_start: Optional[float] = None
+    _running_query: Optional[Query] = None
+    _request_stats: Optional[QueryStats] = None
+
+    def _query_done(self) -> None:
+        """Record the running statement, if any."""
+        if self._query_start is None:
+            return
+        now = time.perf_counter()
+        _query_seconds.observe(now - self._query_start)
+        record_span("db", self._query_start, now, statement=self._running_query)
+        if self._request_stats is not None and self._running_query is not None:
+            self._request_stats._finished(self._running_query, self._query_start, now)
+        self._query_start = self._running_query = self._request_stats = None
+
+    async def execute(
+        self: "TimedCursor[Row]",
+        query: Query,
+        params: Optional[Params] = None,
+        *,
+        prepare: Optional[bool] = None,
+        binary: Optional[bool] = None,
+    ) -> "TimedCursor[Row]":
+        self._query_done()
+        self._query_start = time.perf_counter()
+        self._running_query = query
+        self._request_stats = _request_queries.get()
+        if self._request_stats is not None:
+            self._request_stats._started(self._query_start)
+        try:
+            await super().execute(query, params, prepare=prepare, binary=binary)
+        except BaseException:
+            self._query_done()
+            raise
+        # Results only arrive straight away outside pipeline mode
+        if self.pgresult is not None:
+            self._query_done()
+        return self
+
+    async def fetchone(self) -> Optional[Row]:
+        try:
+            return await super().fetchone()
+        finally:
+            self._query_done()
+
+    async def fetchmany(self, size: int = 0) -> List[Row]:
+        try:
+            return await super().fetchmany(size)
+        finally:
+            self._query_done()
+
+    async def fetchall(self) -> List[Row]:
+        try:
+            return await super().fetchall()
+        finally:
+            self._query_done()
+
+    async def close(self) -> None:
+        self._query_done()
+        await super().close()
+
+
+async def open_db_pool() -> None:
+    """Open the shared db connection pool.
+
+    Waits a random delay first, so replicas restarting together don't all open their
+    connections at the same moment.
+    """
+    global _pool
+    if _pool is not None:
+        return
 
-async def get_db_connection() -> psycopg.AsyncConnection[Any]:
-    """Get a new db connection."""
     # Backstop to verify env vars again
     req_vars = [
         config.DB_USER,
@@ -21,13 +208,168 @@ async def get_db_connection() -> psycopg.AsyncConnection[Any]:
     if any([var is None for var in req_vars]):
         raise Exception(f"Missing db env vars: {req_vars}")
 
-    # Create connection
-    conn = await psycopg.AsyncConnection.connect(
-        user=config.DB_USER,
-        password=config.DB_PASS,
-        host=config.DB_ADDRESS,
-        port=config.DB_PORT,
-        dbname=config.DB_NAME,
+    await asyncio.sleep(random.uniform(0, config.DB_POOL_STARTUP_JITTER_SECONDS))
+
+    # Create the pool, wait for min_size connections before accepting traffic
+    pool = AsyncConnectionPool(
+        kwargs={
+            "user": config.DB_USER,
+            "password": config.DB_PASS,
+            "host": config.DB_ADDRESS,
+            "port": config.DB_PORT,
+            "dbname": config.DB_NAME,
+            "prepare_threshold": (
+                None if config.DB_PREPARE_THRESHOLD < 0 else config.DB_PREPARE_THRESHOLD
+            ),
+            "cursor_factory": TimedCursor,
+        },
+        open=False,
+        name="user-api",
+        min_size=config.DB_POOL_MIN_SIZE,
+        max_size=config.DB_POOL_MAX_SIZE,
+        timeout=config.DB_POOL_TIMEOUT_SECONDS,
+        max_waiting=config.DB_POOL_MAX_WAITING,
     )
+    await pool.open(wait=True)
+    _pool = pool
+
+
+async def close_db_pool() -> None:
+    """Close the shared db connection pool."""
+    global _pool
+    if _pool is None:
+        return
+    pool, _pool = _pool, None
+    await pool.close()
+
+
+async def check_db_pool_loop() -> None:
+    """Loop to regularly replace broken idle connections in the pool."""
+    while True:
+        await asyncio.sleep(config.DB_POOL_CHECK_SECONDS)
+        if _pool is not None:
+            await _pool.check()
+
+
+@asynccontextmanager
+async def get_db_connection(pipeline: bool = False) -> AsyncIterator[AsyncConnection]:
+    """Get a db connection from the pool.
+
+    The transaction is committed on exit, or rolled back if an exception is raised.
+
+    With pipeline (and DB_PIPELINE), statements are sent without waiting on earlier
+    replies, until a result is needed - so BEGIN rides along with the first statement,
+    COMMIT with the last sync, and statements executed concurrently (asyncio.gather)
+    share a round trip. Results, including rowcount and errors, only arrive once
+    fetched, so DAO writes used here check a RETURNING row rather than rowcount.
+    """
+    # Hold onto this pool, the global may be cleared by close_db_pool meanwhile
+    pool = _pool
+    if pool is None:
+        raise InternalError("Db pool used before being opened")
+
+    try:
+        conn = await pool.getconn()
+    except (PoolTimeout, TooManyRequests) as e:
+        raise OverloadedError(f"Failed to get db connection: {str(e)}")
+
+    stats = _request_queries.get()
+    start_t = time.perf_counter()
+    try:
+        if pipeline and config.DB_PIPELINE:
+            async with _pipelined_transaction(conn):
+                yield conn
+        else:
+            async with conn:
+                yield conn
+    finally:
+        if stats is not None:
+            stats.transaction_seconds += time.perf_counter() - start_t
+        await pool.putconn(conn)
+
+
+@asynccontextmanager
+async def _pipelined_transaction(conn: AsyncConnection) -> AsyncIterator[None]:
+    """Run a transaction in pipeline mode, without waiting on BEGIN or COMMIT alone.
+
+    psycopg syncs after the BEGIN it issues implicitly, so the transaction is run by
+    hand on an autocommit connection instead, and reset before going back to the pool.
+    """
+    await conn.set_autocommit(True)
+    try:
+        try:
+            # Plain cursors, so these aren't tracked any more than an implicit BEGIN
+            cur = psycopg.AsyncCursor(conn)
+            async with conn.pipeline():
+                await cur.execute("BEGIN")
+                yield
+                await cur.execute("COMMIT")
+        except BaseException:
+            # The pipeline has synced, so this also clears a failed transaction
+            await conn.rollback()
+            raise
+    finally:
+        await conn.set_autocommit(False)
+
+
+@overload
+async def gather_queries(
+    __first: Awaitable[T1], __second: Awaitable[T2]
+) -> Tuple[T1, T2]:
+    ...
+
+
+@overload
+async def gather_queries(*queries: Awaitable[T]) -> Tuple[T, ...]:
+    ...
+
+
+async def gather_queries(*queries: Awaitable[Any]) -> Tuple[Any, ...]:
+    """Run independent DAO calls on one connection, so a pipeline sends them together.
+
+    Unlike asyncio.gather, every call finishes before this returns. The failure that
+    caused the others is raised - the rest of a failed pipeline only reports that it
+    aborted.
+    """
+    results = await asyncio.gather(*queries, return_exceptions=True)
+    failures = [result for result in results if isinstance(result, BaseException)]
+    if failures:
+        causes = [f for f in failures if not isinstance(f, PipelineAborted)]
+        raise (causes or failures)[0]
+    return tuple(results)
+
+
+async def try_advisory_lock(conn: AsyncConnection, lock_id: int) -> bool:
+    """Try to take a session-level advisory lock, return whether it was taken.
+
+    The lock outlives the current transaction, so it must be released with
+    advisory_unlock before the connection goes back to the pool.
+    """
+    async with conn.cursor() as cur:
+        await cur.execute("SELECT pg_try_advisory_lock(%s)", (lock_id,))
+        row = await cur.fetchone()
+        if row is None:
+            raise InternalError("No result from pg_try_advisory_lock")
+        return bool(row[0])
+
+
+async def advisory_unlock(conn: AsyncConnection, lock_id: int) -> None:
+    """Release a session-level advisory lock taken with try_advisory_lock."""
+    async with conn.cursor() as cur:
+        await cur.execute("SELECT pg_advisory_unlock(%s)", (lock_id,))
+
+
+async def ping_db(timeout_seconds: float) -> None:
+    """Run a trivial statement, waiting at most timeout_seconds for a connection."""
+    pool = _pool
+    if pool is None:
+        raise InternalError("Db pool used before being opened")
+    async with pool.connection(timeout=timeout_seconds) as conn:
+        await conn.execute("SELECT 1")
+
 
-    return conn
+def db_pool_stats() -> Dict[str, int]:
+    """Get the shared pool's statistics, empty if not open."""
+    if _pool is None:
+        return {}
+    return _pool.get_stats()
@@ -0,0 +1,150 @@
+from __future__ import annotations  # Postponed annotation evaluation, remove once 3.11
+
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Tuple
+from uuid import UUID
+
+from psycopg.rows import args_row
+from psycopg.types.json import Jsonb
+
+from user_api.daos.database import AsyncConnection
+from user_api.exceptions import InternalError
+
+
+@dataclass
+class OutboxEmail:
+    """An email waiting to be sent, written in the same tx as whatever caused it."""
+
+    __slots__ = (
+        "email_id",
+        "to_email",
+        "subject",
+        "html_content",
+        "priority",
+        "created_time",
+        "attempts",
+        "next_attempt_time",
+        "substitutions",
+    )
+
+    email_id: UUID
+    to_email: str
+    subject: str
+    html_content: str
+    priority: int
+    created_time: datetime
+    attempts: int
+    next_attempt_time: datetime
+    substitutions: Dict[str, str]
+
+    # Field order, rows are read positionally
+    _COLUMNS = """
+        email_id, to_email, subject, html_content, priority,
+        created_time, attempts, next_attempt_time, substitutions
+    """
+
+    def _params(self) -> Tuple[Any, ...]:
+        """Get the fields as query params, in _COLUMNS order."""
+        return (
+            self.email_id,
+            self.to_email,
+            self.subject,
+            self.html_content,
+            self.priority,
+            self.created_time,
+            self.attempts,
+            self.next_attempt_time,
+            Jsonb(self.substitutions),
+        )
+
+    async def create(self, conn: AsyncConnection) -> None:
+        """Queue the current email in the database."""
+        async with conn.cursor() as cur:
+            await cur.execute(
+                f"""
+                    INSERT INTO email_outbox ({self._COLUMNS})
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+                    ON CONFLICT DO NOTHING
+                    RETURNING email_id
+                """,
+                self._params(),
+            )
+            if await cur.fetchone() is None:
+                raise InternalError(
+                    f"Cannot create OutboxEmail - id {self.email_id} already exists"
+                )
+
+    async def delete(self, conn: AsyncConnection) -> None:
+        """Remove the current email from the outbox, once sent or given up on."""
+        async with conn.cursor() as cur:
+            await cur.execute(
+                """
+                    DELETE FROM email_outbox WHERE email_id = %s AND attempts = %s
+                    RETURNING email_id
+                """,
+                (self.email_id, self.attempts),
+            )
+            if await cur.fetchone() is None:
+                raise InternalError(f"OutboxEmail missing or reclaimed in db: {self}")
+
+    async def reschedule(
+        self, conn: AsyncConnection, next_attempt_time: datetime
+    ) -> None:
+        """Schedule the current email's next attempt."""
+        async with conn.cursor() as cur:
+            await cur.execute(
+                """
+                    UPDATE email_outbox SET next_attempt_time = %s
+                    WHERE email_id = %s AND attempts = %s
+                    RETURNING email_id
+                """,
+                (next_attempt_time, self.email_id, self.attempts),
+            )
+            if await cur.fetchone() is None:
+                raise InternalError(f"OutboxEmail missing or reclaimed in db: {self}")
+
+        self.next_attempt_time = next_attempt_time
+
+    @classmethod
+    async def claim_due(
+        cls, conn: AsyncConnection, limit: int, lease_until: datetime
+    ) -> List[OutboxEmail]:
+        """Claim up to limit due emails, most urgent first.
+
+        Claimed emails have their attempts bumped and aren't due again until
+        lease_until, so other workers skip them even after this tx commits. Rows
+        locked by another worker's claim are skipped rather than waited on.
+        """
+        async with conn.cursor(row_factory=args_row(OutboxEmail)) as cur:
+            await cur.execute(
+                f"""
+                    UPDATE email_outbox
+                    SET attempts = attempts + 1, next_attempt_time = %s
+                    WHERE email_id IN (
+                        SELECT email_id FROM email_outbox
+                        WHERE next_attempt_time <= %s
+                        ORDER BY priority, next_attempt_time
+                        LIMIT %s
+                        FOR UPDATE SKIP LOCKED
+                    )
+                    RETURNING {cls._COLUMNS}
+                """,
+                (lease_until, datetime.utcnow(), limit),
+            )
+            emails = await cur.fetchall()
+
+        # RETURNING doesn't preserve the subquery's order
+        return sorted(emails, key=lambda e: (e.priority, e.created_time))
+
+    @classmethod
+    async def count_by_priority(cls, conn: AsyncConnection) -> List[Tuple[int, int]]:
+        """Count the emails waiting to be sent, per priority."""
+        async with conn.cursor() as cur:
+            await cur.execute(
+                """
+                    SELECT priority, count(*) FROM email_outbox
+                    GROUP BY priority ORDER BY priority
+                """
+            )
+            return await cur.fetchall()
@@ -1,121 +1,131 @@
 from __future__ import annotations  # Postponed annotation evaluation, remove once 3.11
 
-from datetime import datetime, timedelta
-from typing import Optional
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Optional, Tuple
+from uuid import UUID
 
-from psycopg.rows import class_row
-from pydantic import BaseModel, UUID4
+from psycopg.errors import UniqueViolation
+from psycopg.rows import args_row
 
-from user_api.config import PASSWORD_RESET_TTL_HOURS
 from user_api.daos.database import AsyncConnection
 from user_api.exceptions import InternalError
 
 
-class PasswordReset(BaseModel):
-    reset_code: UUID4
-    user_id: UUID4
+@dataclass
+class PasswordReset:
+    __slots__ = ("reset_code", "user_id", "created_time", "expires_at")
+
+    reset_code: UUID
+    user_id: UUID
     created_time: datetime
+    expires_at: datetime
 
-    async def create(self, conn: AsyncConnection) -> None:
-        """Create the current password_reset in the database."""
-        if await self.find_by_reset_code(conn, self.reset_code) is not None:
-            raise InternalError(
-                f"Cannot create PasswordReset - code {self.reset_code} already claimed"
-            )
+    # Field order, rows are read positionally
+    _COLUMNS = "reset_code, user_id, created_time, expires_at"
 
-        if await self.find_by_user_id(conn, self.user_id) is not None:
-            raise InternalError(
-                f"Cannot create PasswordReset - user {self.user_id} already resetting"
-            )
+    # Optimistic concurrency check - writes only apply if the row still matches self
+    _MATCHES_SQL = """
+        reset_code = %s
+        AND user_id = %s
+        AND created_time = %s
+        AND expires_at = %s
+    """
 
-        async with conn.cursor() as cur:
-            # Clean up expired for this user_id if necessary
-            latest_valid = datetime.utcnow() - timedelta(hours=PASSWORD_RESET_TTL_HOURS)
-            await cur.execute(
-                "DELETE FROM password_resets WHERE user_id = %s AND created_time <= %s",
-                (self.user_id, latest_valid),
-            )
+    def _params(self) -> Tuple[Any, ...]:
+        """Get the fields as query params, in _COLUMNS order."""
+        return (self.reset_code, self.user_id, self.created_time, self.expires_at)
 
-            # Create the new password reset
-            await cur.execute(
-                "INSERT INTO password_resets VALUES (%s, %s, %s)",
-                (tuple(self.dict().values())),
-            )
+    async def create(self, conn: AsyncConnection) -> None:
+        """Create the current password_reset in the database."""
+        # Replace an expired reset for this user_id, but not a pending one
+        async with conn.cursor() as cur:
+            try:
+                await cur.execute(
+                    f"""
+                        INSERT INTO password_resets AS r ({self._COLUMNS})
+                        VALUES (%s, %s, %s, %s)
+                        ON CONFLICT (user_id) DO UPDATE SET
+                            reset_code = EXCLUDED.reset_code,
+                            created_time = EXCLUDED.created_time,
+                            expires_at = EXCLUDED.expires_at
+                        WHERE r.expires_at <= %s
+                        RETURNING reset_code
+                    """,
+                    (*self._params(), datetime.utcnow()),
+                )
+                row = await cur.fetchone()
+            except UniqueViolation:
+                raise InternalError(
+                    f"Cannot create PasswordReset - code {self.reset_code} taken"
+                )
+            if row is None:
+                raise InternalError(
+                    "Cannot create PasswordReset - "
+                    f"user {self.user_id} already resetting"
+                )
 
     async def delete(self, conn: AsyncConnection) -> None:
         """Delete the current password reset from the database."""
-        await self.assert_exists(conn)
-
         async with conn.cursor() as cur:
             await cur.execute(
-                "DELETE FROM password_resets WHERE reset_code = %s",
-                (self.reset_code,),
-            )
-
-    async def assert_exists(self, conn: AsyncConnection) -> None:
-        """Raise exception of the password reset doesn't exist."""
-        password_reset = await self.find_by_reset_code(conn, self.reset_code)
-        if password_reset is None:
-            raise InternalError(
-                "Password reset does not exist in db, should have been checked earlier"
-            )
-
-        # Complain on any differences from db
-        if (
-            self.reset_code != password_reset.reset_code
-            or self.user_id != password_reset.user_id
-            or self.created_time != password_reset.created_time
-        ):
-            raise InternalError(
-                f"PasswordReset deviation from db: {self} vs {password_reset}"
+                f"""
+                    DELETE FROM password_resets WHERE {self._MATCHES_SQL}
+                    RETURNING reset_code
+                """,
+                self._params(),
             )
+            if await cur.fetchone() is None:
+                raise InternalError(
+                    f"PasswordReset missing or deviated from db: {self}"
+                )
 
     @classmethod
     async def find_by_reset_code(
-        cls, conn: AsyncConnection, reset_code: UUID4
+        cls, conn: AsyncConnection, reset_code: UUID
     ) -> Optional[PasswordReset]:
-        """Find a password reset by code."""
-        async with conn.cursor(row_factory=class_row(PasswordReset)) as cur:
+        """Find an unexpired password reset by code."""
+        async with conn.cursor(row_factory=args_row(PasswordReset)) as cur:
             await cur.execute(
-                "SELECT * FROM password_resets WHERE reset_code = %s",
-                (reset_code,),
+                f"""
+                    SELECT {cls._COLUMNS} FROM password_resets
+                    WHERE reset_code = %s AND expires_at > %s
+                """,
+                (reset_code, datetime.utcnow()),
             )
-            password_reset = await cur.fetchone()
-            if (
-                password_reset is None
-                or password_reset.expiry_time() < datetime.utcnow()
-            ):
-                return None
-            return password_reset
+            return await cur.fetchone()
 
     @classmethod
     async def find_by_user_id(
-        cls, conn: AsyncConnection, user_id: UUID4
+        cls, conn: AsyncConnection, user_id: UUID
     ) -> Optional[PasswordReset]:
-        """Find a password reset by code."""
-        async with conn.cursor(row_factory=class_row(PasswordReset)) as cur:
+        """Find an unexpired password reset by user id."""
+        async with conn.cursor(row_factory=args_row(PasswordReset)) as cur:
             await cur.execute(
-                "SELECT * FROM password_resets WHERE user_id = %s",
-                (user_id,),
+                f"""
+                    SELECT {cls._COLUMNS} FROM password_resets
+                    WHERE user_id = %s AND expires_at > %s
+                """,
+                (user_id, datetime.utcnow()),
             )
-            password_reset = await cur.fetchone()
-            if (
-                password_reset is None
-                or password_reset.expiry_time() < datetime.utcnow()
-            ):
-                return None
-            return password_reset
+            return await cur.fetchone()
 
     @classmethod
-    async def cleanup_expired(cls, conn: AsyncConnection) -> None:
-        """Clean up expired password resets."""
-        latest_valid = datetime.utcnow() - timedelta(hours=PASSWORD_RESET_TTL_HOURS)
+    async def cleanup_expired(cls, conn: AsyncConnection, limit: int) -> int:
+        """Clean up to limit expired password resets, return how many were removed.
+
+        Rows locked by in-flight requests are skipped rather than waited on.
+        """
         async with conn.cursor() as cur:
             await cur.execute(
-                "DELETE FROM password_resets WHERE created_time <= %s",
-                (latest_valid,),
+                """
+                    DELETE FROM password_resets WHERE reset_code IN (
+                        SELECT reset_code FROM password_resets
+                        WHERE expires_at <= %s
+                        LIMIT %s
+                        FOR UPDATE SKIP LOCKED
+                    )
+                """,
+                (datetime.utcnow(), limit),
             )
-
-    def expiry_time(self) -> datetime:
-        """Get the password reset's expiration time."""
-        return self.created_time + timedelta(hours=PASSWORD_RESET_TTL_HOURS)
+            return cur.rowcount
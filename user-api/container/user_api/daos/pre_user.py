@@ -1,128 +1,197 @@
 from __future__ import annotations  # Postponed annotation evaluation, remove once 3.11
 
-from datetime import datetime, timedelta
-from typing import Optional
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Optional, Tuple
 
-from psycopg.rows import class_row
-from pydantic import BaseModel
+from psycopg.rows import args_row
 
-from user_api.config import PREUSER_TTL_HOURS
 from user_api.daos.database import AsyncConnection
 from user_api.daos.utils import _verify_email_lowercase
 from user_api.exceptions import InternalError
 
 
-class PreUser(BaseModel):
+@dataclass
+class PreUser:
     """A user that hasn't verified yet."""
 
+    __slots__ = (
+        "email_address",
+        "verify_code",
+        "created_time",
+        "failed_attempts",
+        "expires_at",
+    )
+
     email_address: str
     verify_code: str
     created_time: datetime
     failed_attempts: int
+    expires_at: datetime
+
+    # Field order, rows are read positionally
+    _COLUMNS = "email_address, verify_code, created_time, failed_attempts, expires_at"
+
+    # Optimistic concurrency check - writes only apply if the row still matches self
+    _MATCHES_SQL = """
+        email_address = %s
+        AND verify_code = %s
+        AND created_time = %s
+        AND failed_attempts = %s
+        AND expires_at = %s
+    """
+
+    def _params(self) -> Tuple[Any, ...]:
+        """Get the fields as query params, in _COLUMNS order."""
+        return (
+            self.email_address,
+            self.verify_code,
+            self.created_time,
+            self.failed_attempts,
+            self.expires_at,
+        )
+
+    def _assert_not_expired(self) -> None:
+        """Raise exception if the pre-user has expired since it was found."""
+        if self.expires_at <= datetime.utcnow():
+            raise InternalError(
+                "PreUser expired in db, should have been checked earlier"
+            )
 
     async def create(self, conn: AsyncConnection) -> None:
         """Create the current pre-user in the database."""
         _verify_email_lowercase(self.email_address)
 
-        if await self.find_by_email_address(conn, self.email_address) is not None:
-            raise InternalError(
-                f"Cannot create PreUser - email {self.email_address} already exists"
-            )
-
+        # Replace an expired pre-user with this email address, but not a live one
         async with conn.cursor() as cur:
             await cur.execute(
-                "INSERT INTO pre_users VALUES (%s, %s, %s, %s)",
-                tuple(self.dict().values()),
+                f"""
+                    INSERT INTO pre_users AS p ({self._COLUMNS})
+                    VALUES (%s, %s, %s, %s, %s)
+                    ON CONFLICT (email_address) DO UPDATE SET
+                        verify_code = EXCLUDED.verify_code,
+                        created_time = EXCLUDED.created_time,
+                        failed_attempts = EXCLUDED.failed_attempts,
+                        expires_at = EXCLUDED.expires_at
+                    WHERE p.expires_at <= %s
+                    RETURNING email_address
+                """,
+                (*self._params(), datetime.utcnow()),
             )
+            if await cur.fetchone() is None:
+                raise InternalError(
+                    f"Cannot create PreUser - email {self.email_address} already exists"
+                )
 
     async def update_verify_code(self, conn: AsyncConnection, verify_code: str) -> None:
         """Update the verification code."""
         _verify_email_lowercase(self.email_address)
-
-        await self.assert_exists(conn)
+        self._assert_not_expired()
 
         async with conn.cursor() as cur:
             await cur.execute(
-                "UPDATE pre_users SET verify_code = %s WHERE email_address = %s",
-                (verify_code, self.email_address),
+                f"""
+                    UPDATE pre_users SET verify_code = %s
+                    WHERE {self._MATCHES_SQL}
+                    RETURNING verify_code
+                """,
+                (verify_code, *self._params()),
             )
+            row = await cur.fetchone()
+            if row is None:
+                raise InternalError(f"PreUser missing or deviated from db: {self}")
 
-        self.verify_code = verify_code
+        self.verify_code = row[0]
 
     async def increment_failed_attempts(
         self, conn: AsyncConnection, amount: int = 1
     ) -> None:
         """Increment the failed attempts by the given amount, defaulting to 1."""
         _verify_email_lowercase(self.email_address)
-
-        await self.assert_exists(conn)
+        self._assert_not_expired()
 
         async with conn.cursor() as cur:
             await cur.execute(
-                "UPDATE pre_users SET failed_attempts = %s WHERE email_address = %s",
-                (self.failed_attempts + amount, self.email_address),
+                f"""
+                    UPDATE pre_users SET failed_attempts = failed_attempts + %s
+                    WHERE {self._MATCHES_SQL}
+                    RETURNING failed_attempts
+                """,
+                (amount, *self._params()),
             )
+            row = await cur.fetchone()
+            if row is None:
+                raise InternalError(f"PreUser missing or deviated from db: {self}")
+
+        self.failed_attempts = row[0]
+
+    @classmethod
+    async def increment_failed_attempts_by_email_address(
+        cls, conn: AsyncConnection, email_address: str, amount: int = 1
+    ) -> bool:
+        """Increment an unexpired pre-user's failed attempts, return whether found."""
+        _verify_email_lowercase(email_address)
 
-        self.failed_attempts += amount
+        async with conn.cursor() as cur:
+            await cur.execute(
+                """
+                    UPDATE pre_users SET failed_attempts = failed_attempts + %s
+                    WHERE email_address = %s AND expires_at > %s
+                    RETURNING email_address
+                """,
+                (amount, email_address, datetime.utcnow()),
+            )
+            return await cur.fetchone() is not None
 
     async def delete(self, conn: AsyncConnection) -> None:
         """Delete the current pre-user from the database."""
         _verify_email_lowercase(self.email_address)
-
-        await self.assert_exists(conn)
+        self._assert_not_expired()
 
         async with conn.cursor() as cur:
             await cur.execute(
-                "DELETE FROM pre_users WHERE email_address = %s",
-                (self.email_address,),
+                f"""
+                    DELETE FROM pre_users WHERE {self._MATCHES_SQL}
+                    RETURNING email_address
+                """,
+                self._params(),
             )
+            if await cur.fetchone() is None:
+                raise InternalError(f"PreUser missing or deviated from db: {self}")
 
     @classmethod
     async def find_by_email_address(
         cls, conn: AsyncConnection, email_address: str
     ) -> Optional[PreUser]:
-        """Find a pre-user by email address."""
+        """Find an unexpired pre-user by email address."""
         _verify_email_lowercase(email_address)
 
-        async with conn.cursor(row_factory=class_row(PreUser)) as cur:
+        async with conn.cursor(row_factory=args_row(PreUser)) as cur:
             await cur.execute(
-                "SELECT * FROM pre_users WHERE email_address = %s",
-                (email_address,),
-            )
-            pre_user = await cur.fetchone()
-            if pre_user is None or pre_user.expiry_time() < datetime.utcnow():
-                return None
-            return pre_user
-
-    async def assert_exists(self, conn: AsyncConnection) -> None:
-        """Raise exception if the email address doesn't exist."""
-        _verify_email_lowercase(self.email_address)
-
-        pre_user = await self.find_by_email_address(conn, self.email_address)
-        if pre_user is None:
-            raise InternalError(
-                "PreUser does not exist in db, should have been checked earlier"
+                f"""
+                    SELECT {cls._COLUMNS} FROM pre_users
+                    WHERE email_address = %s AND expires_at > %s
+                """,
+                (email_address, datetime.utcnow()),
             )
-
-        # Complain on any differences from db
-        if (
-            self.email_address != pre_user.email_address
-            or self.verify_code != pre_user.verify_code
-            or self.created_time != pre_user.created_time
-            or self.failed_attempts != pre_user.failed_attempts
-        ):
-            raise InternalError(f"PreUser deviation from db: {self} vs {pre_user}")
+            return await cur.fetchone()
 
     @classmethod
-    async def cleanup_expired(cls, conn: AsyncConnection) -> None:
-        """Clean up expired pre-users."""
-        latest_valid = datetime.utcnow() - timedelta(hours=PREUSER_TTL_HOURS)
+    async def cleanup_expired(cls, conn: AsyncConnection, limit: int) -> int:
+        """Clean up to limit expired pre-users, return how many were removed.
+
+        Rows locked by in-flight requests are skipped rather than waited on.
+        """
         async with conn.cursor() as cur:
             await cur.execute(
-                "DELETE FROM pre_users WHERE created_time < %s",
-                (latest_valid,),
+                """
+                    DELETE FROM pre_users WHERE email_address IN (
+                        SELECT email_address FROM pre_users
+                        WHERE expires_at <= %s
+                        LIMIT %s
+                        FOR UPDATE SKIP LOCKED
+                    )
+                """,
+                (datetime.utcnow(), limit),
             )
-
-    def expiry_time(self) -> datetime:
-        """Get the pre-user's expiry time."""
-        return self.created_time + timedelta(hours=PREUSER_TTL_HOURS)
+            return cur.rowcount
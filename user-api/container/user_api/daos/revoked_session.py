@@ -0,0 +1,76 @@
+from __future__ import annotations  # Postponed annotation evaluation, remove once 3.11
+
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List
+from uuid import UUID
+
+from user_api.daos.database import AsyncConnection
+
+
+@dataclass
+class RevokedSession:
+    """A session ended before its signed tokens expired."""
+
+    __slots__ = ("session_id", "expires_at")
+
+    session_id: UUID
+    expires_at: datetime
+
+    async def create(self, conn: AsyncConnection) -> None:
+        """Record the current revocation, if it isn't already."""
+        async with conn.cursor() as cur:
+            await cur.execute(
+                """
+                    INSERT INTO revoked_sessions (session_id, expires_at)
+                    VALUES (%s, %s)
+                    ON CONFLICT DO NOTHING
+                """,
+                (self.session_id, self.expires_at),
+            )
+
+    @classmethod
+    async def revoke_all_for_user(cls, conn: AsyncConnection, user_id: UUID) -> int:
+        """Revoke every unexpired session of a user, return how many were revoked."""
+        async with conn.cursor() as cur:
+            await cur.execute(
+                """
+                    INSERT INTO revoked_sessions (session_id, expires_at)
+                    SELECT session_id, expires_at FROM sessions
+                    WHERE user_id = %s AND expires_at > %s
+                    ON CONFLICT DO NOTHING
+                    RETURNING session_id
+                """,
+                (user_id, datetime.utcnow()),
+            )
+            return len(await cur.fetchall())
+
+    @classmethod
+    async def find_unexpired_ids(cls, conn: AsyncConnection) -> List[UUID]:
+        """Find the ids of all revoked sessions whose tokens haven't yet expired."""
+        async with conn.cursor() as cur:
+            await cur.execute(
+                "SELECT session_id FROM revoked_sessions WHERE expires_at > %s",
+                (datetime.utcnow(),),
+            )
+            return [row[0] for row in await cur.fetchall()]
+
+    @classmethod
+    async def cleanup_expired(cls, conn: AsyncConnection, limit: int) -> int:
+        """Clean up to limit expired revocations, return how many were removed.
+
+        Rows locked by in-flight requests are skipped rather than waited on.
+        """
+        async with conn.cursor() as cur:
+            await cur.execute(
+                """
+                    DELETE FROM revoked_sessions WHERE session_id IN (
+                        SELECT session_id FROM revoked_sessions
+                        WHERE expires_at <= %s
+                        LIMIT %s
+                        FOR UPDATE SKIP LOCKED
+                    )
+                """,
+                (datetime.utcnow(), limit),
+            )
+            return cur.rowcount
@@ -1,102 +1,153 @@
 from __future__ import annotations  # Postponed annotation evaluation, remove once 3.11
 
-from datetime import datetime, timedelta
-from typing import Optional
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Optional, Tuple
+from uuid import UUID
 
-from psycopg.rows import class_row
-from pydantic import BaseModel, UUID4
+from psycopg.rows import args_row
 
-from user_api.config import SESSION_TTL_HOURS
 from user_api.daos.database import AsyncConnection
 from user_api.exceptions import InternalError
 
 
-class Session(BaseModel):
-    session_id: UUID4
-    client_token: UUID4
-    user_id: UUID4
+@dataclass
+class Session:
+    __slots__ = ("session_id", "client_token", "user_id", "created_time", "expires_at")
+
+    session_id: UUID
+    client_token: UUID
+    user_id: UUID
     created_time: datetime
+    expires_at: datetime
+
+    # Field order, rows are read positionally
+    _COLUMNS = "session_id, client_token, user_id, created_time, expires_at"
+
+    # Optimistic concurrency check - writes only apply if the row still matches self
+    _MATCHES_SQL = """
+        session_id = %s
+        AND client_token = %s
+        AND user_id = %s
+        AND created_time = %s
+        AND expires_at = %s
+    """
+
+    def _params(self) -> Tuple[Any, ...]:
+        """Get the fields as query params, in _COLUMNS order."""
+        return (
+            self.session_id,
+            self.client_token,
+            self.user_id,
+            self.created_time,
+            self.expires_at,
+        )
 
     async def create(self, conn: AsyncConnection) -> None:
         """Create the current session in the database."""
-        if await self.find_by_id(conn, self.session_id) is not None:
-            raise InternalError(
-                f"Cannot create Session - id {self.session_id} already exists"
-            )
-
         async with conn.cursor() as cur:
             await cur.execute(
-                "INSERT INTO sessions VALUES (%s, %s, %s, %s)",
-                (tuple(self.dict().values())),
+                f"""
+                    INSERT INTO sessions ({self._COLUMNS}) VALUES (%s, %s, %s, %s, %s)
+                    ON CONFLICT DO NOTHING
+                    RETURNING session_id
+                """,
+                self._params(),
             )
+            if await cur.fetchone() is None:
+                raise InternalError(
+                    f"Cannot create Session - id {self.session_id} already exists"
+                )
 
     async def delete(self, conn: AsyncConnection) -> None:
         """Delete the current session."""
-        await self.assert_exists(conn)
-
         async with conn.cursor() as cur:
             await cur.execute(
-                "DELETE FROM sessions WHERE session_id = %s",
-                (self.session_id,),
+                f"""
+                    DELETE FROM sessions WHERE {self._MATCHES_SQL}
+                    RETURNING session_id
+                """,
+                self._params(),
             )
+            if await cur.fetchone() is None:
+                raise InternalError(f"Session missing or deviated from db: {self}")
 
     @classmethod
-    async def find_by_id(
-        cls, conn: AsyncConnection, session_id: UUID4
+    async def delete_by_id(
+        cls, conn: AsyncConnection, session_id: UUID
     ) -> Optional[Session]:
-        """Find a session by id."""
-        async with conn.cursor(row_factory=class_row(Session)) as cur:
+        """Delete an unexpired session by id, return the deleted session if any."""
+        async with conn.cursor(row_factory=args_row(Session)) as cur:
             await cur.execute(
-                "SELECT * FROM sessions WHERE session_id = %s",
-                (session_id,),
+                f"""
+                    DELETE FROM sessions WHERE session_id = %s AND expires_at > %s
+                    RETURNING {cls._COLUMNS}
+                """,
+                (session_id, datetime.utcnow()),
             )
-            sess = await cur.fetchone()
-            if sess is None or sess.expiry_time() < datetime.utcnow():
-                return None
-            return sess
+            return await cur.fetchone()
 
     @classmethod
-    async def find_by_token(
-        cls, conn: AsyncConnection, client_token: UUID4
+    async def delete_by_token(
+        cls, conn: AsyncConnection, client_token: UUID
     ) -> Optional[Session]:
-        """Find a session by client token."""
-        async with conn.cursor(row_factory=class_row(Session)) as cur:
+        """Delete an unexpired session by token, return the deleted session if any."""
+        async with conn.cursor(row_factory=args_row(Session)) as cur:
             await cur.execute(
-                "SELECT * FROM sessions WHERE client_token = %s",
-                (client_token,),
+                f"""
+                    DELETE FROM sessions WHERE client_token = %s AND expires_at > %s
+                    RETURNING {cls._COLUMNS}
+                """,
+                (client_token, datetime.utcnow()),
             )
-            sess = await cur.fetchone()
-            if sess is None or sess.expiry_time() < datetime.utcnow():
-                return None
-            return sess
-
-    async def assert_exists(self, conn: AsyncConnection) -> None:
-        """Raise exception if the session doesn't exist."""
-        session = await self.find_by_id(conn, self.session_id)
-        if session is None:
-            raise InternalError(
-                "Session does not exist in db, should have been checked earlier"
+            return await cur.fetchone()
+
+    @classmethod
+    async def find_by_id(
+        cls, conn: AsyncConnection, session_id: UUID
+    ) -> Optional[Session]:
+        """Find an unexpired session by id."""
+        async with conn.cursor(row_factory=args_row(Session)) as cur:
+            await cur.execute(
+                f"""
+                    SELECT {cls._COLUMNS} FROM sessions
+                    WHERE session_id = %s AND expires_at > %s
+                """,
+                (session_id, datetime.utcnow()),
             )
+            return await cur.fetchone()
 
-        # Complain on any differences from db
-        if (
-            self.session_id != session.session_id
-            or self.client_token != session.client_token
-            or self.user_id != session.user_id
-            or self.created_time != session.created_time
-        ):
-            raise InternalError(f"Session deviation from db: {self} vs {session}")
+    @classmethod
+    async def find_by_token(
+        cls, conn: AsyncConnection, client_token: UUID
+    ) -> Optional[Session]:
+        """Find an unexpired session by client token."""
+        async with conn.cursor(row_factory=args_row(Session)) as cur:
+            await cur.execute(
+                f"""
+                    SELECT {cls._COLUMNS} FROM sessions
+                    WHERE client_token = %s AND expires_at > %s
+                """,
+                (client_token, datetime.utcnow()),
+            )
+            return await cur.fetchone()
 
     @classmethod
-    async def cleanup_expired(cls, conn: AsyncConnection) -> None:
-        """Clean up expired sessions."""
-        latest_valid = datetime.utcnow() - timedelta(hours=SESSION_TTL_HOURS)
+    async def cleanup_expired(cls, conn: AsyncConnection, limit: int) -> int:
+        """Clean up to limit expired sessions, return how many were removed.
+
+        Rows locked by in-flight requests are skipped rather than waited on.
+        """
         async with conn.cursor() as cur:
             await cur.execute(
-                "DELETE FROM sessions WHERE created_time <= %s",
-                (latest_valid,),
+                """
+                    DELETE FROM sessions WHERE session_id IN (
+                        SELECT session_id FROM sessions
+                        WHERE expires_at <= %s
+                        LIMIT %s
+                        FOR UPDATE SKIP LOCKED
+                    )
+                """,
+                (datetime.utcnow(), limit),
             )
-
-    def expiry_time(self) -> datetime:
-        """Get the session's expiration time."""
-        return self.created_time + timedelta(hours=SESSION_TTL_HOURS)
+            return cur.rowcount
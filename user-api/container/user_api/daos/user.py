@@ -1,45 +1,112 @@
 from __future__ import annotations  # Postponed annotation evaluation, remove once 3.11
 
+from dataclasses import dataclass
 from datetime import datetime
-from typing import Optional
+from typing import Any, Optional, Tuple
+from uuid import UUID
 
-from psycopg.rows import class_row
-from pydantic import BaseModel, UUID4
+from psycopg.errors import UniqueViolation
+from psycopg.rows import args_row
 
 from user_api.daos.database import AsyncConnection
 from user_api.daos.utils import _verify_email_lowercase
-from user_api.exceptions import InternalError
+from user_api.exceptions import ClientError, InternalError
 
 
-class User(BaseModel):
+@dataclass
+class UserProfile:
+    """A registered user's public data, without credentials."""
+
+    __slots__ = ("email_address", "first_name", "last_name", "login_notify")
+
+    email_address: str
+    first_name: str
+    last_name: str
+    login_notify: bool
+
+
+@dataclass
+class TokenOwner:
+    """The email address behind an unexpired session, and when that session expires."""
+
+    __slots__ = ("email_address", "expiry_time")
+
+    email_address: str
+    expiry_time: datetime
+
+
+@dataclass
+class User:
     """A registered user."""
 
-    user_id: UUID4
+    __slots__ = (
+        "user_id",
+        "email_address",
+        "password_hash",
+        "first_name",
+        "last_name",
+        "created_time",
+        "login_notify",
+    )
+
+    user_id: UUID
     email_address: str
     password_hash: str
     first_name: str
     last_name: str
     created_time: datetime
-    login_notify: bool = False
+    login_notify: bool
+
+    # Field order, rows are read positionally
+    _COLUMNS = """
+        user_id, email_address, password_hash, first_name, last_name,
+        created_time, login_notify
+    """
+
+    # Optimistic concurrency check - writes only apply if the row still matches self
+    _MATCHES_SQL = """
+        user_id = %s
+        AND email_address = %s
+        AND password_hash = %s
+        AND first_name = %s
+        AND last_name = %s
+        AND created_time = %s
+    """
+
+    def _matches_params(self) -> Tuple[Any, ...]:
+        """Get the params for _MATCHES_SQL."""
+        return (
+            self.user_id,
+            self.email_address,
+            self.password_hash,
+            self.first_name,
+            self.last_name,
+            self.created_time,
+        )
+
+    def _params(self) -> Tuple[Any, ...]:
+        """Get the fields as query params, in _COLUMNS order."""
+        return (*self._matches_params(), self.login_notify)
 
     async def create(self, conn: AsyncConnection) -> None:
         """Create the current user in the database."""
         _verify_email_lowercase(self.email_address)
 
-        if await self.find_by_id(conn, self.user_id) is not None:
-            raise InternalError(
-                f"Cannot create User - id {self.user_id} already exists"
-            )
-        if await self.find_by_email_address(conn, self.email_address) is not None:
-            raise InternalError(
-                f"Cannot create User - email address {self.email_address} taken"
-            )
-
         async with conn.cursor() as cur:
             await cur.execute(
-                "INSERT INTO users VALUES (%s, %s, %s, %s, %s, %s, %s)",
-                tuple(self.dict().values()),
+                f"""
+                    INSERT INTO users ({self._COLUMNS})
+                    VALUES (%s, %s, %s, %s, %s, %s, %s)
+                    ON CONFLICT DO NOTHING
+                    RETURNING user_id
+                """,
+                self._params(),
             )
+            if await cur.fetchone() is None:
+                raise InternalError(
+                    f"Cannot create User - id {self.user_id} or email address "
+                    f"{self.email_address} taken"
+                )
 
     async def update_email_address(
         self, conn: AsyncConnection, new_email_address: str
@@ -48,44 +115,61 @@ class User(BaseModel):
         _verify_email_lowercase(new_email_address)
         _verify_email_lowercase(self.email_address)
 
-        await self.assert_exists(conn)
-
         async with conn.cursor() as cur:
-            await cur.execute(
-                "UPDATE users SET email_address = %s WHERE user_id = %s",
-                (new_email_address, self.user_id),
-            )
+            try:
+                await cur.execute(
+                    f"""
+                        UPDATE users SET email_address = %s
+                        WHERE {self._MATCHES_SQL}
+                        RETURNING email_address
+                    """,
+                    (new_email_address, *self._matches_params()),
+                )
+                row = await cur.fetchone()
+            except UniqueViolation:
+                raise ClientError(f"Email address {new_email_address} already claimed")
+            if row is None:
+                raise InternalError(f"User missing or deviated from db: {self}")
 
-        self.email_address = new_email_address
+        self.email_address = row[0]
 
     async def update_name(
         self, conn: AsyncConnection, new_first_name: str, new_last_name: str
     ) -> None:
         """Update the user's name if possible."""
-        await self.assert_exists(conn)
-
         async with conn.cursor() as cur:
             await cur.execute(
-                "UPDATE users SET first_name = %s, last_name = %s WHERE user_id = %s",
-                (new_first_name, new_last_name, self.user_id),
+                f"""
+                    UPDATE users SET first_name = %s, last_name = %s
+                    WHERE {self._MATCHES_SQL}
+                    RETURNING first_name, last_name
+                """,
+                (new_first_name, new_last_name, *self._matches_params()),
             )
+            row = await cur.fetchone()
+            if row is None:
+                raise InternalError(f"User missing or deviated from db: {self}")
 
-        self.first_name = new_first_name
-        self.last_name = new_last_name
+        self.first_name, self.last_name = row
 
     async def update_password_hash(
         self, conn: AsyncConnection, new_password_hash: str
     ) -> None:
         """Update the user's password if possible."""
-        await self.assert_exists(conn)
-
         async with conn.cursor() as cur:
             await cur.execute(
-                "UPDATE users SET password_hash = %s WHERE user_id = %s",
-                (new_password_hash, self.user_id),
+                f"""
+                    UPDATE users SET password_hash = %s
+                    WHERE {self._MATCHES_SQL}
+                    RETURNING password_hash
+                """,
+                (new_password_hash, *self._matches_params()),
             )
+            row = await cur.fetchone()
+            if row is None:
+                raise InternalError(f"User missing or deviated from db: {self}")
 
-        self.password_hash = new_password_hash
+        self.password_hash = row[0]
 
     async def update_login_notify(
         self,
@@ -93,32 +177,40 @@ class User(BaseModel):
         login_notify: bool,
     ) -> None:
         """Update the user's login notification setting."""
-        await self.assert_exists(conn)
-
         async with conn.cursor() as cur:
             await cur.execute(
-                "UPDATE users SET login_notify = %s WHERE user_id = %s",
-                (login_notify, self.user_id),
+                f"""
+                    UPDATE users SET login_notify = %s
+                    WHERE {self._MATCHES_SQL}
+                    RETURNING login_notify
+                """,
+                (login_notify, *self._matches_params()),
             )
+            row = await cur.fetchone()
+            if row is None:
+                raise InternalError(f"User missing or deviated from db: {self}")
 
-        self.login_notify = login_notify
+        self.login_notify = row[0]
 
     async def delete(self, conn: AsyncConnection) -> None:
         """Delete the current user from the database."""
-        await self.assert_exists(conn)
-
         async with conn.cursor() as cur:
             await cur.execute(
-                "DELETE FROM users WHERE user_id = %s",
-                (self.user_id,),
+                f"""
+                    DELETE FROM users WHERE {self._MATCHES_SQL}
+                    RETURNING user_id
+                """,
+                self._matches_params(),
             )
+            if await cur.fetchone() is None:
+                raise InternalError(f"User missing or deviated from db: {self}")
 
     @classmethod
-    async def find_by_id(cls, conn: AsyncConnection, user_id: UUID4) -> Optional[User]:
+    async def find_by_id(cls, conn: AsyncConnection, user_id: UUID) -> Optional[User]:
         """Find a user by id."""
-        async with conn.cursor(row_factory=class_row(User)) as cur:
+        async with conn.cursor(row_factory=args_row(User)) as cur:
             await cur.execute(
-                "SELECT * FROM users WHERE user_id = %s",
+                f"SELECT {cls._COLUMNS} FROM users WHERE user_id = %s",
                 (user_id,),
             )
             return await cur.fetchone()
@@ -130,33 +222,94 @@ class User(BaseModel):
         """Find a user by email address."""
         _verify_email_lowercase(email_address)
 
-        async with conn.cursor(row_factory=class_row(User)) as cur:
+        async with conn.cursor(row_factory=args_row(User)) as cur:
             await cur.execute(
-                "SELECT * FROM users WHERE email_address = %s",
+                f"SELECT {cls._COLUMNS} FROM users WHERE email_address = %s",
                 (email_address,),
             )
             return await cur.fetchone()
 
-    async def assert_exists(self, conn: AsyncConnection) -> None:
-        """Raise exception if the user id doesn't exist."""
-        _verify_email_lowercase(self.email_address)
+    @classmethod
+    async def find_profile_by_email_address(
+        cls, conn: AsyncConnection, email_address: str
+    ) -> Optional[UserProfile]:
+        """Find a user's profile by email address."""
+        _verify_email_lowercase(email_address)
+
+        async with conn.cursor(row_factory=args_row(UserProfile)) as cur:
+            await cur.execute(
+                """
+                    SELECT email_address, first_name, last_name, login_notify
+                    FROM users
+                    WHERE email_address = %s
+                """,
+                (email_address,),
+            )
+            return await cur.fetchone()
+
+    @classmethod
+    async def find_profile_by_token(
+        cls, conn: AsyncConnection, client_token: UUID
+    ) -> Optional[UserProfile]:
+        """Find a user's profile by an unexpired session's client token."""
+        async with conn.cursor(row_factory=args_row(UserProfile)) as cur:
+            await cur.execute(
+                """
+                    SELECT u.email_address, u.first_name, u.last_name, u.login_notify
+                    FROM sessions s JOIN users u ON u.user_id = s.user_id
+                    WHERE s.client_token = %s AND s.expires_at > %s
+                """,
+                (client_token, datetime.utcnow()),
+            )
+            return await cur.fetchone()
 
-        user = await self.find_by_id(conn, self.user_id)
-        if user is None:
-            raise InternalError(
-                "User does not exist in db, should have been checked earlier"
+    @classmethod
+    async def find_token_owner(
+        cls, conn: AsyncConnection, client_token: UUID
+    ) -> Optional[TokenOwner]:
+        """Find a user's email address and session expiry by client token."""
+        async with conn.cursor(row_factory=args_row(TokenOwner)) as cur:
+            await cur.execute(
+                """
+                    SELECT u.email_address, s.expires_at AS expiry_time
+                    FROM sessions s JOIN users u ON u.user_id = s.user_id
+                    WHERE s.client_token = %s AND s.expires_at > %s
+                """,
+                (client_token, datetime.utcnow()),
             )
+            return await cur.fetchone()
 
-        # Complain on any differences from db
-        if (
-            self.user_id != user.user_id
-            or self.email_address != user.email_address
-            or self.password_hash != user.password_hash
-            or self.first_name != user.first_name
-            or self.last_name != user.last_name
-            or self.created_time != user.created_time
-        ):
-            raise InternalError(f"User deviation from db: {self} vs {user}")
+    @classmethod
+    async def find_profile_by_session_id(
+        cls, conn: AsyncConnection, session_id: UUID
+    ) -> Optional[UserProfile]:
+        """Find a user's profile by an unexpired session's id."""
+        async with conn.cursor(row_factory=args_row(UserProfile)) as cur:
+            await cur.execute(
+                """
+                    SELECT u.email_address, u.first_name, u.last_name, u.login_notify
+                    FROM sessions s JOIN users u ON u.user_id = s.user_id
+                    WHERE s.session_id = %s AND s.expires_at > %s
+                """,
+                (session_id, datetime.utcnow()),
+            )
+            return await cur.fetchone()
+
+    @classmethod
+    async def find_session_owner(
+        cls, conn: AsyncConnection, session_id: UUID
+    ) -> Optional[TokenOwner]:
+        """Find a user's email address and session expiry by session id."""
+        async with conn.cursor(row_factory=args_row(TokenOwner)) as cur:
+            await cur.execute(
+                """
+                    SELECT u.email_address, s.expires_at AS expiry_time
+                    FROM sessions s JOIN users u ON u.user_id = s.user_id
+                    WHERE s.session_id = %s AND s.expires_at > %s
+                """,
+                (session_id, datetime.utcnow()),
+            )
+            return await cur.fetchone()
 
     def full_email(self) -> str:
         """Get the full email for the given user."""
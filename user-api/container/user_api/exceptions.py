@@ -16,6 +16,12 @@ class NotFoundError(Exception):
     pass
 
 
+class OverloadedError(Exception):
+    """Exceptions caused by the service being too busy to take on more work."""
+
+    pass
+
+
 class VerifyFailedError(Exception):
     """Exceptions caused by failure to verify, handled by increments_failed_attempts."""
 
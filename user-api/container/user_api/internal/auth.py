@@ -1,20 +1,26 @@
-import asyncio
-from datetime import datetime
-from typing import Optional
-from uuid import uuid4
+from datetime import datetime, timedelta
+from typing import Awaitable, List, Optional, Union
+from uuid import UUID, uuid4
 
 from pydantic import UUID4
 
 from user_api.config import (
     ALLOWED_FAILED_VERIFICATIONS,
     EMAIL_ENABLED,
+    PASSWORD_RESET_TTL_HOURS,
+    PREUSER_TTL_HOURS,
+    SESSION_TTL_HOURS,
+    TOKEN_FORMAT,
     VERIFY_CODE_LENGTH,
 )
 from user_api.daos import (
     PasswordReset,
     PreUser,
     Session,
+    TokenOwner,
     User,
+    UserProfile,
+    gather_queries,
     get_db_connection,
 )
 from user_api.exceptions import (
@@ -22,15 +28,23 @@ from user_api.exceptions import (
     NotFoundError,
     VerifyFailedError,
 )
+from user_api.internal.hashing import needs_rehash, password_hash, password_verify
+from user_api.internal import signed_tokens
+from user_api.internal.outbox import EmailPriority, queue_email
+from user_api.internal.revocations import (
+    invalidate_revocation_filter,
+    revoke,
+    revoke_all_for_user,
+)
+from user_api.internal.signed_tokens import TokenClaims
 from user_api.internal.utils import (
     increments_failed_attempts,
     legal_email_address,
     legal_name,
     legal_password,
     legal_verify_code,
-    password_hash,
-    password_verify,
     random_digits,
+    run_in_background,
 )
 from user_api.services import email
 
@@ -44,14 +58,18 @@ async def preregister(email_address: str) -> PreUser:
     if not legal_email_address(email_address):
         raise ClientError("Invalid email address")
 
-    async with await get_db_connection() as conn:
+    async with get_db_connection(pipeline=True) as conn:
+        # Look for a claiming user and a previous pre-registration in one round trip
+        existing_user, pre_user = await gather_queries(
+            User.find_by_email_address(conn, email_address),
+            PreUser.find_by_email_address(conn, email_address),
+        )
+
         # Check email isn't claimed
-        existing_user = await User.find_by_email_address(conn, email_address)
         if existing_user is not None:
             raise ClientError(f"Email address {email_address} already claimed")
 
-        # Find previous pre-registration attempt if it exists
-        pre_user = await PreUser.find_by_email_address(conn, email_address)
+        # Handle previous pre-registration attempt if it exists
         if pre_user is not None:
             # If allowed, send a new email and bump failed verifications
             if pre_user.failed_attempts >= ALLOWED_FAILED_VERIFICATIONS:
@@ -64,22 +82,26 @@ async def preregister(email_address: str) -> PreUser:
 
         else:
             # Make a new pre-user object
+            now = datetime.utcnow()
             pre_user = PreUser(
                 email_address=email_address,
                 verify_code=random_digits(VERIFY_CODE_LENGTH),
-                created_time=datetime.utcnow(),
+                created_time=now,
                 failed_attempts=0,
+                expires_at=now + timedelta(hours=PREUSER_TTL_HOURS),
             )
 
             # Insert the pre-user into the database
             await pre_user.create(conn)
 
-        # Send verification email
-        # Keep in context manager so we don't make pre-user if email blows up
+        # Queue verification email
+        # Keep in context manager so it's only sent if the pre-user is committed
         if EMAIL_ENABLED:
-            email.send_verification_email(
+            await queue_email(
+                conn,
                 to_email=email_address,
-                verify_code=pre_user.verify_code,
+                content=email.verification_email(pre_user.verify_code),
+                priority=EmailPriority.VERIFICATION,
             )
 
     return pre_user
@@ -97,7 +119,7 @@ async def preregister_verify(email_address: str, verify_code: str) -> None:
         raise ClientError("Invalid verify code")
 
     async with increments_failed_attempts(email_address)():
-        async with await get_db_connection() as conn:
+        async with get_db_connection(pipeline=True) as conn:
             # Check verification code
             pre_user = await PreUser.find_by_email_address(conn, email_address)
             if pre_user is None:
@@ -128,14 +150,18 @@ async def register(
         raise ClientError("Invalid verify code")
 
     async with increments_failed_attempts(email_address)():
-        async with await get_db_connection() as conn:
+        async with get_db_connection(pipeline=True) as conn:
+            # Look for a claiming user and the pre-registration in one round trip
+            existing_user, pre_user = await gather_queries(
+                User.find_by_email_address(conn, email_address),
+                PreUser.find_by_email_address(conn, email_address),
+            )
+
             # Check email isn't claimed
-            existing_user = await User.find_by_email_address(conn, email_address)
             if existing_user is not None:
                 raise ClientError(f"Email address {email_address} already claimed")
 
             # Check verification code
-            pre_user = await PreUser.find_by_email_address(conn, email_address)
             if pre_user is None:
                 raise ClientError("Verification invalid or expired")
 
@@ -145,34 +171,42 @@ async def register(
             if verify_code != pre_user.verify_code:
                 raise VerifyFailedError("Verification code invalid")
 
-            await pre_user.delete(conn)
-
             # Make a new user object
             new_user = User(
                 user_id=uuid4(),
                 email_address=email_address,
-                password_hash=password_hash(password),
+                password_hash=await password_hash(password),
                 first_name=first_name,
                 last_name=last_name,
                 created_time=datetime.utcnow(),
+                login_notify=False,
             )
 
-            # Insert the user into the database
-            await new_user.create(conn)
+            # Swap the pre-user for the user in one round trip
+            writes: List[Awaitable[object]] = [
+                pre_user.delete(conn),
+                new_user.create(conn),
+            ]
 
-            # Send email welcoming the new user
-            # Keep in context manager so we don't make user if email blows up
+            # Queue email welcoming the new user
+            # Keep in context manager so it's only sent if the user is committed
             if EMAIL_ENABLED:
-                email.send_post_verification_email(
-                    to_email=new_user.full_email(),
-                    first_name=new_user.first_name,
+                writes.append(
+                    queue_email(
+                        conn,
+                        to_email=new_user.full_email(),
+                        content=email.post_verification_email(new_user.first_name),
+                        priority=EmailPriority.WELCOME,
+                    )
                 )
 
+            await gather_queries(*writes)
+
     return new_user
 
 
-async def find_by_email_address(email_address: str) -> User:
-    """Find a user by email address."""
+async def find_by_email_address(email_address: str) -> UserProfile:
+    """Find a user's profile by email address."""
 
     email_address = email_address.lower()
 
@@ -180,33 +214,61 @@ async def find_by_email_address(email_address: str) -> User:
     if not legal_email_address(email_address):
         raise ClientError("Invalid email address")
 
-    async with await get_db_connection() as conn:
+    async with get_db_connection(pipeline=True) as conn:
         # Find the user
-        user = await User.find_by_email_address(conn, email_address)
+        user = await User.find_profile_by_email_address(conn, email_address)
         if user is None:
             raise NotFoundError("Failed to find given user")
 
     return user
 
 
-async def find_by_token(client_token: UUID4) -> User:
-    """Find a user by a client token."""
+def _resolve_client_token(client_token: str) -> Union[TokenClaims, UUID]:
+    """Get a signed token's verified claims, or an opaque token's uuid."""
+    if signed_tokens.is_signed_token(client_token):
+        claims = signed_tokens.verify(client_token)
+        if claims is None:
+            raise NotFoundError("Failed to find given session")
+        return claims
 
-    async with await get_db_connection() as conn:
-        # Find the session
-        session = await Session.find_by_token(conn, client_token)
+    try:
+        return UUID(client_token)
+    except ValueError:
+        raise NotFoundError("Failed to find given session")
 
-        if session is None:
-            raise NotFoundError("Failed to find given session")
 
-        # Find the user
-        user = await User.find_by_id(conn, session.user_id)
+async def find_by_token(client_token: str) -> UserProfile:
+    """Find a user's profile by a client token."""
+    resolved = _resolve_client_token(client_token)
+
+    async with get_db_connection(pipeline=True) as conn:
+        # Find the session's user in one query
+        if isinstance(resolved, TokenClaims):
+            user = await User.find_profile_by_session_id(conn, resolved.session_id)
+        else:
+            user = await User.find_profile_by_token(conn, resolved)
         if user is None:
-            raise NotFoundError("Failed to find given user")
+            raise NotFoundError("Failed to find given session")
 
     return user
 
 
+async def find_token_owner(client_token: str) -> TokenOwner:
+    """Find a client token's user email address and session expiry."""
+    resolved = _resolve_client_token(client_token)
+
+    async with get_db_connection(pipeline=True) as conn:
+        # Find the session's user in one query
+        if isinstance(resolved, TokenClaims):
+            token_owner = await User.find_session_owner(conn, resolved.session_id)
+        else:
+            token_owner = await User.find_token_owner(conn, resolved)
+        if token_owner is None:
+            raise NotFoundError("Failed to find given session")
+
+    return token_owner
+
+
 async def change_name(
     email_address: str, first_name: Optional[str], last_name: Optional[str]
 ) -> None:
@@ -224,7 +286,7 @@ async def change_name(
     if last_name is not None and not legal_name(last_name):
         raise ClientError("Invalid last name")
 
-    async with await get_db_connection() as conn:
+    async with get_db_connection(pipeline=True) as conn:
         # Find the user
         user = await User.find_by_email_address(conn, email_address)
         if user is None:
@@ -249,14 +311,14 @@ async def change_password(email_address: str, new_password: str) -> None:
     if not legal_password(new_password):
         raise ClientError("Invalid password")
 
-    async with await get_db_connection() as conn:
+    async with get_db_connection(pipeline=True) as conn:
         # Find the user
         user = await User.find_by_email_address(conn, email_address)
         if user is None:
             raise NotFoundError("Failed to find given user")
 
         # Update the user's password
-        await user.update_password_hash(conn, password_hash(new_password))
+        await user.update_password_hash(conn, await password_hash(new_password))
 
 
 async def change_login_notify(email_address: str, login_notify: bool) -> None:
@@ -268,7 +330,7 @@ async def change_login_notify(email_address: str, login_notify: bool) -> None:
     if not legal_email_address(email_address):
         raise ClientError("Invalid email address")
 
-    async with await get_db_connection() as conn:
+    async with get_db_connection(pipeline=True) as conn:
         # Find the user
         user = await User.find_by_email_address(conn, email_address)
         if user is None:
@@ -287,7 +349,7 @@ async def request_reset_password(email_address: str) -> PasswordReset:
     if not legal_email_address(email_address):
         raise ClientError("Invalid email address")
 
-    async with await get_db_connection() as conn:
+    async with get_db_connection(pipeline=True) as conn:
         # Find the user
         user = await User.find_by_email_address(conn, email_address)
         if user is None:
@@ -299,23 +361,31 @@ async def request_reset_password(email_address: str) -> PasswordReset:
             raise ClientError("Password reset request already pending")
 
         # Make a new password reset object
+        now = datetime.utcnow()
         password_reset = PasswordReset(
             reset_code=uuid4(),
             user_id=user.user_id,
-            created_time=datetime.utcnow(),
+            created_time=now,
+            expires_at=now + timedelta(hours=PASSWORD_RESET_TTL_HOURS),
         )
 
-        # Insert the pre-user into the database
-        await password_reset.create(conn)
+        # Insert the password reset into the database
+        writes: List[Awaitable[object]] = [password_reset.create(conn)]
 
-        # Send email with the reset code
-        # Keep in context manager so we don't make reset if email blows up
+        # Queue email with the reset code
+        # Keep in context manager so it's only sent if the reset is committed
         if EMAIL_ENABLED:
-            email.send_password_reset_email(
-                to_email=user.full_email(),
-                reset_code=str(password_reset.reset_code),
+            writes.append(
+                queue_email(
+                    conn,
+                    to_email=user.full_email(),
+                    content=email.password_reset_email(str(password_reset.reset_code)),
+                    priority=EmailPriority.PASSWORD_RESET,
+                )
             )
 
+        await gather_queries(*writes)
+
     return password_reset
 
 
@@ -332,26 +402,27 @@ async def reset_password(
     if not legal_password(new_password):
         raise ClientError("Invalid password")
 
-    async with await get_db_connection() as conn:
-        # Find the user
-        user = await User.find_by_email_address(conn, email_address)
+    async with get_db_connection(pipeline=True) as conn:
+        # Find the user and the password reset in one round trip
+        user, password_reset = await gather_queries(
+            User.find_by_email_address(conn, email_address),
+            PasswordReset.find_by_reset_code(conn, reset_code),
+        )
         if user is None:
             raise NotFoundError("Failed to find given user")
-
-        # Find the password reset
-        password_reset = await PasswordReset.find_by_reset_code(conn, reset_code)
         if password_reset is None or password_reset.user_id != user.user_id:
             raise ClientError("Password reset code invalid")
 
-        # Update the user's password
-        await user.update_password_hash(conn, password_hash(new_password))
-
-        # Remove the password reset request
-        await password_reset.delete(conn)
+        # Update the user's password and remove the password reset request together
+        new_password_hash = await password_hash(new_password)
+        await gather_queries(
+            user.update_password_hash(conn, new_password_hash),
+            password_reset.delete(conn),
+        )
 
 
-async def login(email_address: str, password: str) -> Session:
-    """Attempt to a log a user in, return session if successful."""
+async def login(email_address: str, password: str) -> str:
+    """Attempt to a log a user in, return a client token if successful."""
 
     email_address = email_address.lower()
 
@@ -361,7 +432,7 @@ async def login(email_address: str, password: str) -> Session:
     if not legal_password(password):
         raise ClientError("Invalid password")
 
-    async with await get_db_connection() as conn:
+    async with get_db_connection(pipeline=True) as conn:
         # Get the associated user
         user = await User.find_by_email_address(conn, email_address)
 
@@ -369,52 +440,98 @@ async def login(email_address: str, password: str) -> Session:
             raise ClientError("Invalid email address or password")
 
         # Validate the password
-        if not password_verify(password, user.password_hash):
+        if not await password_verify(password, user.password_hash):
             raise ClientError("Invalid email address or password")
 
+        # Move the password to the configured cost once the login is done
+        rehash = needs_rehash(user.password_hash)
+
         # Make a new session object
+        now = datetime.utcnow()
         new_session = Session(
             session_id=uuid4(),
             client_token=uuid4(),
             user_id=user.user_id,
-            created_time=datetime.utcnow(),
+            created_time=now,
+            expires_at=now + timedelta(hours=SESSION_TTL_HOURS),
         )
 
         # Insert the session into the database
-        await new_session.create(conn)
+        writes: List[Awaitable[object]] = [new_session.create(conn)]
 
-        # Send email to notify of login
-        # Keep in context manager so we don't login if email blows up
+        # Queue email to notify of login
+        # Keep in context manager so it's only sent if the session is committed
         if EMAIL_ENABLED and user.login_notify:
-            email.send_login_notification_email(
-                to_email=user.full_email(),
+            writes.append(
+                queue_email(
+                    conn,
+                    to_email=user.full_email(),
+                    content=email.login_notification_email(),
+                    priority=EmailPriority.LOGIN_NOTIFICATION,
+                )
             )
 
-    return new_session
+        await gather_queries(*writes)
+
+    # Only once the login's committed, as the rehash starts straight away
+    if rehash:
+        run_in_background(_rehash_password(user, password))
+
+    # Signed tokens carry enough to be validated without a lookup
+    if TOKEN_FORMAT == "signed":
+        return signed_tokens.issue(
+            TokenClaims(
+                sid=new_session.session_id,
+                uid=user.user_id,
+                eml=user.email_address,
+                exp=int(
+                    (new_session.expires_at - datetime(1970, 1, 1)).total_seconds()
+                ),
+            )
+        )
+    return new_session.client_token.hex
+
+
+async def _rehash_password(user: User, password: str) -> None:
+    """Rehash a user's already-verified password at the configured cost."""
+    new_password_hash = await password_hash(password)
+
+    async with get_db_connection(pipeline=True) as conn:
+        # Fails if the user changed since login, e.g. a concurrent password change
+        await user.update_password_hash(conn, new_password_hash)
 
 
 async def logout_by_session_id(session_id: UUID4) -> None:
-    """Log out a session given a client token."""
-    async with await get_db_connection() as conn:
-        # Find the session
-        session = await Session.find_by_id(conn, session_id)
+    """Log out a session given a session id."""
+    async with get_db_connection(pipeline=True) as conn:
+        # Delete the session, if it exists
+        session = await Session.delete_by_id(conn, session_id)
         if session is None:
             raise NotFoundError("Failed to find given session")
 
-        # Delete the session
-        await session.delete(conn)
+        # Revoke in the same transaction, so the session can't outlive its tokens
+        await revoke(conn, session)
+
+    invalidate_revocation_filter()
 
 
-async def logout_by_client_token(client_token: UUID4) -> None:
+async def logout_by_client_token(client_token: str) -> None:
     """Log out a session given a client token."""
-    async with await get_db_connection() as conn:
-        # Find the session
-        session = await Session.find_by_token(conn, client_token)
+    resolved = _resolve_client_token(client_token)
+    if isinstance(resolved, TokenClaims):
+        await logout_by_session_id(resolved.session_id)
+        return
+
+    async with get_db_connection(pipeline=True) as conn:
+        # Delete the session, if it exists
+        session = await Session.delete_by_token(conn, resolved)
         if session is None:
             raise NotFoundError("Failed to find given session")
 
-        # Delete the session
-        await session.delete(conn)
+        # Revoke in the same transaction, so the session can't outlive its tokens
+        await revoke(conn, session)
+
+    invalidate_revocation_filter()
 
 
 async def delete(email_address: str) -> None:
@@ -426,26 +543,16 @@ async def delete(email_address: str) -> None:
     if not legal_email_address(email_address):
         raise ClientError("Invalid email address")
 
-    async with await get_db_connection() as conn:
+    async with get_db_connection(pipeline=True) as conn:
         # Get the user
         user = await User.find_by_email_address(conn, email_address)
         if user is None:
             raise NotFoundError("Failed to find given user")
 
+        # Revoke the user's sessions before they cascade away
+        await revoke_all_for_user(conn, user.user_id)
+
         # Delete the user
         await user.delete(conn)
 
-
-async def clean_db_loop() -> None:
-    """Loop to clean db stuff regularly."""
-    while True:
-        async with await get_db_connection() as conn:
-            print("Starting db cleanup")
-            print("Cleaning password_resets")
-            await PasswordReset.cleanup_expired(conn)
-            print("Cleaning pre_users")
-            await PreUser.cleanup_expired(conn)
-            print("Cleaning sessions")
-            await Session.cleanup_expired(conn)
-            print("Done db cleanup")
-            await asyncio.sleep(3600)
+    invalidate_revocation_filter()
@@ -0,0 +1,56 @@
+import base64
+import hashlib
+import math
+from typing import Iterator
+
+
+class BloomFilter(object):
+    """A set that may report false positives, but never false negatives.
+
+    Items are located by double hashing a sha256 digest. Other services rebuild this
+    from num_bits, num_hashes and bits, so the hashing must not change.
+    """
+
+    def __init__(self, num_bits: int, num_hashes: int, bits: bytes = b""):
+        self.num_bits = num_bits
+        self.num_hashes = num_hashes
+        self.bits = bytearray(bits or (math.ceil(num_bits / 8) * b"\x00"))
+        if len(self.bits) != math.ceil(num_bits / 8):
+            raise ValueError("Bloom filter bits don't match num_bits")
+
+    @classmethod
+    def for_capacity(
+        cls, capacity: int, false_positive_rate: float, min_bits: int = 1024
+    ) -> "BloomFilter":
+        """Make an empty filter sized to hold capacity items at the given rate."""
+        capacity = max(1, capacity)
+        num_bits = math.ceil(
+            -capacity * math.log(false_positive_rate) / (math.log(2) ** 2)
+        )
+        num_bits = max(min_bits, num_bits)
+        num_hashes = max(1, round(num_bits / capacity * math.log(2)))
+        return cls(num_bits, num_hashes)
+
+    def _positions(self, item: str) -> Iterator[int]:
+        """Get the bit positions for an item."""
+        digest = hashlib.sha256(item.encode("utf-8")).digest()
+        h1 = int.from_bytes(digest[:8], "big")
+        h2 = int.from_bytes(digest[8:16], "big") | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, item: str) -> None:
+        """Add an item to the filter."""
+        for position in self._positions(item):
+            self.bits[position // 8] |= 1 << (position % 8)
+
+    def __contains__(self, item: str) -> bool:
+        """Whether the item might have been added."""
+        return all(
+            self.bits[position // 8] & (1 << (position % 8))
+            for position in self._positions(item)
+        )
+
+    def bits_b64(self) -> str:
+        """Get the filter's bits, base64 encoded for transport."""
+        return base64.b64encode(bytes(self.bits)).decode("ascii")
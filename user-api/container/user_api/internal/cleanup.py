@@ -0,0 +1,122 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+from user_api import config
+from user_api.daos import (
+    AsyncConnection,
+    PasswordReset,
+    PreUser,
+    RevokedSession,
+    Session,
+    advisory_unlock,
+    get_db_connection,
+    try_advisory_lock,
+)
+
+
+logger = logging.getLogger(__name__)
+
+# Advisory lock held by whichever instance is running cleanup
+CLEANUP_LOCK_ID = 0x75736572636C6E  # "usercln"
+
+# What to clean, in order
+_cleaners: Dict[str, Callable[[AsyncConnection, int], Awaitable[int]]] = {
+    "password_resets": PasswordReset.cleanup_expired,
+    "pre_users": PreUser.cleanup_expired,
+    "revoked_sessions": RevokedSession.cleanup_expired,
+    "sessions": Session.cleanup_expired,
+}
+
+_stats: Dict[str, float] = {
+    "runs": 0,
+    "skipped_runs": 0,
+    "last_run_seconds": 0.0,
+    "last_run_deleted": 0,
+    **{f"last_run_deleted_{name}": 0 for name in _cleaners},
+    "deleted_total": 0,
+}
+
+
+def next_interval() -> float:
+    """Get the seconds until the next cleanup, jittered so instances drift apart."""
+    return max(
+        0.0,
+        config.CLEANUP_INTERVAL_SECONDS
+        + random.uniform(-config.CLEANUP_JITTER_SECONDS, config.CLEANUP_JITTER_SECONDS),
+    )
+
+
+async def _clean_table(
+    conn: AsyncConnection, cleaner: Callable[[AsyncConnection, int], Awaitable[int]]
+) -> int:
+    """Clean one table in batches, committing each, return how many were removed."""
+    deleted = 0
+    while True:
+        batch_deleted = await cleaner(conn, config.CLEANUP_BATCH_SIZE)
+        await conn.commit()
+        deleted += batch_deleted
+        if batch_deleted < config.CLEANUP_BATCH_SIZE:
+            return deleted
+        # Give requests waiting on the same pages a turn
+        await asyncio.sleep(config.CLEANUP_BATCH_PAUSE_SECONDS)
+
+
+async def run_cleanup() -> Optional[Dict[str, int]]:
+    """Clean up expired rows, unless another instance is already doing so.
+
+    Returns rows removed per table, or None if another instance held the lock.
+    """
+    start_t = time.perf_counter()
+    async with get_db_connection() as conn:
+        if not await try_advisory_lock(conn, CLEANUP_LOCK_ID):
+            _stats["skipped_runs"] += 1
+            return None
+        await conn.commit()
+
+        deleted: Dict[str, int] = {}
+        try:
+            for name, cleaner in _cleaners.items():
+                deleted[name] = await _clean_table(conn, cleaner)
+        finally:
+            # The lock is held by the session, so release it before repooling
+            try:
+                await conn.rollback()
+                await advisory_unlock(conn, CLEANUP_LOCK_ID)
+            except Exception:
+                # Else it'd be repooled still holding the lock, stalling every
+                # instance's cleanup. Closing ends the session, releasing the lock,
+                # and the pool replaces the closed connection
+                await conn.close()
+                raise
+
+    run_seconds = time.perf_counter() - start_t
+    _stats["runs"] += 1
+    _stats["last_run_seconds"] = run_seconds
+    _stats["last_run_deleted"] = sum(deleted.values())
+    for name, count in deleted.items():
+        _stats[f"last_run_deleted_{name}"] = count
+    _stats["deleted_total"] += sum(deleted.values())
+    logger.info(
+        "Done db cleanup", extra={"seconds": round(run_seconds, 3), "deleted": deleted}
+    )
+    return deleted
+
+
+async def cleanup_loop() -> None:
+    """Loop to clean up expired rows regularly, without holding a connection between."""
+    # Stagger the first run, so instances starting together don't all contend
+    await asyncio.sleep(random.uniform(0, config.CLEANUP_JITTER_SECONDS))
+    while True:
+        try:
+            await run_cleanup()
+        except Exception as e:
+            logger.error("DB cleanup error", extra={"error": str(e)})
+        await asyncio.sleep(next_interval())
+
+
+def cleanup_stats() -> Dict[str, float]:
+    """Get the cleanup's statistics, as of this instance's last run."""
+    return dict(_stats)
@@ -0,0 +1,126 @@
+import asyncio
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+import time
+from typing import Any, Callable, Dict, Optional, Tuple, TypeVar
+
+import bcrypt
+
+from user_api import config
+from user_api.exceptions import InternalError, OverloadedError
+from user_api.tracing import record_span
+
+
+T = TypeVar("T")
+
+# Shared executor, created on first use
+_executor: Optional[Executor] = None
+
+# Number of hashes submitted but not yet finished, running or queued
+_in_flight = 0
+
+_stats: Dict[str, float] = {
+    "completed": 0,
+    "rejected": 0,
+    "hash_seconds_total": 0.0,
+    "hash_seconds_max": 0.0,
+    "wait_seconds_total": 0.0,
+}
+
+
+def _timed_hash(password: bytes, cost: int) -> Tuple[bytes, float]:
+    """Hash in a worker, return the hash and time spent hashing."""
+    start_t = time.perf_counter()
+    hashed = bcrypt.hashpw(password, bcrypt.gensalt(cost))
+    return hashed, time.perf_counter() - start_t
+
+
+def _timed_verify(password: bytes, hashed: bytes) -> Tuple[bool, float]:
+    """Verify in a worker, return whether it matched and time spent hashing."""
+    start_t = time.perf_counter()
+    matched = bcrypt.checkpw(password, hashed)
+    return matched, time.perf_counter() - start_t
+
+
+def _get_executor() -> Executor:
+    """Get the shared executor, creating it if necessary."""
+    global _executor
+    if _executor is None:
+        if config.HASH_EXECUTOR == "thread":
+            _executor = ThreadPoolExecutor(
+                max_workers=config.HASH_WORKERS, thread_name_prefix="hash"
+            )
+        elif config.HASH_EXECUTOR == "process":
+            _executor = ProcessPoolExecutor(max_workers=config.HASH_WORKERS)
+        else:
+            raise Exception(f"Unknown HASH_EXECUTOR '{config.HASH_EXECUTOR}'")
+    return _executor
+
+
+async def _run(func: Callable[..., Tuple[T, float]], *args: Any) -> T:
+    """Run a timed hashing function in the executor, if there's room in the queue."""
+    global _in_flight
+    if _in_flight >= config.HASH_WORKERS + config.HASH_QUEUE_SIZE:
+        _stats["rejected"] += 1
+        raise OverloadedError("Too many password hashes in progress")
+
+    _in_flight += 1
+    start_t = time.perf_counter()
+    try:
+        loop = asyncio.get_running_loop()
+        result, hash_seconds = await loop.run_in_executor(_get_executor(), func, *args)
+    finally:
+        _in_flight -= 1
+
+    end_t = time.perf_counter()
+    _stats["completed"] += 1
+    _stats["hash_seconds_total"] += hash_seconds
+    _stats["hash_seconds_max"] = max(_stats["hash_seconds_max"], hash_seconds)
+    _stats["wait_seconds_total"] += end_t - start_t - hash_seconds
+    record_span("hash", start_t, end_t, hash_seconds=hash_seconds)
+    return result
+
+
+async def password_hash(password: str) -> str:
+    """Use bcrypt to hash a password at the configured cost, off the event loop."""
+    hashed = await _run(_timed_hash, password.encode("utf-8"), config.BCRYPT_COST)
+    return hashed.decode("utf-8")
+
+
+async def password_verify(password: str, password_hash: str) -> bool:
+    """Use bcrypt to verify a password, off the event loop."""
+    return await _run(
+        _timed_verify, password.encode("utf-8"), password_hash.encode("utf-8")
+    )
+
+
+def hash_cost(password_hash: str) -> int:
+    """Get the bcrypt cost a password hash was made with."""
+    # Hashes look like $2b$<cost>$<salt and hash>
+    try:
+        return int(password_hash.split("$")[2])
+    except (IndexError, ValueError):
+        raise InternalError("Password hash is not a bcrypt hash")
+
+
+def needs_rehash(password_hash: str) -> bool:
+    """Whether a password hash was made with a cost other than the configured one."""
+    return hash_cost(password_hash) != config.BCRYPT_COST
+
+
+def hashing_stats() -> Dict[str, float]:
+    """Get the hashing executor's statistics."""
+    return {
+        "workers": config.HASH_WORKERS,
+        "queue_size": config.HASH_QUEUE_SIZE,
+        "in_flight": _in_flight,
+        "queue_depth": max(0, _in_flight - config.HASH_WORKERS),
+        **_stats,
+    }
+
+
+def shutdown_hash_executor() -> None:
+    """Shut down the shared executor, if it was created."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False)
+        _executor = None
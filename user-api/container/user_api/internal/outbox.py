@@ -0,0 +1,207 @@
+import asyncio
+from datetime import datetime, timedelta
+from enum import IntEnum
+import logging
+import random
+import time
+from typing import Dict, List, Optional, Tuple
+from uuid import uuid4
+
+from user_api import config
+from user_api.daos import AsyncConnection, OutboxEmail, get_db_connection
+from user_api.metrics import registry
+from user_api.services import email
+from user_api.tracing import background_trace
+
+
+logger = logging.getLogger(__name__)
+
+
+class EmailPriority(IntEnum):
+    """Order in which queued emails are sent, lowest first."""
+
+    # The user is waiting on these to continue
+    VERIFICATION = 0
+    PASSWORD_RESET = 1
+    # Nobody is waiting on these
+    WELCOME = 2
+    LOGIN_NOTIFICATION = 3
+
+
+_stats: Dict[str, float] = {
+    "queue_depth": 0,
+    "sent": 0,
+    "batches": 0,
+    "failed_attempts": 0,
+    "dropped": 0,
+    "send_seconds_total": 0.0,
+    "send_seconds_max": 0.0,
+    "queued_seconds_total": 0.0,
+    "queued_seconds_max": 0.0,
+}
+
+_send_seconds = registry.histogram(
+    "email_send_duration_seconds",
+    "Time to send a batch of emails to sendgrid, per outcome.",
+    ["outcome"],
+)
+_send_seconds_sent = _send_seconds.labels("sent")
+_send_seconds_failed = _send_seconds.labels("failed")
+
+
+async def queue_email(
+    conn: AsyncConnection,
+    to_email: str,
+    content: email.EmailContent,
+    priority: EmailPriority,
+) -> OutboxEmail:
+    """Queue an email to be sent once the connection's transaction commits."""
+    now = datetime.utcnow()
+    outbox_email = OutboxEmail(
+        email_id=uuid4(),
+        to_email=to_email,
+        subject=content.subject,
+        html_content=content.html_content,
+        priority=priority,
+        created_time=now,
+        attempts=0,
+        next_attempt_time=now,
+        substitutions=content.substitutions,
+    )
+    await outbox_email.create(conn)
+    return outbox_email
+
+
+def retry_delay(attempts: int) -> float:
+    """Get the seconds to wait before retrying, after the given number of attempts.
+
+    Doubles with each attempt up to a cap, with full jitter so a SendGrid outage
+    doesn't end in every queued email retrying at once.
+    """
+    ceiling = min(
+        config.EMAIL_OUTBOX_MAX_BACKOFF_SECONDS,
+        config.EMAIL_OUTBOX_BACKOFF_SECONDS * 2 ** max(0, attempts - 1),
+    )
+    return random.uniform(ceiling / 2, ceiling)
+
+
+async def _settle(outbox_email: OutboxEmail, error: Optional[Exception]) -> None:
+    """Remove a sent email, or reschedule it, or drop it once it can't be sent."""
+    async with get_db_connection() as conn:
+        if error is None:
+            await outbox_email.delete(conn)
+            return
+
+        rejected = isinstance(error, email.SendError) and error.rejected
+        if rejected or outbox_email.attempts >= config.EMAIL_OUTBOX_MAX_ATTEMPTS:
+            logger.error(
+                "Email dropped",
+                extra={"email_id": outbox_email.email_id, "error": str(error)},
+            )
+            _stats["dropped"] += 1
+            await outbox_email.delete(conn)
+            return
+
+        logger.warning(
+            "Email send error",
+            extra={"email_id": outbox_email.email_id, "error": str(error)},
+        )
+        next_attempt_time = datetime.utcnow() + timedelta(
+            seconds=retry_delay(outbox_email.attempts)
+        )
+        await outbox_email.reschedule(conn, next_attempt_time)
+
+
+async def _send_batch(batch: List[OutboxEmail]) -> None:
+    """Send claimed emails sharing a template together, then remove or reschedule.
+
+    Each email is settled in its own tx, so one reclaimed by another worker after its
+    lease ran out can't roll back the rest, and have them sent again.
+    """
+    start_t = time.perf_counter()
+    errors = await email.send_batch(
+        [email.EmailRecipient(e.to_email, e.substitutions) for e in batch],
+        subject=batch[0].subject,
+        html_content=batch[0].html_content,
+    )
+    send_seconds = time.perf_counter() - start_t
+    sent = errors.count(None)
+    if sent < len(batch):
+        _send_seconds_failed.observe(send_seconds)
+        _stats["failed_attempts"] += len(batch) - sent
+    else:
+        _send_seconds_sent.observe(send_seconds)
+    if sent:
+        _stats["batches"] += 1
+        _stats["sent"] += sent
+        _stats["send_seconds_total"] += send_seconds
+        _stats["send_seconds_max"] = max(_stats["send_seconds_max"], send_seconds)
+
+    now = datetime.utcnow()
+    for outbox_email, error in zip(batch, errors):
+        if error is None:
+            queued_seconds = (now - outbox_email.created_time).total_seconds()
+            _stats["queued_seconds_total"] += queued_seconds
+            _stats["queued_seconds_max"] = max(
+                _stats["queued_seconds_max"], queued_seconds
+            )
+        try:
+            await _settle(outbox_email, error)
+        except Exception as e:
+            logger.error(
+                "Email outbox error",
+                extra={"email_id": outbox_email.email_id, "error": str(e)},
+            )
+
+
+async def send_outbox_once() -> int:
+    """Claim and send one batch of due emails, return how many were claimed."""
+    lease_until = datetime.utcnow() + timedelta(
+        seconds=config.EMAIL_OUTBOX_LEASE_SECONDS
+    )
+    # Claim in its own short tx, so no connection is held while sending
+    async with get_db_connection() as conn:
+        claimed = await OutboxEmail.claim_due(
+            conn, limit=config.EMAIL_OUTBOX_BATCH_SIZE, lease_until=lease_until
+        )
+        depth = sum(count for _, count in await OutboxEmail.count_by_priority(conn))
+    _stats["queue_depth"] = depth
+
+    for priority in sorted({e.priority for e in claimed}):
+        # Emails sharing a template go out in one request
+        batches: Dict[Tuple[str, str], List[OutboxEmail]] = {}
+        for outbox_email in claimed:
+            if outbox_email.priority == priority:
+                key = (outbox_email.subject, outbox_email.html_content)
+                batches.setdefault(key, []).append(outbox_email)
+
+        # Send each priority concurrently, finishing it before starting the next
+        with background_trace("email_outbox"):
+            results = await asyncio.gather(
+                *[_send_batch(batch) for batch in batches.values()],
+                return_exceptions=True,
+            )
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error("Email outbox error", extra={"error": str(result)})
+
+    return len(claimed)
+
+
+async def send_outbox_loop() -> None:
+    """Loop to send queued emails, retrying failures with backoff."""
+    while True:
+        try:
+            claimed = await send_outbox_once()
+        except Exception as e:
+            logger.error("Email outbox error", extra={"error": str(e)})
+            claimed = 0
+
+        # Go straight on to the next batch if this one was full
+        if claimed < config.EMAIL_OUTBOX_BATCH_SIZE:
+            await asyncio.sleep(config.EMAIL_OUTBOX_POLL_SECONDS)
+
+
+def outbox_stats() -> Dict[str, float]:
+    """Get the email outbox's statistics, queue depth as of the last poll."""
+    return dict(_stats)
@@ -0,0 +1,80 @@
+import time
+from datetime import datetime
+from typing import Optional
+
+from pydantic import BaseModel, UUID4
+
+from user_api.config import (
+    REVOCATION_FILTER_CACHE_SECONDS,
+    REVOCATION_FILTER_FALSE_POSITIVE_RATE,
+    TOKEN_SIGNING_KEYS,
+)
+from user_api.daos import AsyncConnection, RevokedSession, Session, get_db_connection
+from user_api.internal.bloom import BloomFilter
+
+
+class RevocationFilter(BaseModel):
+    """A bloom filter of the session ids revoked before their signed tokens expire."""
+
+    num_bits: int
+    num_hashes: int
+    bits: str  # base64
+    count: int
+    generated_time: datetime
+
+
+# Latest filter and the monotonic time it was built, rebuilt once stale
+_cached: Optional[RevocationFilter] = None
+_cached_at = 0.0
+
+
+async def revoke(conn: AsyncConnection, session: Session) -> None:
+    """Record that a session ended, so its signed tokens stop validating."""
+    # Without signing keys no signed token was ever issued, so nothing to revoke
+    if not TOKEN_SIGNING_KEYS:
+        return
+    await RevokedSession(
+        session_id=session.session_id, expires_at=session.expires_at
+    ).create(conn)
+
+
+async def revoke_all_for_user(conn: AsyncConnection, user_id: UUID4) -> None:
+    """Record that all of a user's sessions ended."""
+    if not TOKEN_SIGNING_KEYS:
+        return
+    await RevokedSession.revoke_all_for_user(conn, user_id)
+
+
+def invalidate_revocation_filter() -> None:
+    """Drop the cached filter, after committing a revocation."""
+    global _cached
+    _cached = None
+
+
+async def revocation_filter() -> RevocationFilter:
+    """Get a filter of the currently revoked sessions, briefly cached."""
+    global _cached, _cached_at
+    if (
+        _cached is not None
+        and time.monotonic() - _cached_at < REVOCATION_FILTER_CACHE_SECONDS
+    ):
+        return _cached
+
+    async with get_db_connection() as conn:
+        session_ids = await RevokedSession.find_unexpired_ids(conn)
+
+    bloom = BloomFilter.for_capacity(
+        len(session_ids), REVOCATION_FILTER_FALSE_POSITIVE_RATE
+    )
+    for session_id in session_ids:
+        bloom.add(str(session_id))
+
+    _cached = RevocationFilter(
+        num_bits=bloom.num_bits,
+        num_hashes=bloom.num_hashes,
+        bits=bloom.bits_b64(),
+        count=len(session_ids),
+        generated_time=datetime.utcnow(),
+    )
+    _cached_at = time.monotonic()
+    return _cached
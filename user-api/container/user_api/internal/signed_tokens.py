@@ -0,0 +1,107 @@
+import base64
+import hashlib
+import hmac
+import json
+import re
+import time
+from typing import List, Optional, Tuple
+
+from pydantic import BaseModel, Field, UUID4, ValidationError
+
+from user_api import config
+
+
+# Signed tokens look like v1.<key id>.<b64 claims>.<b64 signature>
+TOKEN_PREFIX = "v1."
+legal_key_id_re = re.compile(r"^[a-zA-Z0-9_-]+$")
+
+
+class TokenClaims(BaseModel):
+    """What a signed token vouches for, under short names to keep tokens small."""
+
+    session_id: UUID4 = Field(alias="sid")
+    user_id: UUID4 = Field(alias="uid")
+    email_address: str = Field(alias="eml")
+    expires_at: int = Field(alias="exp")  # Unix seconds
+
+
+def parse_signing_keys(raw: str) -> List[Tuple[str, bytes]]:
+    """Parse "key_id:secret,key_id:secret" into keys, the first being for signing."""
+    keys: List[Tuple[str, bytes]] = []
+    for entry in raw.split(","):
+        if not entry.strip():
+            continue
+        key_id, sep, secret = entry.strip().partition(":")
+        if not sep or not secret or re.match(legal_key_id_re, key_id) is None:
+            raise Exception("Malformed TOKEN_SIGNING_KEYS entry")
+        keys.append((key_id, secret.encode("utf-8")))
+    return keys
+
+
+# Parsed once, the first key signs new tokens and any key verifies
+_signing_keys = parse_signing_keys(config.TOKEN_SIGNING_KEYS)
+
+
+def _b64encode(data: bytes) -> str:
+    """Url-safe base64 without padding."""
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(data: str) -> bytes:
+    """Reverse _b64encode."""
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _signature(secret: bytes, key_id: str, claims_b64: str) -> bytes:
+    """Sign a token's key id and claims."""
+    message = f"{TOKEN_PREFIX}{key_id}.{claims_b64}".encode("ascii")
+    return hmac.new(secret, message, hashlib.sha256).digest()
+
+
+def is_signed_token(client_token: str) -> bool:
+    """Whether a client token is in the signed format, valid or not."""
+    return client_token.startswith(TOKEN_PREFIX)
+
+
+def issue(claims: TokenClaims) -> str:
+    """Issue a signed token with the current signing key."""
+    if not _signing_keys:
+        raise Exception("Cannot issue signed tokens without TOKEN_SIGNING_KEYS")
+    key_id, secret = _signing_keys[0]
+    claims_json = json.dumps(
+        claims.dict(by_alias=True), default=str, separators=(",", ":")
+    )
+    claims_b64 = _b64encode(claims_json.encode("utf-8"))
+    signature_b64 = _b64encode(_signature(secret, key_id, claims_b64))
+    return f"{TOKEN_PREFIX}{key_id}.{claims_b64}.{signature_b64}"
+
+
+def verify(client_token: str) -> Optional[TokenClaims]:
+    """Get a signed token's claims, or None if it's malformed, forged or expired.
+
+    This doesn't check whether the session has since been revoked.
+    """
+    if not is_signed_token(client_token):
+        return None
+    parts = client_token.split(".")
+    if len(parts) != 4:
+        return None
+    _, key_id, claims_b64, signature_b64 = parts
+
+    secret = dict(_signing_keys).get(key_id)
+    if secret is None:
+        return None
+    try:
+        signature = _b64decode(signature_b64)
+    except ValueError:
+        return None
+    if not hmac.compare_digest(signature, _signature(secret, key_id, claims_b64)):
+        return None
+
+    try:
+        claims = TokenClaims.parse_obj(json.loads(_b64decode(claims_b64)))
+    except (ValueError, ValidationError):
+        return None
+    if claims.expires_at <= time.time():
+        return None
+    return claims
@@ -1,5 +1,6 @@
-import bcrypt
+import asyncio
 from contextlib import asynccontextmanager
+import logging
 import re
 from secrets import randbelow
 from typing import (
@@ -7,8 +8,10 @@ from typing import (
     AsyncGenerator,
     AsyncContextManager,
     Callable,
+    Coroutine,
     Dict,
     List,
+    Set,
 )
 
 from user_api.config import VERIFY_CODE_LENGTH
@@ -16,21 +19,16 @@ from user_api.daos import PreUser, get_db_connection
 from user_api.exceptions import ClientError, InternalError, VerifyFailedError
 
 
+logger = logging.getLogger(__name__)
+
 legal_email_address_re = re.compile(r"^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$")
 re_symbols = re.escape("`~!@#$%^&*()-=_+[]}{\\|;:'\",<.>/?")
 legal_password_re = re.compile(f"^[a-zA-Z0-9{re_symbols}]{{8,72}}$")
 legal_name_re = re.compile(r"^[a-zA-Z-]+$")
 legal_verify_code_re = re.compile(f"^[0-9]{{{VERIFY_CODE_LENGTH}}}$")
 
-
-def password_hash(password: str) -> str:
-    """Use bcrypt to hash a password."""
-    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(12)).decode("utf-8")
-
-
-def password_verify(password: str, password_hash: str) -> bool:
-    """Use bcrypt to verify a password"""
-    return bcrypt.checkpw(password.encode("utf-8"), password_hash.encode("utf-8"))
+# Strong references to running background tasks, so they aren't garbage collected
+_background_tasks: Set["asyncio.Task[None]"] = set()
 
 
 def legal_email_address(email_address: str) -> bool:
@@ -66,6 +64,24 @@ def random_digits(length: int) -> str:
     return "".join(digits)
 
 
+def run_in_background(coro: Coroutine[Any, Any, None]) -> None:
+    """Start running a coroutine alongside the current request, logging any failure.
+
+    It starts right away rather than once the response is sent, so start it only once
+    whatever it relies on is committed.
+    """
+
+    async def _logged() -> None:
+        try:
+            await coro
+        except Exception as e:
+            logger.error("Background task error", extra={"error": str(e)})
+
+    task = asyncio.create_task(_logged())
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
 async def increment_failed_attempts(email_address: str, amount: int = 1) -> None:
     """Increment the failed registration attempts for an email.
 
@@ -73,15 +89,14 @@ async def increment_failed_attempts(email_address: str, amount: int = 1) -> None
     the transaction rollback which will occur if ClientError or unexpected error occurs
     after increment.
     """
-    async with await get_db_connection() as conn:
-        pre_user = await PreUser.find_by_email_address(conn, email_address)
-        if pre_user is None:
+    async with get_db_connection(pipeline=True) as conn:
+        if not await PreUser.increment_failed_attempts_by_email_address(
+            conn, email_address, amount=amount
+        ):
             raise InternalError(
                 "Internal _increment_failed_attempts called with invalid PreUser"
             )
 
-        await pre_user.increment_failed_attempts(conn, amount=amount)
-
 
 def increments_failed_attempts(
     email_address: str,
@@ -0,0 +1,180 @@
+"""Structured logging, written as JSON lines from a background thread.
+
+Records are filtered and queued by the thread logging them, and formatted and written
+by a listener thread, so a slow stdout never blocks the event loop. Records below
+WARNING can be sampled per level and are rate limited, so a storm of client errors
+can't flood the logs. Warnings and errors are never dropped, unless the queue is full.
+"""
+
+from datetime import datetime, timezone
+import json
+import logging
+from logging.handlers import QueueHandler, QueueListener
+import queue
+import random
+import sys
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from user_api import config
+from user_api.tracing import current_trace
+
+
+LOGGER_NAME = "user_api"
+
+# Attributes every record has, anything else was passed as an extra field
+_RECORD_ATTRS = set(logging.makeLogRecord({}).__dict__) | {"message", "asctime"}
+
+_stats: Dict[str, float] = {
+    "sampled_out": 0,
+    "rate_limited": 0,
+    "queue_full": 0,
+}
+
+# Queue handler and writer thread, started by setup_logging
+_handler: Optional[QueueHandler] = None
+_listener: Optional[QueueListener] = None
+
+
+def parse_sample_rates(raw: str) -> Dict[int, float]:
+    """Parse LEVEL=rate pairs like "DEBUG=0.01,INFO=0.5" into rates by level."""
+    rates: Dict[int, float] = {}
+    for pair in raw.split(","):
+        if not pair.strip():
+            continue
+        level, sep, rate = pair.partition("=")
+        level_num = logging.getLevelName(level.strip().upper())
+        if not sep or not isinstance(level_num, int):
+            raise Exception(f"Invalid log sample rate '{pair}', expected LEVEL=rate")
+        rates[level_num] = float(rate)
+    return rates
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as one JSON object per line, with any extra fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data: Dict[str, Any] = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS:
+                data[key] = value
+        return json.dumps(data, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Drop records below WARNING by per-level sampling, then a shared rate limit.
+
+    The rate limit is a token bucket refilling at rate_per_second up to burst. The
+    next record let through after some were rate limited carries how many were.
+    """
+
+    def __init__(
+        self, sample_rates: Dict[int, float], rate_per_second: float, burst: float
+    ) -> None:
+        super().__init__()
+        self.sample_rates = sample_rates
+        self.rate_per_second = rate_per_second
+        self.burst = burst
+        self._tokens = burst
+        self._refilled_at = time.monotonic()
+        self._suppressed = 0
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+
+        rate = self.sample_rates.get(record.levelno, 1.0)
+        if rate < 1.0 and random.random() >= rate:
+            _stats["sampled_out"] += 1
+            return False
+
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.burst,
+                self._tokens + (now - self._refilled_at) * self.rate_per_second,
+            )
+            self._refilled_at = now
+            if self._tokens < 1:
+                self._suppressed += 1
+                _stats["rate_limited"] += 1
+                return False
+            self._tokens -= 1
+            if self._suppressed:
+                record.rate_limited = self._suppressed
+                self._suppressed = 0
+        return True
+
+
+def _add_request_id(record: logging.LogRecord) -> bool:
+    """Tag records logged while handling a request with its request id."""
+    trace = current_trace()
+    if trace is not None:
+        record.request_id = trace.request_id
+    return True
+
+
+class DroppingQueueHandler(QueueHandler):
+    """Queue records for the listener, dropping them if the queue is full.
+
+    Records are prepared before queueing, which merges their args and any traceback
+    into the message.
+    """
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _stats["queue_full"] += 1
+
+
+def setup_logging() -> None:
+    """Send this app's logs through a queue to a JSON writer thread."""
+    global _handler, _listener
+    if _listener is not None:
+        return
+
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(config.LOG_QUEUE_SIZE)
+    handler = DroppingQueueHandler(log_queue)
+    handler.addFilter(
+        SamplingFilter(
+            parse_sample_rates(config.LOG_SAMPLE_RATES),
+            config.LOG_RATE_LIMIT_PER_SECOND,
+            config.LOG_RATE_LIMIT_BURST,
+        )
+    )
+    handler.addFilter(_add_request_id)
+
+    writer = logging.StreamHandler(sys.stdout)
+    writer.setFormatter(JsonFormatter())
+    listener = QueueListener(log_queue, writer)
+    listener.start()
+
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.setLevel(config.LOG_LEVEL.upper())
+    logger.addHandler(handler)
+    # Written once, by the queue's writer
+    logger.propagate = False
+    _handler, _listener = handler, listener
+
+
+def shutdown_logging() -> None:
+    """Write out any queued records and stop the writer thread."""
+    global _handler, _listener
+    if _handler is None or _listener is None:
+        return
+    logging.getLogger(LOGGER_NAME).removeHandler(_handler)
+    listener, _handler, _listener = _listener, None, None
+    listener.stop()
+
+
+def log_stats() -> Dict[str, float]:
+    """Get how many records were dropped, and why."""
+    return dict(_stats)
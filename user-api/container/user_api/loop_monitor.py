@@ -0,0 +1,143 @@
+"""Event loop lag, and the stacks of whatever blocks the loop.
+
+A task on the loop sleeps for an interval over and over, and records how late it wakes
+as the loop's lag - time every other task on the loop was kept waiting too. A watchdog
+thread checks that the task keeps waking: once it's overdue by more than the threshold,
+something is blocking the loop right then, so the watchdog grabs the loop thread's
+stack and the route of the request being handled. That's logged, with how long the
+loop was blocked in total, once the loop gets going again.
+"""
+
+import asyncio
+import logging
+import sys
+import threading
+import time
+from types import CodeType
+from typing import Any, Callable, Dict, List, Optional
+
+from user_api.metrics import registry
+from user_api.profiler import running_task, stack_names
+
+
+LAG_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+# Weight of each lag measured in the moving average, which spans ~20 intervals
+LAG_SMOOTHING = 0.05
+
+logger = logging.getLogger(__name__)
+
+_lag_seconds = registry.histogram(
+    "event_loop_lag_seconds",
+    "How late the event loop ran a task that was ready to run.",
+    [],
+    LAG_BUCKETS,
+).labels()
+_blocked = registry.counter(
+    "event_loop_blocked_total",
+    "Times the event loop was blocked past the threshold, per route running.",
+    ["route"],
+)
+
+
+class LoopMonitor:
+    """Measure the event loop's lag, and catch what's running when it's blocked."""
+
+    def __init__(
+        self,
+        route_of_task: Callable[["asyncio.Task[Any]"], Optional[str]],
+        interval_seconds: float,
+        threshold_seconds: float,
+    ) -> None:
+        # Names the route of the request a task is handling, if it's handling one
+        self.route_of_task = route_of_task
+        self.interval_seconds = interval_seconds
+        self.threshold_seconds = threshold_seconds
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id = 0
+        self._task: "Optional[asyncio.Task[None]]" = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        # perf_counter time the monitor task is next due to wake
+        self._due = 0.0
+        # What the watchdog caught blocking the loop, till the task logs it
+        self._caught: Optional[Dict[str, Any]] = None
+        self._frame_names: Dict[CodeType, str] = {}
+        self._stats: Dict[str, float] = {
+            "lag_seconds_last": 0,
+            "lag_seconds_avg": 0,
+            "lag_seconds_max": 0,
+        }
+
+    def start(self) -> None:
+        """Start monitoring the running event loop, call from the loop's thread."""
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._due = time.perf_counter() + self.interval_seconds
+        self._task = asyncio.create_task(self._measure_loop())
+        self._stopping.clear()
+        self._thread = threading.Thread(
+            target=self._watch, name="loop-watchdog", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop monitoring."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._thread is not None:
+            thread, self._thread = self._thread, None
+            self._stopping.set()
+            thread.join(timeout=1)
+
+    async def _measure_loop(self) -> None:
+        """Sleep for the interval over and over, recording how late each wake is."""
+        while True:
+            self._due = time.perf_counter() + self.interval_seconds
+            await asyncio.sleep(self.interval_seconds)
+            lag = max(0.0, time.perf_counter() - self._due)
+            _lag_seconds.observe(lag)
+            self._stats["lag_seconds_last"] = lag
+            self._stats["lag_seconds_avg"] += LAG_SMOOTHING * (
+                lag - self._stats["lag_seconds_avg"]
+            )
+            self._stats["lag_seconds_max"] = max(self._stats["lag_seconds_max"], lag)
+
+            caught, self._caught = self._caught, None
+            if caught is not None:
+                logger.warning(
+                    "Event loop blocked",
+                    extra={**caught, "blocked_ms": round(lag * 1000, 1)},
+                )
+
+    def _watch(self) -> None:
+        """Catch the stack of anything keeping the monitor task overdue."""
+        caught_due = 0.0
+        while not self._stopping.wait(self.threshold_seconds / 2):
+            due = self._due
+            if due == caught_due or time.perf_counter() - due < self.threshold_seconds:
+                continue
+            # Caught once per overdue wake, however long it stays blocked
+            caught_due = due
+            self._catch()
+
+    def _catch(self) -> None:
+        """Record what the loop thread is running, while it's blocked."""
+        if self._loop is None:
+            return
+        task = running_task(self._loop)
+        route = self.route_of_task(task) if task is not None else None
+        frame = sys._current_frames().get(self._loop_thread_id)
+        stack: List[str] = stack_names(frame, self._frame_names)
+        _blocked.labels(route or "none").inc()
+        self._caught = {
+            "route": route,
+            "task": task.get_name() if task is not None else None,
+            "stack": stack,
+        }
+
+    def stats(self) -> Dict[str, float]:
+        """Get the lag last measured, its moving average, and the most seen."""
+        return dict(self._stats)
@@ -0,0 +1,213 @@
+"""Memory use of this worker: RSS, the Python heap and GC, and allocation diffs.
+
+RSS and heap stats are cheap, read whenever metrics are rendered. Allocation diffs use
+tracemalloc, which slows every allocation while it's on, so it's only started on
+demand: take a snapshot as the baseline, let traffic run, then diff against it. Each
+allocation still alive is attributed to the route whose endpoint is on its traceback,
+and to the innermost function on it from a package of interest, like the daos.
+"""
+
+import dis
+import gc
+import os
+import resource
+import sys
+import time
+import tracemalloc
+from types import CodeType, FunctionType
+from typing import Any, Dict, List, Optional, Tuple
+
+from user_api.exceptions import ClientError
+from user_api.profiler import short_filename
+
+
+# Frames of each allocation's traceback shown in diffs, innermost
+SHOWN_FRAMES = 8
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+_gc_stats: Dict[str, float] = {
+    "pause_seconds_total": 0,
+    "pause_seconds_max": 0,
+}
+_gc_started = 0.0
+
+# Snapshot diffs are taken against, from take_snapshot
+_baseline: Optional[tracemalloc.Snapshot] = None
+
+
+def _on_gc(phase: str, info: Dict[str, int]) -> None:
+    """Time each collection, called by gc before and after."""
+    global _gc_started
+    if phase == "start":
+        _gc_started = time.perf_counter()
+        return
+    pause = time.perf_counter() - _gc_started
+    _gc_stats["pause_seconds_total"] += pause
+    _gc_stats["pause_seconds_max"] = max(_gc_stats["pause_seconds_max"], pause)
+
+
+def time_gc() -> None:
+    """Start timing garbage collections."""
+    if _on_gc not in gc.callbacks:
+        gc.callbacks.append(_on_gc)
+
+
+def memory_stats() -> Dict[str, float]:
+    """Get the process's resident and virtual memory, and the Python heap's size."""
+    try:
+        with open("/proc/self/statm") as f:
+            virtual_pages, resident_pages = f.read().split()[:2]
+        resident = int(resident_pages) * _PAGE_SIZE
+        virtual = int(virtual_pages) * _PAGE_SIZE
+    except OSError:
+        # Not Linux, only the peak is known
+        resident = virtual = 0
+    traced, traced_max = tracemalloc.get_traced_memory()
+    return {
+        "resident_bytes": resident,
+        "virtual_bytes": virtual,
+        # ru_maxrss is in KiB on Linux
+        "resident_bytes_max": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+        "allocated_blocks": sys.getallocatedblocks(),
+        "traced_bytes": traced,
+        "traced_bytes_max": traced_max,
+        "tracemalloc_overhead_bytes": tracemalloc.get_tracemalloc_memory(),
+    }
+
+
+def gc_stats() -> Dict[str, float]:
+    """Get collections, objects collected and pending, per generation, and pauses."""
+    stats = dict(_gc_stats)
+    for generation, (gen_stats, count) in enumerate(
+        zip(gc.get_stats(), gc.get_count())
+    ):
+        stats[f"gen{generation}_collections"] = gen_stats["collections"]
+        stats[f"gen{generation}_collected"] = gen_stats["collected"]
+        stats[f"gen{generation}_uncollectable"] = gen_stats["uncollectable"]
+        stats[f"gen{generation}_objects"] = count
+    return stats
+
+
+def start_tracing(frames: int) -> None:
+    """Start tracing allocations, keeping this many frames of each's traceback."""
+    global _baseline
+    tracemalloc.stop()
+    _baseline = None
+    tracemalloc.start(frames)
+
+
+def stop_tracing() -> None:
+    """Stop tracing allocations, freeing the traces."""
+    global _baseline
+    tracemalloc.stop()
+    _baseline = None
+
+
+def _snapshot() -> tracemalloc.Snapshot:
+    """Snapshot the allocations still alive, except tracemalloc's own."""
+    if not tracemalloc.is_tracing():
+        raise ClientError("Memory tracing isn't started")
+    return tracemalloc.take_snapshot().filter_traces(
+        [tracemalloc.Filter(False, tracemalloc.__file__)]
+    )
+
+
+def take_snapshot() -> int:
+    """Take the baseline snapshot diffs are taken against, return bytes traced."""
+    global _baseline
+    _baseline = _snapshot()
+    return sum(stat.size for stat in _baseline.statistics("filename"))
+
+
+class FunctionIndex:
+    """Find which of some functions a line of code is in."""
+
+    def __init__(self, functions: Dict[CodeType, str]) -> None:
+        self._ranges: Dict[str, List[Tuple[int, int, str]]] = {}
+        for code, name in functions.items():
+            last_line = max(
+                (line for _, line in dis.findlinestarts(code)),
+                default=code.co_firstlineno,
+            )
+            self._ranges.setdefault(code.co_filename, []).append(
+                (code.co_firstlineno, last_line, name)
+            )
+
+    def find(self, filename: str, lineno: int) -> Optional[str]:
+        """Name the function a line is in, if it's one of these."""
+        for first_line, last_line, name in self._ranges.get(filename, []):
+            if first_line <= lineno <= last_line:
+                return name
+        return None
+
+
+def package_functions(package: str) -> Dict[CodeType, str]:
+    """Get the functions and methods of every loaded module in a package, by code."""
+    functions: Dict[CodeType, str] = {}
+    for module_name, module in list(sys.modules.items()):
+        if module_name != package and not module_name.startswith(package + "."):
+            continue
+        for obj in list(vars(module).values()):
+            if getattr(obj, "__module__", None) != module_name:
+                continue
+            members = vars(obj).values() if isinstance(obj, type) else [obj]
+            for member in members:
+                # Unwrap classmethods and staticmethods
+                func = getattr(member, "__func__", member)
+                if isinstance(func, FunctionType):
+                    functions[func.__code__] = f"{module_name}.{func.__qualname__}"
+    return functions
+
+
+def diff_snapshot(
+    routes: FunctionIndex, calls: FunctionIndex, limit: int
+) -> Dict[str, Any]:
+    """Diff the allocations alive now against the baseline.
+
+    Totals the change in bytes per route and per call, and lists the tracebacks
+    whose allocations grew or shrank the most.
+    """
+    if _baseline is None:
+        raise ClientError("No baseline snapshot taken")
+    diffs = _snapshot().compare_to(_baseline, "traceback")
+
+    by_route: Dict[str, int] = {}
+    by_call: Dict[str, int] = {}
+    top: List[Dict[str, Any]] = []
+    for diff in diffs:
+        if not diff.size_diff:
+            continue
+        route = call = None
+        # Oldest frame first
+        for frame in diff.traceback:
+            route = route or routes.find(frame.filename, frame.lineno)
+            call = calls.find(frame.filename, frame.lineno) or call
+        route_key = route or "none"
+        call_key = call or "none"
+        by_route[route_key] = by_route.get(route_key, 0) + diff.size_diff
+        by_call[call_key] = by_call.get(call_key, 0) + diff.size_diff
+        if len(top) < limit:
+            top.append(
+                {
+                    "size_diff_bytes": diff.size_diff,
+                    "count_diff": diff.count_diff,
+                    "size_bytes": diff.size,
+                    "route": route,
+                    "call": call,
+                    "traceback": [
+                        f"{short_filename(frame.filename)}:{frame.lineno}"
+                        for frame in reversed(diff.traceback[-SHOWN_FRAMES:])
+                    ],
+                }
+            )
+
+    def _by_size(totals: Dict[str, int]) -> Dict[str, int]:
+        return dict(sorted(totals.items(), key=lambda item: -abs(item[1])))
+
+    return {
+        "size_diff_bytes": sum(diff.size_diff for diff in diffs),
+        "by_route": _by_size(by_route),
+        "by_call": _by_size(by_call),
+        "top": top,
+    }
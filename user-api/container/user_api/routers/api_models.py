@@ -1,8 +1,33 @@
-from typing import Optional
+from datetime import datetime
+from typing import Dict, List, Optional
 
 from pydantic import BaseModel, UUID4
 
 
+class MemoryAllocation(BaseModel):
+    size_diff_bytes: int
+    count_diff: int
+    size_bytes: int
+    route: Optional[str]
+    call: Optional[str]
+    traceback: List[str]
+
+
+class MemoryDiffResponse(BaseModel):
+    size_diff_bytes: int
+    by_route: Dict[str, int]
+    by_call: Dict[str, int]
+    top: List[MemoryAllocation]
+
+
+class MemorySnapshotResponse(BaseModel):
+    traced_bytes: int
+
+
+class MemoryTracingRequest(BaseModel):
+    frames: int = 64
+
+
 class PasswordResetCreateRequest(BaseModel):
     email_address: str
 
@@ -24,8 +49,40 @@ class PreUserVerifyRequest(BaseModel):
     verify_code: str
 
 
+class ProfilerResponse(BaseModel):
+    sample_rate: float
+    route: str
+    stats: Dict[str, float]
+
+
+class ProfilerUpdateRequest(BaseModel):
+    sample_rate: float = 0.0
+    route: str = ""
+
+
+class ReadinessResponse(BaseModel):
+    ready: bool
+    failing: Dict[str, str]
+
+
+class RevokedSessionsGetResponse(BaseModel):
+    num_bits: int
+    num_hashes: int
+    bits: str
+    count: int
+    generated_time: datetime
+
+
+class StatsResponse(BaseModel):
+    db_pool: Dict[str, int]
+    hashing: Dict[str, float]
+    email_outbox: Dict[str, float]
+    cleanup: Dict[str, float]
+
+
 class TokenGetResponse(BaseModel):
     email_address: str
+    expiry_time: datetime
 
 
 class UserCreateRequest(BaseModel):
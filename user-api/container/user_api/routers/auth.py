@@ -1,11 +1,10 @@
 from typing import Optional
 
 from fastapi import APIRouter, Response, status
-from pydantic import UUID4
 
 from user_api.config import EMAIL_ENABLED
-from user_api.exceptions import ClientError, NotFoundError
-from user_api.internal import auth
+from user_api.exceptions import ClientError
+from user_api.internal import auth, revocations
 from user_api.routers import api_models
 from user_api.routers.utils import sanitize_excs
 
@@ -63,7 +62,7 @@ async def user_create(
 
 @router.get("/users")
 async def user_get(
-    email_address: Optional[str] = None, client_token: Optional[UUID4] = None
+    email_address: Optional[str] = None, client_token: Optional[str] = None
 ) -> api_models.UserGetResponse:
     """Get data for a given user."""
     with sanitize_excs():
@@ -164,28 +163,38 @@ async def user_login(
 ) -> api_models.UserLoginResponse:
     """Log a user in."""
     with sanitize_excs():
-        session = await auth.login(
+        client_token = await auth.login(
             email_address=user_login_request.email_address,
             password=user_login_request.password,
         )
-        resp = api_models.UserLoginResponse(client_token=session.client_token.hex)
+        resp = api_models.UserLoginResponse(client_token=client_token)
     return resp
 
 
 @router.get("/tokens/{client_token}")
-async def token_get(client_token: UUID4) -> api_models.TokenGetResponse:
+async def token_get(client_token: str) -> api_models.TokenGetResponse:
     """Get data for a given token."""
     with sanitize_excs():
-        user = await auth.find_by_token(client_token)
-        if user is None:
-            raise NotFoundError("Failed to find token")
-        resp = api_models.TokenGetResponse(email_address=user.email_address)
+        token_owner = await auth.find_token_owner(client_token)
+        resp = api_models.TokenGetResponse(
+            email_address=token_owner.email_address,
+            expiry_time=token_owner.expiry_time,
+        )
     return resp
 
 
 @router.delete("/tokens/{client_token}")
-async def token_delete(client_token: UUID4) -> Response:
+async def token_delete(client_token: str) -> Response:
     """Log the currently authenticated user out."""
     with sanitize_excs():
         await auth.logout_by_client_token(client_token)
     return success
+
+
+@router.get("/revoked_sessions")
+async def revoked_sessions_get() -> api_models.RevokedSessionsGetResponse:
+    """Get a bloom filter of sessions revoked before their signed tokens expire."""
+    with sanitize_excs():
+        revocation_filter = await revocations.revocation_filter()
+        resp = api_models.RevokedSessionsGetResponse(**revocation_filter.dict())
+    return resp
@@ -0,0 +1,119 @@
+import hmac
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status
+from fastapi.responses import PlainTextResponse
+from starlette.concurrency import run_in_threadpool
+
+from user_api import config, memory
+from user_api.exceptions import ClientError
+from user_api.routers import api_models
+from user_api.routers.middleware import endpoint_routes, profiler, route_names
+from user_api.routers.utils import sanitize_excs
+
+
+async def check_debug_token(authorization: str = Header("")) -> None:
+    """Only allow callers with the debug token, hide the endpoints if there's none."""
+    if not config.DEBUG_TOKEN:
+        raise HTTPException(status_code=404)
+    expected = f"Bearer {config.DEBUG_TOKEN}"
+    if not hmac.compare_digest(authorization.encode(), expected.encode()):
+        raise HTTPException(
+            status_code=401,
+            detail="Invalid debug token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+
+async def check_metrics_token(authorization: str = Header("")) -> None:
+    """Only allow callers with the debug token, once metrics are to be kept private."""
+    if config.METRICS_REQUIRE_TOKEN:
+        await check_debug_token(authorization)
+
+
+router = APIRouter(prefix="/debug", dependencies=[Depends(check_debug_token)])
+
+success = Response(status_code=status.HTTP_200_OK)
+
+
+def _profiler_response() -> api_models.ProfilerResponse:
+    return api_models.ProfilerResponse(
+        sample_rate=profiler.sample_rate,
+        route=profiler.route,
+        stats=profiler.stats(),
+    )
+
+
+@router.get("/profiler")
+async def profiler_get() -> api_models.ProfilerResponse:
+    """Get which requests this worker is profiling, and how much it's sampled."""
+    return _profiler_response()
+
+
+@router.put("/profiler")
+async def profiler_update(
+    profiler_update_request: api_models.ProfilerUpdateRequest,
+) -> api_models.ProfilerResponse:
+    """Profile a fraction of requests, or every request to one route, or none."""
+    with sanitize_excs():
+        sample_rate = profiler_update_request.sample_rate
+        route = profiler_update_request.route
+        if not 0 <= sample_rate <= 1:
+            raise ClientError("Sample rate must be between 0 and 1")
+        if route and route not in route_names():
+            raise ClientError(f"Unknown route '{route}', expected like 'GET /users'")
+        profiler.configure(sample_rate, route)
+    return _profiler_response()
+
+
+@router.get("/profiler/stacks", response_class=PlainTextResponse)
+async def profiler_stacks() -> str:
+    """Get this worker's samples as collapsed stacks, to render as a flame graph."""
+    return profiler.collapsed()
+
+
+@router.delete("/profiler/stacks")
+async def profiler_stacks_clear() -> Response:
+    """Drop this worker's samples so far."""
+    profiler.clear()
+    return success
+
+
+@router.put("/memory/tracing")
+async def memory_tracing_start(
+    memory_tracing_request: api_models.MemoryTracingRequest,
+) -> Response:
+    """Start tracing allocations, slowing every allocation till it's stopped.
+
+    Tracebacks need to be deep enough to reach the endpoint, for allocations to be
+    attributed to routes.
+    """
+    with sanitize_excs():
+        if not 1 <= memory_tracing_request.frames <= 256:
+            raise ClientError("Frames must be between 1 and 256")
+        memory.start_tracing(memory_tracing_request.frames)
+    return success
+
+
+@router.delete("/memory/tracing")
+async def memory_tracing_stop() -> Response:
+    """Stop tracing allocations."""
+    memory.stop_tracing()
+    return success
+
+
+@router.post("/memory/snapshot")
+async def memory_snapshot_take() -> api_models.MemorySnapshotResponse:
+    """Take the snapshot of allocations later diffs are against."""
+    with sanitize_excs():
+        traced_bytes = await run_in_threadpool(memory.take_snapshot)
+    return api_models.MemorySnapshotResponse(traced_bytes=traced_bytes)
+
+
+@router.get("/memory/diff")
+async def memory_diff(limit: int = 20) -> api_models.MemoryDiffResponse:
+    """Diff allocations alive now against the snapshot, by route and dao call."""
+    routes = memory.FunctionIndex(endpoint_routes())
+    calls = memory.FunctionIndex(memory.package_functions("user_api.daos"))
+    with sanitize_excs():
+        diff = await run_in_threadpool(memory.diff_snapshot, routes, calls, limit)
+    return api_models.MemoryDiffResponse(**diff)
@@ -1,14 +1,40 @@
 import asyncio
-from typing import Any
+from typing import Any, Dict, Optional
 
-from fastapi import FastAPI
-from fastapi.responses import PlainTextResponse
+import anyio.to_thread
+from fastapi import Depends, FastAPI
+from fastapi.responses import PlainTextResponse, Response
 from psycopg.types.json import set_json_dumps, set_json_loads
 import orjson
 
-from user_api import config
-from user_api.internal.auth import clean_db_loop
-from user_api.routers import auth
+from user_api import config, metrics
+from user_api.bulkhead import Bulkhead
+from user_api.daos import (
+    check_db_pool_loop,
+    close_db_pool,
+    db_pool_stats,
+    open_db_pool,
+    ping_db,
+)
+from user_api.internal.cleanup import cleanup_loop, cleanup_stats
+from user_api.internal.hashing import hashing_stats, shutdown_hash_executor
+from user_api.internal.outbox import outbox_stats, send_outbox_loop
+from user_api.logs import log_stats, setup_logging, shutdown_logging
+from user_api.memory import gc_stats, memory_stats, time_gc
+from user_api.metrics import registry
+from user_api.readiness import CachedProbe, over, Readiness
+from user_api.routers import api_models, auth, debug
+from user_api.routers.middleware import (
+    apply_bulkheads,
+    instrument_routes,
+    loop_monitor,
+    MetricsMiddleware,
+    profiler,
+    ProfilingMiddleware,
+    TracingMiddleware,
+)
+from user_api.services import email
+from user_api.tracing import start_exporter, stop_exporter, tracing_stats
 
 
 app = FastAPI(root_path=config.EXPECTED_PREFIX)
@@ -23,20 +49,223 @@ set_json_loads(orjson.loads)
 
 # Add routers
 app.include_router(auth.router)
+app.include_router(debug.router)
+
+app.add_middleware(ProfilingMiddleware)
+app.add_middleware(MetricsMiddleware)
+# Outermost, so the trace covers everything else
+app.add_middleware(TracingMiddleware)
+
+# Routes running bcrypt get their own bulkhead, so a flood of logins can't take every
+# worker and db connection from the cheap routes, nor queue behind them
+hashing_bulkhead = Bulkhead(
+    "hashing", config.BULKHEAD_HASHING_LIMIT, config.BULKHEAD_HASHING_QUEUE
+)
+default_bulkhead = Bulkhead(
+    "default", config.BULKHEAD_DEFAULT_LIMIT, config.BULKHEAD_DEFAULT_QUEUE
+)
+BULKHEADS = {
+    "POST /users": hashing_bulkhead,
+    "PUT /users": hashing_bulkhead,
+    "POST /users/login": hashing_bulkhead,
+    "POST /users/reset_password": hashing_bulkhead,
+}
+
+
+def threadpool_stats() -> Dict[str, float]:
+    """Get the use of the threadpool sync endpoints run in."""
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    return {
+        "in_use": limiter.borrowed_tokens,
+        "size": limiter.total_tokens,
+        "waiting": limiter.statistics().tasks_waiting,
+    }
+
+
+# Expose the stats of each component as metrics too
+registry.collect_stats(
+    "db_pool",
+    db_pool_stats,
+    counters={
+        "requests_num",
+        "requests_queued",
+        "requests_wait_ms",
+        "requests_errors",
+        "returns_bad",
+        "connections_num",
+        "connections_ms",
+        "connections_errors",
+        "connections_lost",
+        "usage_ms",
+    },
+)
+registry.collect_stats(
+    "hashing",
+    hashing_stats,
+    counters={"completed", "rejected", "hash_seconds_total", "wait_seconds_total"},
+)
+registry.collect_stats(
+    "email_outbox",
+    outbox_stats,
+    counters={
+        "sent",
+        "batches",
+        "failed_attempts",
+        "dropped",
+        "send_seconds_total",
+        "queued_seconds_total",
+    },
+)
+registry.collect_stats(
+    "cleanup", cleanup_stats, counters={"runs", "skipped_runs", "deleted_total"}
+)
+registry.collect_stats("threadpool", threadpool_stats, counters=set())
+registry.collect_stats(
+    "logs", log_stats, counters={"sampled_out", "rate_limited", "queue_full"}
+)
+registry.collect_stats(
+    "tracing",
+    tracing_stats,
+    counters={"traces_exported", "traces_dropped", "export_failures"},
+)
+registry.collect_stats("event_loop", loop_monitor.stats, counters=set())
+registry.collect_stats("process", memory_stats, counters=set())
+registry.collect_stats(
+    "gc",
+    gc_stats,
+    counters={
+        "pause_seconds_total",
+        "gen0_collections",
+        "gen1_collections",
+        "gen2_collections",
+        "gen0_collected",
+        "gen1_collected",
+        "gen2_collected",
+        "gen0_uncollectable",
+        "gen1_uncollectable",
+        "gen2_uncollectable",
+    },
+)
+registry.collect_stats(
+    "profiler",
+    profiler.stats,
+    counters={"samples", "dropped_samples", "profiled_requests"},
+)
+
+
+# Whether this worker should get traffic, for Kubernetes' readiness probe
+readiness = Readiness()
+db_probe = CachedProbe(
+    lambda: ping_db(config.READY_DB_PROBE_TIMEOUT_SECONDS),
+    config.READY_DB_PROBE_INTERVAL_SECONDS,
+    config.READY_DB_PROBE_TIMEOUT_SECONDS,
+)
+readiness.add_check("db", db_probe.check)
+
+
+async def _check_db_pool() -> Optional[str]:
+    waiting = db_pool_stats().get("requests_waiting", 0)
+    return over("Requests waiting", waiting, config.READY_DB_POOL_MAX_WAITING)
+
+
+async def _check_hashing() -> Optional[str]:
+    queue_depth = hashing_stats()["queue_depth"]
+    return over("Queue depth", queue_depth, config.READY_HASH_MAX_QUEUE_DEPTH)
+
+
+async def _check_event_loop() -> Optional[str]:
+    lag = loop_monitor.stats()["lag_seconds_avg"]
+    return over("Lag seconds", lag, config.READY_MAX_LOOP_LAG_SECONDS)
+
+
+readiness.add_check("db_pool", _check_db_pool)
+readiness.add_check("hashing", _check_hashing)
+readiness.add_check("event_loop", _check_event_loop)
 
 
 @app.on_event("startup")
 async def app_startup() -> None:
     """Verify config, start background tasks."""
+    setup_logging()
+
     # Validate env vars set
     if any([var is None for var in config.REQUIRED_ENV_FOR_DEPLOY]):
         raise Exception(f"Missing required env vars: {config.REQUIRED_ENV_FOR_DEPLOY}")
+    if config.TOKEN_FORMAT not in ("uuid", "signed"):
+        raise Exception(f"Unknown TOKEN_FORMAT: {config.TOKEN_FORMAT}")
+    if config.TOKEN_FORMAT == "signed" and not config.TOKEN_SIGNING_KEYS:
+        raise Exception("TOKEN_FORMAT signed requires TOKEN_SIGNING_KEYS")
+
+    # Export sampled traces, if enabled
+    start_exporter()
+
+    # Every route is added by now
+    instrument_routes(app.routes)
+    apply_bulkheads(app.routes, BULKHEADS, default_bulkhead)
+
+    # Watch for anything blocking the event loop, and time gc pauses
+    loop_monitor.start()
+    time_gc()
+
+    # Sample requests selected for profiling, if any
+    profiler.start()
+
+    # Open the shared db connection pool and keep it healthy
+    await open_db_pool()
+    asyncio.create_task(check_db_pool_loop())
 
     # Start cleaning stuff up
-    asyncio.create_task(clean_db_loop())
+    asyncio.create_task(cleanup_loop())
+
+    # Start sending queued emails
+    if config.EMAIL_ENABLED:
+        await email.open_email_client()
+        asyncio.create_task(send_outbox_loop())
+
+
+@app.on_event("shutdown")
+async def app_shutdown() -> None:
+    """Release shared resources."""
+    await close_db_pool()
+    await email.close_email_client()
+    shutdown_hash_executor()
+    stop_exporter()
+    profiler.stop()
+    loop_monitor.stop()
+    shutdown_logging()
 
 
 @app.get("/ping", response_class=PlainTextResponse)
-def ping() -> str:
+async def ping() -> str:
     """Ping pong."""
     return "pong"
+
+
+@app.get("/ready")
+async def ready(response: Response) -> api_models.ReadinessResponse:
+    """Check this worker can take traffic, 503 if the db is down or it's saturated."""
+    failing = await readiness.check()
+    if failing:
+        response.status_code = 503
+    return api_models.ReadinessResponse(ready=not failing, failing=failing)
+
+
+@app.get("/stats", dependencies=[Depends(debug.check_metrics_token)])
+async def stats() -> api_models.StatsResponse:
+    """Get runtime statistics for this worker."""
+    return api_models.StatsResponse(
+        db_pool=db_pool_stats(),
+        hashing=hashing_stats(),
+        email_outbox=outbox_stats(),
+        cleanup=cleanup_stats(),
+    )
+
+
+@app.get(
+    "/metrics",
+    response_class=Response,
+    dependencies=[Depends(debug.check_metrics_token)],
+)
+async def get_metrics() -> Response:
+    """Get runtime metrics for this worker, in the Prometheus text format."""
+    return Response(content=registry.render(), media_type=metrics.CONTENT_TYPE)
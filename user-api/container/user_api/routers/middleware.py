@@ -0,0 +1,314 @@
+import asyncio
+import logging
+import time
+from types import CodeType
+from typing import Any, Callable, Dict, Iterable, Mapping, Optional, Set
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.routing import BaseRoute, Route
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from user_api import config
+from user_api.bulkhead import Bulkhead
+from user_api.daos import QueryStats, track_queries
+from user_api.loop_monitor import LoopMonitor
+from user_api.metrics import Counter, LATENCY_BUCKETS, registry
+from user_api.profiler import Profiler
+from user_api.tracing import start_trace, trace_from_headers
+
+
+logger = logging.getLogger(__name__)
+
+# Status codes routes are expected to return, others get their counter on first use
+COMMON_STATUSES = (200, 400, 401, 404, 422, 500, 503)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 4, 5, 6, 8, 10, 15, 20, 30, 50)
+
+_request_seconds = registry.histogram(
+    "http_request_duration_seconds",
+    "Time to respond to requests, per route.",
+    ["method", "route"],
+)
+_responses = registry.counter(
+    "http_responses_total",
+    "Responses sent, per route and status.",
+    ["method", "route", "status"],
+)
+_db_queries = registry.histogram(
+    "http_request_db_queries",
+    "Statements run per request, per route.",
+    ["method", "route"],
+    QUERY_COUNT_BUCKETS,
+)
+_db_seconds = registry.histogram(
+    "http_request_db_seconds",
+    "Time per request with a statement running, per route.",
+    ["method", "route"],
+)
+_db_idle_seconds = registry.histogram(
+    "http_request_db_idle_in_transaction_seconds",
+    "Time per request holding a transaction open with no statement running.",
+    ["method", "route"],
+    (0.0, *LATENCY_BUCKETS),
+)
+_in_flight = registry.gauge(
+    "http_requests_in_flight", "Requests being handled right now."
+).labels()
+
+
+class RouteMetrics:
+    """Metrics of one route, looked up once and kept."""
+
+    __slots__ = (
+        "method",
+        "path",
+        "duration",
+        "statuses",
+        "db_queries",
+        "db_seconds",
+        "db_idle_seconds",
+    )
+
+    def __init__(self, method: str, path: str) -> None:
+        self.method = method
+        self.path = path
+        self.duration = _request_seconds.labels(method, path)
+        self.statuses: Dict[int, Counter] = {
+            status: _responses.labels(method, path, str(status))
+            for status in COMMON_STATUSES
+        }
+        self.db_queries = _db_queries.labels(method, path)
+        self.db_seconds = _db_seconds.labels(method, path)
+        self.db_idle_seconds = _db_idle_seconds.labels(method, path)
+
+    def observe(self, seconds: float, status: int, queries: QueryStats) -> None:
+        """Record one response, and the statements run for it."""
+        self.duration.observe(seconds)
+        self.db_queries.observe(queries.count)
+        self.db_seconds.observe(queries.busy_seconds)
+        self.db_idle_seconds.observe(queries.idle_in_transaction_seconds)
+        counter = self.statuses.get(status)
+        if counter is None:
+            counter = self.statuses[status] = _responses.labels(
+                self.method, self.path, str(status)
+            )
+        counter.inc()
+
+
+# Metrics for each route's endpoint, filled in by instrument_routes
+_route_metrics: Dict[Callable[..., Any], RouteMetrics] = {}
+# Requests that matched no route are recorded together, rather than per path
+_unmatched = RouteMetrics("", "unmatched")
+
+
+def _route_of(scope: Scope) -> RouteMetrics:
+    """Get the metrics of the route a request matched, once it's been routed."""
+    endpoint: Optional[Callable[..., Any]] = scope.get("endpoint")
+    return _route_metrics.get(endpoint, _unmatched) if endpoint else _unmatched
+
+
+def route_name(scope: Scope) -> str:
+    """Name the route a request matched like "GET /users/{id}", or "unmatched"."""
+    route = _route_of(scope)
+    return f"{route.method} {route.path}".strip()
+
+
+def route_names() -> Set[str]:
+    """Get the names of every instrumented route."""
+    return {f"{route.method} {route.path}" for route in _route_metrics.values()}
+
+
+def endpoint_routes() -> Dict[CodeType, str]:
+    """Get the name of every instrumented route, by its endpoint's code."""
+    return {
+        endpoint.__code__: f"{route.method} {route.path}"
+        for endpoint, route in _route_metrics.items()
+        if hasattr(endpoint, "__code__")
+    }
+
+
+# Request each task is handling, to name what was running when the loop blocked
+_task_scopes: Dict["asyncio.Task[Any]", Scope] = {}
+
+
+def route_of_task(task: "asyncio.Task[Any]") -> Optional[str]:
+    """Name the route of the request a task is handling, if it's handling one."""
+    scope = _task_scopes.get(task)
+    return None if scope is None else route_name(scope)
+
+
+# Measures the event loop's lag, and logs the stacks of whatever blocks it
+loop_monitor = LoopMonitor(
+    route_of_task,
+    config.LOOP_LAG_INTERVAL_SECONDS,
+    config.LOOP_BLOCKED_THRESHOLD_SECONDS,
+)
+
+# Profiles requests on the event loop, reconfigured through the /debug endpoints
+profiler = Profiler(
+    route_name,
+    config.PROFILER_SAMPLE_RATE,
+    config.PROFILER_ROUTE,
+    config.PROFILER_INTERVAL_SECONDS,
+)
+
+
+def _warn_db_heavy(route: RouteMetrics, queries: QueryStats) -> None:
+    """Log the request's statements if there were too many, or it left any idle."""
+    idle_seconds = queries.idle_in_transaction_seconds
+    if (
+        queries.count <= config.DB_REQUEST_QUERIES_WARN
+        and idle_seconds < config.DB_IDLE_IN_TRANSACTION_WARN_SECONDS
+    ):
+        return
+    logger.warning(
+        "DB heavy request",
+        extra={
+            "method": route.method,
+            "route": route.path,
+            "statements": queries.count,
+            "db_ms": round(queries.busy_seconds * 1000, 1),
+            "idle_in_transaction_ms": round(idle_seconds * 1000, 1),
+            "slowest_ms": round(queries.slowest_seconds * 1000, 1),
+            "slowest_statement": queries.slowest_statement(),
+        },
+    )
+
+
+def instrument_routes(routes: Iterable[BaseRoute]) -> None:
+    """Create the metrics of every route, call once they're all added."""
+    for route in routes:
+        if isinstance(route, Route) and route.endpoint not in _route_metrics:
+            method = ",".join(sorted(route.methods or []))
+            _route_metrics[route.endpoint] = RouteMetrics(method, route.path)
+
+
+# Paths never bulkheaded, so an overloaded worker can still be probed and debugged
+UNLIMITED_PATHS = ("/ping", "/ready", "/stats", "/metrics", "/debug/")
+
+# Bulkhead each route runs in, filled in by apply_bulkheads
+_route_bulkheads: Dict[Callable[..., Any], Bulkhead] = {}
+
+
+def apply_bulkheads(
+    routes: Iterable[BaseRoute], bulkheads: Mapping[str, Bulkhead], default: Bulkhead
+) -> None:
+    """Run each route within its bulkhead, by name like "POST /users", or the default.
+
+    Wraps the route's app, so requests are limited once they're routed, and a request
+    turned away is still recorded under its route.
+    """
+    for route in routes:
+        if not isinstance(route, Route) or route.endpoint in _route_bulkheads:
+            continue
+        if route.path.startswith(UNLIMITED_PATHS):
+            continue
+        method = ",".join(sorted(route.methods or []))
+        bulkhead = bulkheads.get(f"{method} {route.path}", default)
+        route.app = bulkhead.wrap(route.app)
+        _route_bulkheads[route.endpoint] = bulkhead
+
+
+class MetricsMiddleware:
+    """Record each request's latency, status and statements under its route.
+
+    Plain ASGI rather than BaseHTTPMiddleware, which adds a task and stream per
+    request. The router leaves the matched endpoint in the scope, which picks the
+    route's metrics. Also notes which request each task is handling, for the loop
+    monitor.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        # Anything failing before a response starts is sent as a 500
+        status = 500
+
+        async def _send(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        _in_flight.inc()
+        task = asyncio.current_task()
+        if task is not None:
+            _task_scopes[task] = scope
+        start_t = time.perf_counter()
+        with track_queries() as queries:
+            try:
+                await self.app(scope, receive, _send)
+            finally:
+                _in_flight.dec()
+                if task is not None:
+                    del _task_scopes[task]
+                route = _route_of(scope)
+                route.observe(time.perf_counter() - start_t, status, queries)
+                _warn_db_heavy(route, queries)
+
+
+class TracingMiddleware:
+    """Trace each request, continuing a trusted caller's trace if it sent a traceparent.
+
+    The response gets a Server-Timing header with the time spent per span name (or
+    only the total, without SERVER_TIMING_DETAIL), and
+    an X-Request-ID header with the caller's request id, or the trace id if none.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        trace = trace_from_headers(
+            "request", headers.get("traceparent"), headers.get("x-request-id")
+        )
+
+        async def _send(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                trace.root.name = route_name(scope)
+                trace.root.attributes["http.status_code"] = message["status"]
+                response_headers = MutableHeaders(scope=message)
+                response_headers.append(
+                    "Server-Timing",
+                    trace.server_timing(time.perf_counter() - start_t),
+                )
+                response_headers.append("X-Request-ID", trace.request_id)
+            await send(message)
+
+        start_t = time.perf_counter()
+        with start_trace(trace):
+            try:
+                await self.app(scope, receive, _send)
+            finally:
+                trace.finish()
+
+
+class ProfilingMiddleware:
+    """Mark the tasks of requests the profiler may sample, while they're handled."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not profiler.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        task = asyncio.current_task()
+        if task is None:
+            await self.app(scope, receive, send)
+            return
+        profiler.track(task, scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            profiler.untrack(task)
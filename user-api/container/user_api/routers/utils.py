@@ -1,4 +1,5 @@
 from contextlib import contextmanager
+import logging
 from typing import Any, Dict, Iterator, List
 
 from fastapi import HTTPException
@@ -7,29 +8,41 @@ from user_api.exceptions import (
     ClientError,
     InternalError,
     NotFoundError,
+    OverloadedError,
     VerifyFailedError,
 )
 
 
+logger = logging.getLogger(__name__)
+
+
 @contextmanager
 def sanitize_excs(*args: List[Any], **kwargs: Dict[Any, Any]) -> Iterator[None]:
     """Context manager to sanitize exceptions."""
     try:
         yield
     except VerifyFailedError as e:
-        print(f"VERIFY FAILED ERROR ESCAPED: {str(e)}")  # TODO make this a log crit
+        logger.critical("Verify failed error escaped", extra={"error": str(e)})
         raise HTTPException(status_code=500)
     except InternalError as e:
-        print(f"INTERNAL ERROR: {str(e)}")  # TODO make this a log error
+        logger.error("Internal error", extra={"error": str(e)})
         raise HTTPException(status_code=500)
     except ClientError as e:
-        print(f"CLIENT ERROR: {str(e)}")  # TODO make this a log debug
+        # Info not debug, so they're seen by default, sampled and rate limited
+        logger.info("Client error", extra={"error": str(e)})
         raise HTTPException(status_code=400, detail=str(e))
     except NotFoundError as e:
-        print(f"NOT FOUND ERROR: {str(e)}")  # TODO make this a log debug
+        logger.info("Not found error", extra={"error": str(e)})
         raise HTTPException(status_code=404, detail=str(e))
-    except Exception as e:
-        print(f"UNHANDLED ERROR: {str(e)}")  # TODO make this a log error/crit?
+    except OverloadedError as e:
+        logger.warning("Overloaded error", extra={"error": str(e)})
+        raise HTTPException(
+            status_code=503,
+            detail="Service overloaded, try again later",
+            headers={"Retry-After": "1"},
+        )
+    except Exception:
+        logger.exception("Unhandled error")
         raise HTTPException(status_code=500)
     finally:
         pass
@@ -1,17 +1,31 @@
-from user_api.services.email.client import send_email
+from user_api.services.email.client import (
+    EmailRecipient,
+    SendError,
+    close_email_client,
+    open_email_client,
+    send_batch,
+    send_email,
+)
 from user_api.services.email.premade import (
-    send_login_notification_email,
-    send_password_reset_email,
-    send_post_verification_email,
+    EmailContent,
+    login_notification_email,
+    password_reset_email,
+    post_verification_email,
     send_test_email,
-    send_verification_email,
+    verification_email,
 )
 
 __all__ = [
+    "EmailContent",
+    "EmailRecipient",
+    "SendError",
+    "close_email_client",
+    "login_notification_email",
+    "open_email_client",
+    "password_reset_email",
+    "post_verification_email",
+    "send_batch",
     "send_email",
-    "send_login_notification_email",
-    "send_password_reset_email",
-    "send_post_verification_email",
     "send_test_email",
-    "send_verification_email",
+    "verification_email",
 ]
@@ -1,13 +1,107 @@
-from typing import List
+from typing import Dict, List, NamedTuple, Optional
 
-from sendgrid import SendGridAPIClient
-from sendgrid.helpers.mail import Mail, MailSettings, SandBoxMode
+import httpx
+from sendgrid.helpers.mail import (
+    Mail,
+    MailSettings,
+    Personalization,
+    SandBoxMode,
+    Substitution,
+    To,
+)
 
-from user_api.config import EMAIL_ENABLED, EMAIL_FROM, SENDGRID_KEY
+from user_api.config import (
+    EMAIL_ENABLED,
+    EMAIL_FROM,
+    SENDGRID_KEEPALIVE_SECONDS,
+    SENDGRID_KEY,
+    SENDGRID_MAX_BATCH_SIZE,
+    SENDGRID_MAX_CONNECTIONS,
+    SENDGRID_TIMEOUT_SECONDS,
+    SENDGRID_URL,
+)
 from user_api.exceptions import InternalError
+from user_api.tracing import span
 
 
-def send_email(
+class EmailRecipient(NamedTuple):
+    """One recipient of a batched email, with their own template substitutions."""
+
+    to_email: str
+    substitutions: Dict[str, str]
+
+
+class SendError(Exception):
+    """A request sendgrid didn't accept, with its status if it got a response."""
+
+    def __init__(self, message: str, status_code: Optional[int] = None) -> None:
+        super().__init__(message)
+        self.status_code = status_code
+
+    @property
+    def rejected(self) -> bool:
+        """Whether the content was rejected, like an invalid address, not the request.
+
+        Resending the same content won't help, unlike after an outage, rate limiting
+        or an auth error, which affect every request alike.
+        """
+        return self.status_code in (400, 413)
+
+
+# Shared keep-alive client, opened in app_startup
+_client: Optional[httpx.AsyncClient] = None
+
+
+async def open_email_client() -> None:
+    """Open the shared sendgrid client."""
+    global _client
+    if _client is not None:
+        return
+
+    _client = httpx.AsyncClient(
+        base_url=SENDGRID_URL,
+        headers={"Authorization": f"Bearer {SENDGRID_KEY}"},
+        limits=httpx.Limits(
+            max_connections=SENDGRID_MAX_CONNECTIONS,
+            max_keepalive_connections=SENDGRID_MAX_CONNECTIONS,
+            keepalive_expiry=SENDGRID_KEEPALIVE_SECONDS,
+        ),
+        timeout=SENDGRID_TIMEOUT_SECONDS,
+    )
+
+
+async def close_email_client() -> None:
+    """Close the shared sendgrid client."""
+    global _client
+    if _client is None:
+        return
+    client, _client = _client, None
+    await client.aclose()
+
+
+async def _send_mail(message: Mail, sandbox: bool) -> None:
+    """Send a prepared message through the shared client."""
+    if not EMAIL_ENABLED or SENDGRID_KEY is None:
+        raise InternalError("Cannot send mail without sendgrid key")
+    if _client is None:
+        raise InternalError("Email client used before being opened")
+
+    if sandbox:
+        mail_settings = MailSettings(sandbox_mode=SandBoxMode(True))
+        message.mail_settings = mail_settings
+
+    with span("email"):
+        response = await _client.post("/v3/mail/send", json=message.get())
+
+    expected_status = 200 if sandbox else 202
+    if response.status_code != expected_status:
+        raise SendError(
+            f"Got unexpected mail status: {response.status_code} - {response.text}",
+            response.status_code,
+        )
+
+
+async def send_email(
     to_emails: List[str],
     subject: str,
     html_content: str,
@@ -15,23 +109,88 @@ def send_email(
     sandbox: bool = False,
 ) -> None:
     """Send email to the given addresses."""
-    if not EMAIL_ENABLED or SENDGRID_KEY is None:
-        raise InternalError("Cannot send mail without sendgrid key")
-
     message = Mail(
         from_email=from_email,
         to_emails=to_emails,
         subject=subject,
         html_content=html_content,
     )
+    await _send_mail(message, sandbox)
 
-    if sandbox:
-        mail_settings = MailSettings(sandbox_mode=SandBoxMode(True))
-        message.mail_settings = mail_settings
 
-    sg = SendGridAPIClient(SENDGRID_KEY)
-    response = sg.send(message)
+async def _send_chunk(
+    recipients: List[EmailRecipient],
+    subject: str,
+    html_content: str,
+    from_email: str,
+    sandbox: bool,
+) -> Optional[Exception]:
+    """Send one email template to each recipient in one request, get any error."""
+    message = Mail(
+        from_email=from_email,
+        subject=subject,
+        html_content=html_content,
+    )
+    for recipient in recipients:
+        personalization = Personalization()
+        personalization.add_to(To(recipient.to_email))
+        for key, value in recipient.substitutions.items():
+            personalization.add_substitution(Substitution(key, value))
+        message.add_personalization(personalization)
+    try:
+        await _send_mail(message, sandbox)
+    except Exception as e:
+        return e
+    return None
 
-    expected_status = 200 if sandbox else 202
-    if response.status_code != expected_status:
-        raise Exception(f"Got unexpected mail status: {response.status_code}")
+
+def _rejected(error: Optional[Exception]) -> bool:
+    """Whether an error is sendgrid rejecting the request for its content."""
+    return isinstance(error, SendError) and error.rejected
+
+
+async def send_batch(
+    recipients: List[EmailRecipient],
+    subject: str,
+    html_content: str,
+    from_email: str = EMAIL_FROM,
+    sandbox: bool = False,
+) -> List[Optional[Exception]]:
+    """Send one email template to many recipients, in as few requests as possible.
+
+    Each recipient gets their own personalization, so they only see their own address
+    and their substitutions are applied to the subject and content. Sendgrid accepts
+    or rejects each request as a whole, so a request rejected for its content is sent
+    again a recipient at a time, to keep one bad address from failing the rest. After
+    any other failure, like an outage, the remaining requests and resends aren't tried.
+
+    Returns the error of each recipient, in order, None if their email was accepted.
+    """
+    errors: List[Optional[Exception]] = []
+    outage: Optional[Exception] = None
+    for i in range(0, len(recipients), SENDGRID_MAX_BATCH_SIZE):
+        end = i + SENDGRID_MAX_BATCH_SIZE
+        chunk = recipients[i:end]
+        if outage is not None:
+            errors.extend([outage] * len(chunk))
+            continue
+
+        error = await _send_chunk(chunk, subject, html_content, from_email, sandbox)
+        rejected = _rejected(error)
+        if not rejected or len(chunk) == 1:
+            errors.extend([error] * len(chunk))
+            if error is not None and not rejected:
+                outage = error
+            continue
+
+        for recipient in chunk:
+            if outage is not None:
+                errors.append(outage)
+                continue
+            error = await _send_chunk(
+                [recipient], subject, html_content, from_email, sandbox
+            )
+            errors.append(error)
+            if error is not None and not _rejected(error):
+                outage = error
+    return errors
@@ -1,57 +1,65 @@
+from typing import Dict, NamedTuple
+
 from user_api.services.email.client import send_email
 
 
-def send_test_email(to_email: str) -> None:
+class EmailContent(NamedTuple):
+    """The subject and body of an email, ready to send or queue.
+
+    The subject and body are templates shared by every recipient, so emails of the
+    same kind can be batched into one request. Per-recipient values are filled in by
+    sendgrid from the substitutions.
+    """
+
+    subject: str
+    html_content: str
+    substitutions: Dict[str, str]
+
+
+async def send_test_email(to_email: str) -> None:
     """Send a generic test email."""
-    send_email(
+    await send_email(
         to_emails=[to_email],
         subject="Test email",
         html_content="This is a test email",
     )
 
 
-def send_verification_email(to_email: str, verify_code: str) -> None:
-    """Send an email address confirmation email."""
-    content = f"Your email verification code is {verify_code}"
-    send_email(
-        to_emails=[to_email],
+def verification_email(verify_code: str) -> EmailContent:
+    """Make an email address confirmation email."""
+    return EmailContent(
         subject="[Web Games] Confirm your email address",
-        html_content=content,
+        html_content="Your email verification code is -verify_code-",
+        substitutions={"-verify_code-": verify_code},
     )
 
 
-def send_post_verification_email(to_email: str, first_name: str) -> None:
-    """Send an email welcoming the user and confirming verification."""
-    subject = f"Welcome to Web Games, {first_name}"
-    content = "Your verification was successful. Log in now!"
-    send_email(
-        to_emails=[to_email],
-        subject=subject,
-        html_content=content,
+def post_verification_email(first_name: str) -> EmailContent:
+    """Make an email welcoming the user and confirming verification."""
+    return EmailContent(
+        subject="Welcome to Web Games, -first_name-",
+        html_content="Your verification was successful. Log in now!",
+        substitutions={"-first_name-": first_name},
     )
 
 
-def send_password_reset_email(to_email: str, reset_code: str) -> None:
-    """Send an email with a password reset code."""
+def password_reset_email(reset_code: str) -> EmailContent:
+    """Make an email with a password reset code."""
     # TODO make this a webpage with the code as a qsp in a link
-    subject = "[Web Games] Reset your password"
-    content = f"You requested a password reset. Your code is {reset_code}"
-    send_email(
-        to_emails=[to_email],
-        subject=subject,
-        html_content=content,
+    return EmailContent(
+        subject="[Web Games] Reset your password",
+        html_content="You requested a password reset. Your code is -reset_code-",
+        substitutions={"-reset_code-": reset_code},
     )
 
 
-def send_login_notification_email(to_email: str) -> None:
-    """Send an email when a new login occurs."""
-    subject = "[Web Games] New login to your account"
-    content = (
-        "You recently logged in to your account. "
-        "If this was unauthorized, please reset your password now."
-    )
-    send_email(
-        to_emails=[to_email],
-        subject=subject,
-        html_content=content,
+def login_notification_email() -> EmailContent:
+    """Make an email for when a new login occurs."""
+    return EmailContent(
+        subject="[Web Games] New login to your account",
+        html_content=(
+            "You recently logged in to your account. "
+            "If this was unauthorized, please reset your password now."
+        ),
+        substitutions={},
     )